@@ -6,7 +6,7 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[('generated-icon.png', '.')],
-    hiddenimports=['selenium', 'beautifulsoup4', 'pandas', 'requests', 'undetected_chromedriver', '2captcha-python'],
+    hiddenimports=['selenium', 'beautifulsoup4', 'pandas', 'openpyxl', 'pyarrow', 'psutil', 'requests', 'undetected_chromedriver', '2captcha-python'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
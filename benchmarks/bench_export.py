@@ -0,0 +1,127 @@
+"""
+Peak memory and speed of the exporters on a large products table.
+
+    python benchmarks/bench_export.py [--rows 1000000] [--formats csv,excel,parquet,jsonl]
+                                      [--source batches|objects] [--legacy] [--json out.json]
+
+Every export runs in its own process so its peak RSS is measured in
+isolation. --source picks what the exporters are fed: ProductBatch chunks
+from Database.iter_batches() (default) or Product objects from
+iter_products(). --legacy adds the old path (Product.get_all + pandas DataFrame
+for Excel) for comparison; expect it to need gigabytes at 1M rows.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from database import Database  # noqa: E402
+from models import Product  # noqa: E402
+
+EXTENSIONS = {'csv': 'csv', 'excel': 'xlsx', 'parquet': 'parquet', 'jsonl': 'jsonl',
+              'legacy-csv': 'csv', 'legacy-excel': 'xlsx'}
+
+
+def peak_rss_mb() -> float:
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def fill_database(path: str, rows: int):
+    started = datetime(2024, 1, 1)
+    with Database(path) as db:
+        db.save_many((Product(
+            id=None,
+            name=f'Product {i}',
+            price=round(10 + (i % 997) * 1.37, 2),
+            description='Lorem ipsum dolor sit amet, consectetur adipiscing elit ' * 2,
+            url=f'https://shop.example.com/p/{i}',
+            marketplace=f'shop{i % 5}.example.com',
+            created_at=started + timedelta(seconds=i),
+        ) for i in range(rows)), batch_size=10000)
+
+
+def run_child(fmt: str, db_path: str, out_path: str, source: str):
+    from utils import EXPORTERS
+    started = time.perf_counter()
+    with Database(db_path) as db:
+        if fmt == 'legacy-excel':
+            import pandas as pd
+            products = Product.get_all(db.conn)
+            pd.DataFrame({
+                'Name': [p.name for p in products],
+                'Price': [p.price for p in products],
+                'Description': [p.description for p in products],
+                'URL': [p.url for p in products],
+                'Marketplace': [p.marketplace for p in products],
+                'Created At': [p.created_at for p in products],
+            }).to_excel(out_path, index=False)
+        elif fmt == 'legacy-csv':
+            EXPORTERS['csv'](Product.get_all(db.conn), out_path)
+        elif source == 'objects':
+            EXPORTERS[fmt](db.iter_products(chunk_size=5000), out_path)
+        else:
+            EXPORTERS[fmt](db.iter_batches(chunk_size=10000), out_path)
+    print(json.dumps({
+        'format': fmt,
+        'source': source,
+        'seconds': time.perf_counter() - started,
+        'peak_rss_mb': peak_rss_mb(),
+        'file_mb': os.path.getsize(out_path) / (1024 * 1024),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--formats', default='csv,excel,parquet,jsonl')
+    parser.add_argument('--source', choices=('batches', 'objects'), default='batches')
+    parser.add_argument('--legacy', action='store_true')
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--child', nargs=4, metavar=('FORMAT', 'DB', 'OUT', 'SOURCE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(*args.child)
+        return
+
+    formats = args.formats.split(',')
+    if args.legacy:
+        formats += ['legacy-csv', 'legacy-excel']
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        started = time.perf_counter()
+        fill_database(db_path, args.rows)
+        print(f"Filled {args.rows} rows in {time.perf_counter() - started:.1f} s")
+
+        for fmt in formats:
+            out_path = os.path.join(tmp, f'{fmt}.{EXTENSIONS[fmt]}')
+            output = subprocess.run([sys.executable, __file__, '--child', fmt, db_path, out_path, args.source],
+                                    capture_output=True, text=True)
+            if output.returncode != 0:
+                print(f"{fmt:14} failed: {output.stderr.strip().splitlines()[-1:]}")
+                continue
+            result = json.loads(output.stdout.strip().splitlines()[-1])
+            result['rows'] = args.rows
+            results.append(result)
+            print(f"{fmt:14} {result['seconds']:8.1f} s  peak {result['peak_rss_mb']:8.1f} MB  "
+                  f"file {result['file_mb']:8.1f} MB")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == '__main__':
+    main()
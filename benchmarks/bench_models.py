@@ -0,0 +1,110 @@
+"""
+Memory and write speed of the product representations.
+
+    python benchmarks/bench_models.py [--rows 1000000] [--json out.json]
+
+'dict' is the old Product (a dataclass with a per-instance __dict__),
+'slots' the current Product and 'batch' a columnar ProductBatch. Each
+variant builds `rows` records in its own process and reports the memory
+they hold (tracemalloc) and the time to insert them into SQLite.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from database import Database  # noqa: E402
+from models import Product, ProductBatch  # noqa: E402
+
+VARIANTS = ('dict', 'slots', 'batch')
+
+
+@dataclass
+class DictProduct:
+    id: Optional[int]
+    name: str
+    price: float
+    description: str
+    url: str
+    marketplace: str
+    created_at: datetime
+
+
+def records(cls, rows: int):
+    started = datetime(2024, 1, 1)
+    marketplaces = [f'shop{i}.example.com' for i in range(5)]
+    description = 'Lorem ipsum dolor sit amet, consectetur adipiscing elit'
+    for i in range(rows):
+        yield cls(
+            id=None,
+            name=f'Product {i}',
+            price=round(10 + (i % 997) * 1.37, 2),
+            description=description,
+            url=f'https://shop.example.com/p/{i}',
+            marketplace=marketplaces[i % 5],
+            created_at=started + timedelta(seconds=i),
+        )
+
+
+def run_child(variant: str, rows: int, db_path: str):
+    tracemalloc.start()
+    started = time.perf_counter()
+    if variant == 'batch':
+        data = ProductBatch.from_products(records(Product, rows))
+    else:
+        data = list(records(DictProduct if variant == 'dict' else Product, rows))
+    build_seconds = time.perf_counter() - started
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    started = time.perf_counter()
+    with Database(db_path) as db:
+        db.save_many(data, batch_size=10000)
+    print(json.dumps({
+        'variant': variant,
+        'rows': rows,
+        'held_mb': held / (1024 * 1024),
+        'build_seconds': build_seconds,
+        'insert_seconds': time.perf_counter() - started,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--child', nargs=3, metavar=('VARIANT', 'ROWS', 'DB'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child[0], int(args.child[1]), args.child[2])
+        return
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for variant in VARIANTS:
+            db_path = os.path.join(tmp, f'{variant}.db')
+            output = subprocess.run([sys.executable, __file__, '--child', variant, str(args.rows), db_path],
+                                    capture_output=True, text=True, check=True)
+            result = json.loads(output.stdout.strip().splitlines()[-1])
+            results.append(result)
+            print(f"{variant:6} held {result['held_mb']:8.1f} MB  build {result['build_seconds']:6.2f} s  "
+                  f"insert {result['insert_seconds']:6.2f} s")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Timestamp and price normalization speed.
+
+    python benchmarks/bench_normalize.py [--rows 1000000] [--json out.json]
+
+Timestamps: reading `rows` created_at values back from SQLite stored as
+ISO text (parsed with strptime or fromisoformat, as older versions did)
+against epoch integers (converted to datetimes, or kept as integers the
+way ProductBatch does).
+
+Prices: the old '$'/',' stripping (which only handles one format),
+parse_price() in a loop, and parse_prices() over the whole batch, with
+and without pyarrow.
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from array import array
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import normalize  # noqa: E402
+from normalize import from_micros, parse_price, parse_prices, to_micros  # noqa: E402
+
+PRICE_FORMATS = ('${:,.2f}', '{:,.2f} €', '{:,.0f} ₽', '{:,.2f} руб.')
+
+
+def timed(fn):
+    started = time.perf_counter()
+    fn()
+    return time.perf_counter() - started
+
+
+def timestamp_results(rows: int, db_path: str) -> dict:
+    started = datetime(2024, 1, 1)
+    moments = [started + timedelta(seconds=i, microseconds=i % 1000) for i in range(rows)]
+    conn = sqlite3.connect(db_path)
+    conn.execute('CREATE TABLE text_ts (created_at TEXT)')
+    conn.execute('CREATE TABLE epoch_ts (created_at INTEGER)')
+    with conn:
+        conn.executemany('INSERT INTO text_ts VALUES (?)',
+                         ((moment.isoformat(' ', 'microseconds'),) for moment in moments))
+        conn.executemany('INSERT INTO epoch_ts VALUES (?)', ((to_micros(moment),) for moment in moments))
+
+    def read(table, convert):
+        return lambda: [convert(row[0]) for row in conn.execute(f'SELECT created_at FROM {table}')]
+
+    results = {
+        'text_strptime': timed(read('text_ts', lambda value: datetime.strptime(value, '%Y-%m-%d %H:%M:%S.%f'))),
+        'text_fromisoformat': timed(read('text_ts', datetime.fromisoformat)),
+        'epoch_datetime': timed(read('epoch_ts', from_micros)),
+        'epoch_array': timed(lambda: array('q', (row[0] for row in conn.execute('SELECT created_at FROM epoch_ts')))),
+    }
+    conn.close()
+    return results
+
+
+def price_results(rows: int) -> dict:
+    dollars = [PRICE_FORMATS[0].format(10 + (i % 99991) * 1.37) for i in range(rows)]
+    euros = [PRICE_FORMATS[1].format(10 + (i % 99991) * 1.37).replace(',', ' ').replace('.', ',')
+             for i in range(rows)]
+    arrow = normalize._arrow_prices
+    results = {
+        'dollar_strip': timed(lambda: [float(text.strip().replace('$', '').replace(',', '')) for text in dollars]),
+        'dollar_parse_price': timed(lambda: [parse_price(text) for text in dollars]),
+        'dollar_parse_prices': timed(lambda: parse_prices(dollars)),
+        'euro_parse_price': timed(lambda: [parse_price(text) for text in euros]),
+        'euro_parse_prices': timed(lambda: parse_prices(euros)),
+    }
+    normalize._arrow_prices = lambda texts, decimal: None
+    try:
+        results['dollar_parse_prices_python'] = timed(lambda: parse_prices(dollars))
+        results['euro_parse_prices_python'] = timed(lambda: parse_prices(euros))
+    finally:
+        normalize._arrow_prices = arrow
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {
+            'rows': args.rows,
+            'timestamps': timestamp_results(args.rows, os.path.join(tmp, 'timestamps.db')),
+            'prices': price_results(args.rows),
+        }
+    for group in ('timestamps', 'prices'):
+        for name, seconds in results[group].items():
+            print(f"{name:28} {seconds:7.2f} s  {args.rows / seconds / 1e6:6.2f} M rows/s")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Compare parser backends on the saved HTML fixtures.
+
+    python benchmarks/bench_parsers.py [--iterations 200] [--json out.json]
+
+'legacy' is the old scrape_product path: BeautifulSoup('html.parser') and a
+fresh select_one(selector_string) per field.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bs4 import BeautifulSoup  # noqa: E402
+from models import ScrapingConfig  # noqa: E402
+from parsing import BACKENDS, extract_fields  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def legacy_extract(html, selectors):
+    soup = BeautifulSoup(html, 'html.parser')
+    return {field: soup.select_one(selector).text for field, selector in selectors.items()}
+
+
+def time_per_page(func, html, iterations):
+    func(html)  # warm caches / imports
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func(html)
+    return (time.perf_counter() - started) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    with open(os.path.join(FIXTURES, 'selectors.json')) as f:
+        selectors = json.load(f)
+
+    results = []
+    for path in sorted(glob.glob(os.path.join(FIXTURES, '*.html'))):
+        with open(path, encoding='utf-8') as f:
+            html = f.read()
+        fixture = os.path.basename(path)
+
+        candidates = {'legacy': lambda h: legacy_extract(h, selectors)}
+        for name in BACKENDS:
+            config = ScrapingConfig(url_pattern='https://example.com/', selectors=selectors, parser=name)
+            try:
+                extract_fields(html, config)
+            except ImportError as e:
+                print(f"{fixture:24} {name:12} skipped ({e})")
+                continue
+            candidates[name] = lambda h, c=config: extract_fields(h, c)
+
+        baseline = None
+        for name, func in candidates.items():
+            seconds = time_per_page(func, html, args.iterations)
+            baseline = baseline or seconds
+            results.append({'fixture': fixture, 'bytes': len(html), 'backend': name,
+                            'ms_per_page': seconds * 1000, 'speedup': baseline / seconds})
+            print(f"{fixture:24} {name:12} {seconds * 1000:8.3f} ms/page  x{baseline / seconds:5.2f}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == '__main__':
+    main()
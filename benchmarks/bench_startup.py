@@ -0,0 +1,74 @@
+"""
+Startup cost of the entry points.
+
+    python benchmarks/bench_startup.py [--repeat 5] [--json out.json]
+
+Each target is imported (or run) in a fresh interpreter `repeat` times and
+the median wall time is reported, next to a bare `python -c pass`. The
+heavy optional dependencies that ended up imported are listed, so a module
+that starts importing selenium or pandas eagerly again shows up here.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ('selenium', 'undetected_chromedriver', 'twocaptcha', 'pandas', 'pyarrow', 'openpyxl', 'tkinter')
+
+TARGETS = {
+    'python': 'pass',
+    'cli': 'import cli',
+    'cli_config': 'import cli; cli.load_config',
+    'scraper': 'import scraper',
+    'scheduler': 'import scheduler',
+    'main': 'import main',
+    'gui': 'import gui',
+}
+
+REPORT = (
+    "import json, sys; "
+    f"print(json.dumps([name for name in {HEAVY_MODULES!r} if name in sys.modules]))"
+)
+
+
+def measure(code: str, repeat: int) -> dict:
+    times = []
+    loaded = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        output = subprocess.run([sys.executable, '-c', f'{code}\n{REPORT}'], cwd=ROOT,
+                                capture_output=True, text=True)
+        times.append(time.perf_counter() - started)
+        if output.returncode:
+            return {'error': output.stderr.strip().splitlines()[-1]}
+        loaded = json.loads(output.stdout.strip().splitlines()[-1])
+    return {'median_ms': statistics.median(times) * 1000, 'min_ms': min(times) * 1000, 'heavy_modules': loaded}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    results = {}
+    for name, code in TARGETS.items():
+        result = results[name] = measure(code, args.repeat)
+        if 'error' in result:
+            print(f"{name:12} failed: {result['error']}")
+        else:
+            print(f"{name:12} {result['median_ms']:8.1f} ms  (min {result['min_ms']:.1f})  "
+                  f"heavy: {', '.join(result['heavy_modules']) or '-'}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == '__main__':
+    main()
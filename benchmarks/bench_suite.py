@@ -0,0 +1,260 @@
+"""
+End-to-end benchmark suite against a local fake marketplace.
+
+    python benchmarks/bench_suite.py [--pages 2000] [--workers 16] [--latency 0.05] [--size 30000]
+                                     [--challenge-rate 0] [--error-rate 0] [--parse-workers 0]
+                                     [--rows 100000] [--only scrape,parse,db,export]
+                                     [--json out.json] [--compare baseline.json]
+
+scrape  Scraper.scrape_products over `pages` product pages of
+        fake_marketplace.py (served from a child process with the given
+        latency, page size, challenge and 503 shares): pages/s and the
+        stage timings and bytes from the scraper's metrics
+parse   parse_product per page with every parser backend installed
+db      products/s streamed into SQLite through Database.writer()
+export  rows/s of every exporter reading `rows` products back
+
+The JSON result records the git commit and Python version next to the
+figures; --compare prints how the headline figures moved against an
+earlier result, so a run on two versions shows a regression directly.
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from database import Database  # noqa: E402
+from fake_marketplace import SELECTORS, FakeMarketplace, product_page  # noqa: E402
+from models import Product, ScrapingConfig  # noqa: E402
+from parsing import BACKENDS, parse_product  # noqa: E402
+from scraper import Scraper  # noqa: E402
+
+SECTIONS = ('scrape', 'parse', 'db', 'export')
+EXTENSIONS = {'csv': 'csv', 'excel': 'xlsx', 'parquet': 'parquet', 'jsonl': 'jsonl'}
+
+
+def version_info() -> dict:
+    def git(*args):
+        try:
+            return subprocess.run(['git', *args], cwd=ROOT, capture_output=True, text=True,
+                                  check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    with open(os.path.join(ROOT, 'pyproject.toml'), encoding='utf-8') as f:
+        version = re.search(r'^version\s*=\s*"([^"]+)"', f.read(), re.MULTILINE)
+    status = git('status', '--porcelain', '--untracked-files=no')
+    return {
+        'version': version and version.group(1),
+        'commit': git('rev-parse', '--short', 'HEAD'),
+        'dirty': bool(status) if status is not None else None,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'date': datetime.now().isoformat(timespec='seconds'),
+    }
+
+
+def scrape_results(args) -> dict:
+    errors = []
+    with FakeMarketplace(args.latency, args.jitter, args.size, args.challenge_rate, args.error_rate,
+                         not args.no_gzip) as marketplace, tempfile.TemporaryDirectory() as tmp:
+        config = ScrapingConfig(
+            url_pattern=marketplace.base_url,
+            selectors=SELECTORS,
+            max_workers=args.workers,
+            max_per_host=args.workers,
+            min_delay=0.0,
+            max_delay=0.0,
+            adaptive_concurrency=False,
+            parser=args.parser,
+            parse_workers=args.parse_workers,
+            session_store_path=None,
+            frontier_path=os.path.join(tmp, 'frontier.db'),
+            incremental_db_path=os.path.join(tmp, 'scraper.db'),
+        )
+        scraper = Scraper(config)
+        try:
+            started = time.perf_counter()
+            products = scraper.scrape_products(marketplace.urls(args.pages),
+                                               error_callback=lambda url, e: errors.append(url), as_batch=True)
+            seconds = time.perf_counter() - started
+        finally:
+            scraper.close()
+        totals = scraper.metrics.totals()
+        return {
+            'pages': args.pages,
+            'products': len(products),
+            'errors': len(errors),
+            'challenged': marketplace.challenged(args.pages),
+            'seconds': seconds,
+            'pages_per_second': args.pages / seconds,
+            'mb_per_second': totals.get('bytes', 0) / (1024 * 1024) / seconds,
+            'bytes': totals.get('bytes', 0),
+            'stages': scraper.stage_stats,
+            'connections': scraper.connection_stats,
+        }
+
+
+def parse_results(args) -> dict:
+    config = ScrapingConfig('http://127.0.0.1/', SELECTORS)
+    pages = [(product_page(index, args.size).decode('utf-8'), f'http://127.0.0.1/p/{index}') for index in range(50)]
+    results = {}
+    for backend in BACKENDS:
+        config.parser = backend
+        try:
+            parse_product(*pages[0], config)  # imports the backend and compiles the selectors
+        except ImportError as e:
+            results[backend] = {'error': str(e)}
+            continue
+        started = time.perf_counter()
+        for _ in range(args.parse_rounds):
+            for html, url in pages:
+                parse_product(html, url, config)
+        count = args.parse_rounds * len(pages)
+        seconds = time.perf_counter() - started
+        results[backend] = {'pages': count, 'ms_per_page': seconds / count * 1000, 'pages_per_second': count / seconds}
+    return results
+
+
+def products(rows: int):
+    started = datetime(2024, 1, 1)
+    for i in range(rows):
+        yield Product(
+            id=None,
+            name=f'Product {i}',
+            price=round(10 + (i % 997) * 1.37, 2),
+            description='Lorem ipsum dolor sit amet, consectetur adipiscing elit ' * 2,
+            url=f'https://shop.example.com/p/{i}',
+            marketplace=f'shop{i % 5}.example.com',
+            created_at=started + timedelta(seconds=i),
+        )
+
+
+def db_results(rows: int, db_path: str) -> dict:
+    started = time.perf_counter()
+    with Database(db_path) as db, db.writer() as writer:
+        for product in products(rows):
+            writer.add(product)
+    seconds = time.perf_counter() - started
+    return {'rows': rows, 'seconds': seconds, 'rows_per_second': rows / seconds}
+
+
+def export_results(formats, db_path: str, tmp: str) -> dict:
+    from utils import EXPORTERS
+
+    results = {}
+    with Database(db_path) as db:
+        rows = db.conn.execute('SELECT COUNT(*) FROM products').fetchone()[0]
+        for fmt in formats:
+            out_path = os.path.join(tmp, f'export.{EXTENSIONS[fmt]}')
+            started = time.perf_counter()
+            try:
+                EXPORTERS[fmt](db.iter_batches(chunk_size=10000), out_path)
+            except ImportError as e:
+                results[fmt] = {'error': str(e)}
+                continue
+            seconds = time.perf_counter() - started
+            results[fmt] = {'rows': rows, 'seconds': seconds, 'rows_per_second': rows / seconds,
+                            'file_mb': os.path.getsize(out_path) / (1024 * 1024)}
+    return results
+
+
+def headline(results: dict) -> dict:
+    """Figures to compare between runs, all higher-is-better"""
+    figures = {}
+    if 'scrape' in results:
+        figures['scrape pages/s'] = results['scrape']['pages_per_second']
+    for backend, result in results.get('parse', {}).items():
+        if 'pages_per_second' in result:
+            figures[f'parse {backend} pages/s'] = result['pages_per_second']
+    if 'db' in results:
+        figures['db rows/s'] = results['db']['rows_per_second']
+    for fmt, result in results.get('export', {}).items():
+        if 'rows_per_second' in result:
+            figures[f'export {fmt} rows/s'] = result['rows_per_second']
+    return figures
+
+
+def compare(results: dict, baseline: dict):
+    before = headline(baseline)
+    version = baseline.get('version', {})
+    print(f"\nAgainst {version.get('commit') or '?'} ({version.get('date') or '?'}):")
+    for name, value in headline(results).items():
+        if before.get(name):
+            print(f"{name:32} {before[name]:12.1f} -> {value:12.1f}  {(value / before[name] - 1) * 100:+6.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--only', default=','.join(SECTIONS), help='sections to run')
+    parser.add_argument('--pages', type=int, default=2000)
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--parser', default='lxml', help='parser backend of the scrape section')
+    parser.add_argument('--parse-workers', type=int, default=0)
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds per response of the fake marketplace')
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--size', type=int, default=30000, help='bytes per product page')
+    parser.add_argument('--challenge-rate', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--no-gzip', action='store_true')
+    parser.add_argument('--parse-rounds', type=int, default=10, help='passes over the 50 parse pages')
+    parser.add_argument('--rows', type=int, default=100000, help='products for the db and export sections')
+    parser.add_argument('--formats', default='csv,excel,parquet,jsonl')
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--compare', help='earlier --json result to compare with')
+    args = parser.parse_args()
+
+    sections = args.only.split(',')
+    unknown = set(sections) - set(SECTIONS)
+    if unknown:
+        parser.error(f"unknown sections: {', '.join(sorted(unknown))}")
+
+    results = {'version': version_info(), 'settings': vars(args)}
+    if 'scrape' in sections:
+        scrape = results['scrape'] = scrape_results(args)
+        print(f"scrape   {scrape['pages']} pages in {scrape['seconds']:.1f} s: {scrape['pages_per_second']:.1f} pages/s, "
+              f"{scrape['mb_per_second']:.2f} MB/s, {scrape['errors']} errors ({scrape['challenged']} challenged)")
+        for stage, figures in scrape['stages'].items():
+            print(f"         {stage:10} avg {figures['avg'] * 1000:8.2f} ms  p95 {figures['p95'] * 1000:8.2f} ms")
+    if 'parse' in sections:
+        results['parse'] = parse_results(args)
+        for backend, result in results['parse'].items():
+            if 'error' in result:
+                print(f"parse    {backend:12} unavailable: {result['error']}")
+            else:
+                print(f"parse    {backend:12} {result['ms_per_page']:8.2f} ms/page")
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        if 'db' in sections or 'export' in sections:
+            db = db_results(args.rows, db_path)
+            if 'db' in sections:
+                results['db'] = db
+                print(f"db       {db['rows']} rows in {db['seconds']:.1f} s: {db['rows_per_second']:.0f} rows/s")
+        if 'export' in sections:
+            results['export'] = export_results(args.formats.split(','), db_path, tmp)
+            for fmt, result in results['export'].items():
+                if 'error' in result:
+                    print(f"export   {fmt:12} unavailable: {result['error']}")
+                else:
+                    print(f"export   {fmt:12} {result['seconds']:8.2f} s  {result['rows_per_second']:10.0f} rows/s  "
+                          f"{result['file_mb']:8.1f} MB")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == '__main__':
+    main()
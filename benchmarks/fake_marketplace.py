@@ -0,0 +1,193 @@
+"""
+A fake marketplace for benchmarks: product pages generated on request.
+
+    python benchmarks/fake_marketplace.py [--port 8000] [--latency 0.05] [--jitter 0.02] [--size 30000]
+                                          [--challenge-rate 0.1] [--error-rate 0.05] [--no-gzip]
+
+/p/<n> is product n, with the name, price and description at the places
+fixtures/selectors.json points to and padded with a related-products grid
+to about `size` bytes. Every response waits `latency` seconds, give or
+take up to `jitter`. A `challenge_rate` share of the products always
+answer with a Cloudflare interstitial (403), and an `error_rate` share of
+all requests get a 503 with Retry-After: 0, which a retry gets past.
+Bodies are gzipped for clients that accept it unless --no-gzip is given.
+Which products are challenged depends only on `n`, the 503s on `seed`.
+
+In a benchmark, FakeMarketplace runs the server in a child process so it
+does not compete with the scraper for the GIL.
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+with open(os.path.join(FIXTURES, 'selectors.json')) as _f:
+    SELECTORS = json.load(_f)
+
+WORDS = ('wireless', 'charging', 'ergonomic', 'travel', 'bluetooth', 'camera', 'steel', 'kitchen', 'tripod',
+         'foldable', 'fitness', 'tracker', 'noise', 'cancelling', 'battery', 'lightweight', 'keyboard', 'watch')
+CHALLENGE_PAGE = (b'<!DOCTYPE html><html><head><title>Just a moment...</title></head><body>'
+                  b'<div id="cf-browser-verification"><noscript>Enable JavaScript and cookies to continue'
+                  b'</noscript></div><script src="/cdn-cgi/challenge-platform/orchestrate/jsch/v1"></script>'
+                  b'</body></html>')
+_PRODUCT_PATH = re.compile(r'^/p/(\d+)$')
+
+
+def _words(rng: random.Random, count: int) -> str:
+    return ' '.join(rng.choice(WORDS) for _ in range(count)).capitalize()
+
+
+def product_page(index: int, size: int = 30000) -> bytes:
+    """Product `index` as HTML of roughly `size` bytes; the same every time"""
+    rng = random.Random(index)
+    name = _words(rng, 5)
+    price = 10 + rng.random() * 2000
+    head = (f'<!DOCTYPE html>\n<html lang="en"><head><meta charset="utf-8">'
+            f'<title>{name} | FakeMart</title></head><body>\n'
+            f'<nav class="breadcrumbs"><a href="/">Home</a> / <a href="/c/{index % 50}">Category</a></nav>\n'
+            f'<main class="product"><h1 class="product-title">{name}</h1>\n'
+            f'<div class="price-box"><span class="price-old">${price * 1.2:,.2f}</span>'
+            f'<span class="price-current">${price:,.2f}</span></div>\n'
+            f'<div class="product-description"><p>{_words(rng, 40)}.</p><p>{_words(rng, 30)}.</p></div>\n'
+            f'</main>\n<section class="related"><ul>\n')
+    items = []
+    length = len(head)
+    related = index
+    while length < size:
+        related += 1
+        item = (f'<li class="card"><a href="/p/{related}"><img src="/img/{related}.jpg" alt="">'
+                f'<span class="title">{_words(rng, 6)}</span></a>'
+                f'<span class="price">${10 + rng.random() * 2000:,.2f}</span></li>\n')
+        items.append(item)
+        length += len(item)
+    return (head + ''.join(items) + '</ul></section>\n</body></html>\n').encode('utf-8')
+
+
+def is_challenged(index: int, challenge_rate: float) -> bool:
+    # Multiplicative hashing spreads the challenged products evenly over the index range
+    return ((index + 1) * 2654435761) % 4294967296 < challenge_rate * 4294967296
+
+
+def make_server(port: int = 0, latency: float = 0.0, jitter: float = 0.0, size: int = 30000,
+                challenge_rate: float = 0.0, error_rate: float = 0.0, compress: bool = True,
+                seed: int = 0, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+    rng = random.Random(seed)
+    rng_lock = threading.Lock()
+
+    @lru_cache(maxsize=4096)
+    def body(index: int, gzipped: bool) -> bytes:
+        page = product_page(index, size)
+        return gzip.compress(page, compresslevel=6) if gzipped else page
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            with rng_lock:
+                delay = max(0.0, latency + rng.uniform(-jitter, jitter)) if jitter else latency
+                failed = error_rate and rng.random() < error_rate
+            if delay:
+                time.sleep(delay)
+            match = _PRODUCT_PATH.match(self.path.split('?', 1)[0])
+            if failed:
+                self.respond(503, b'Service Unavailable', {'Retry-After': '0'})
+            elif not match:
+                self.respond(404, b'Not Found')
+            elif is_challenged(int(match.group(1)), challenge_rate):
+                self.respond(403, CHALLENGE_PAGE)
+            else:
+                gzipped = compress and 'gzip' in self.headers.get('Accept-Encoding', '')
+                self.respond(200, body(int(match.group(1)), gzipped),
+                             {'Content-Encoding': 'gzip'} if gzipped else {})
+
+        def respond(self, status: int, data: bytes, headers: dict = None):
+            self.send_response(status)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    return server
+
+
+class FakeMarketplace:
+    """
+    The fake marketplace in a child process for the duration of a with
+    block; takes the keyword arguments of make_server()
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, size: int = 30000,
+                 challenge_rate: float = 0.0, error_rate: float = 0.0, compress: bool = True, seed: int = 0):
+        self.args = ['--port', '0', '--latency', str(latency), '--jitter', str(jitter), '--size', str(size),
+                     '--challenge-rate', str(challenge_rate), '--error-rate', str(error_rate), '--seed', str(seed)]
+        if not compress:
+            self.args.append('--no-gzip')
+        self.challenge_rate = challenge_rate
+        self.process = None
+        self.port = None
+
+    def __enter__(self) -> 'FakeMarketplace':
+        self.process = subprocess.Popen([sys.executable, os.path.abspath(__file__), *self.args],
+                                        stdout=subprocess.PIPE, text=True)
+        # The child prints its port once it accepts connections
+        self.port = int(self.process.stdout.readline())
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.process.terminate()
+        self.process.wait()
+
+    @property
+    def base_url(self) -> str:
+        return f'http://127.0.0.1:{self.port}/'
+
+    def urls(self, count: int, start: int = 0) -> List[str]:
+        return [f'{self.base_url}p/{index}' for index in range(start, start + count)]
+
+    def challenged(self, count: int, start: int = 0) -> int:
+        """How many of urls(count, start) answer with a challenge page"""
+        return sum(is_challenged(index, self.challenge_rate) for index in range(start, start + count))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8000, help='0 picks a free port')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds per response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='latency varies by up to this much')
+    parser.add_argument('--size', type=int, default=30000, help='bytes per product page')
+    parser.add_argument('--challenge-rate', type=float, default=0.0, help='share of products behind a challenge')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of requests answered with 503')
+    parser.add_argument('--no-gzip', action='store_true')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    server = make_server(args.port, args.latency, args.jitter, args.size, args.challenge_rate,
+                         args.error_rate, not args.no_gzip, args.seed)
+    print(server.server_address[1], flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
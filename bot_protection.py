@@ -1,9 +1,6 @@
 import undetected_chromedriver as uc
 from twocaptcha import TwoCaptcha
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-import time
+from waits import PageWaiter
 import os
 import platform
 import logging
@@ -55,6 +52,14 @@ class AdvancedProtectionHandler:
         """
         Initialize undetected-chromedriver for Cloudflare bypass
         """
+        self.driver = self.create_browser(headless)
+        return self.driver
+
+    def create_browser(self, headless=True):
+        """
+        Start a new undetected-chromedriver instance without attaching it to
+        the handler (used as a BrowserPool factory)
+        """
         try:
             logger.info(f"Инициализация браузера с binary_location: {self.chrome_binary}")
 
@@ -78,14 +83,14 @@ class AdvancedProtectionHandler:
             if not os.path.exists(driver_executable_path):
                 os.makedirs(driver_executable_path, exist_ok=True)
 
-            self.driver = uc.Chrome(
+            driver = uc.Chrome(
                 options=options,
                 driver_executable_path=driver_executable_path,
                 browser_executable_path=self.chrome_binary
             )
 
             logger.info("Браузер успешно инициализирован")
-            return self.driver
+            return driver
 
         except Exception as e:
             error_msg = f"Ошибка при инициализации браузера: {str(e)}"
@@ -109,47 +114,59 @@ class AdvancedProtectionHandler:
             logger.error(f"Error solving CAPTCHA: {str(e)}")
             return None
 
-    def handle_cloudflare(self, url, timeout=30):
+    def handle_cloudflare(self, url, timeout=30, driver=None, waiter=None):
         """
-        Handle Cloudflare protection
+        Handle Cloudflare protection. Uses `driver` when given (e.g. leased
+        from a BrowserPool), otherwise the handler's own browser. `waiter`
+        decides when the page is ready; by default we wait for the
+        challenge DOM to disappear
         """
-        if not self.driver:
-            self.init_browser()
+        if driver is None:
+            if not self.driver:
+                self.init_browser()
+            driver = self.driver
+        if waiter is None:
+            waiter = PageWaiter('challenge', timeout)
 
         try:
-            self.driver.get(url)
+            driver.get(url)
             # Wait for Cloudflare challenge to be solved
-            WebDriverWait(self.driver, timeout).until(
-                EC.presence_of_element_located((By.TAG_NAME, "body"))
-            )
-            time.sleep(5)  # Additional wait to ensure JavaScript execution
-            return self.driver.page_source
+            if not waiter.wait(driver):
+                logger.warning(f"Страница {url} не готова за {waiter.timeout} с, используем текущее содержимое")
+            return driver.page_source
         except Exception as e:
             error_msg = f"Ошибка при обходе защиты Cloudflare: {str(e)}"
             logger.error(error_msg)
             raise Exception(error_msg)
 
-    def handle_recaptcha(self, url, site_key):
+    def handle_recaptcha(self, url, site_key, driver=None, token=None):
         """
-        Handle reCAPTCHA challenge
+        Handle reCAPTCHA challenge. `token` is a response solved beforehand
+        (see captcha.CaptchaSolver); without it the CAPTCHA is solved here,
+        blocking until 2captcha answers
         """
-        if not self.solver:
-            raise ValueError("2captcha API key not provided")
-
-        captcha_response = self.solve_captcha(site_key, url)
+        if token:
+            captcha_response = token
+        else:
+            if not self.solver:
+                raise ValueError("2captcha API key not provided")
+            captcha_response = self.solve_captcha(site_key, url)
         if not captcha_response:
             return None
 
-        if not self.driver:
-            self.init_browser()
+        if driver is None:
+            if not self.driver:
+                self.init_browser()
+            driver = self.driver
 
         try:
+            driver.get(url)
             # Execute JavaScript to submit the CAPTCHA response
             script = f"""
             document.getElementById('g-recaptcha-response').innerHTML = '{captcha_response}';
             """
-            self.driver.execute_script(script)
-            return self.driver.page_source
+            driver.execute_script(script)
+            return driver.page_source
         except Exception as e:
             error_msg = f"Ошибка при решении капчи: {str(e)}"
             logger.error(error_msg)
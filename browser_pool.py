@@ -0,0 +1,243 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+
+def _browser_pids(driver) -> List[int]:
+    """
+    Processes a driver's browser runs under: the chromedriver service, whose
+    children are Chrome and its renderers, and the Chrome that
+    undetected_chromedriver starts on its own (`browser_pid`)
+    """
+    pids = []
+    process = getattr(getattr(driver, 'service', None), 'process', None)
+    if getattr(process, 'pid', None):
+        pids.append(process.pid)
+    if getattr(driver, 'browser_pid', None):
+        pids.append(driver.browser_pid)
+    return pids
+
+
+def _proc_tree_rss(pids: Iterable[int]) -> Optional[int]:
+    """process_tree_rss() from /proc, for Linux without psutil"""
+    children: Dict[int, List[int]] = {}
+    rss: Dict[int, int] = {}
+    page_size = os.sysconf('SC_PAGE_SIZE')
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat', 'rb') as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # The command name may hold spaces and parentheses: fields are counted after its closing ')'
+        fields = stat[stat.rfind(b')') + 2:].split()
+        pid = int(entry)
+        children.setdefault(int(fields[1]), []).append(pid)
+        rss[pid] = int(fields[21]) * page_size
+    stack = [pid for pid in pids if pid in rss]
+    if not stack:
+        return None
+    seen = set()
+    while stack:
+        pid = stack.pop()
+        if pid not in seen:
+            seen.add(pid)
+            stack.extend(children.get(pid, ()))
+    return sum(rss[pid] for pid in seen)
+
+
+def process_tree_rss(pids: Iterable[int]) -> Optional[int]:
+    """
+    Resident memory in bytes of `pids` and all their descendants, or None
+    where it cannot be read (no psutil and no /proc, or the processes are gone)
+    """
+    pids = list(pids)
+    if psutil is None:
+        return _proc_tree_rss(pids) if os.path.isdir('/proc') else None
+    processes = {}
+    for pid in pids:
+        try:
+            root = psutil.Process(pid)
+            for process in (root, *root.children(recursive=True)):
+                processes[process.pid] = process
+        except psutil.Error:
+            continue
+    total = 0
+    for process in processes.values():
+        try:
+            total += process.memory_info().rss
+        except psutil.Error:
+            pass
+    return total if processes else None
+
+
+class _PooledBrowser:
+    def __init__(self, driver):
+        self.driver = driver
+        self.pages = 0
+        self.baseline_memory: Optional[int] = None
+
+    def memory(self) -> Optional[int]:
+        """Resident bytes of the browser's whole process tree (browser, GPU, renderers)"""
+        pids = _browser_pids(self.driver)
+        return process_tree_rss(pids) if pids else None
+
+    def is_alive(self) -> bool:
+        try:
+            self.driver.current_url
+            return True
+        except Exception:
+            return False
+
+    def quit(self):
+        try:
+            self.driver.quit()
+        except Exception:
+            pass
+
+
+class BrowserPool:
+    """
+    Keeps up to `size` browser instances warm and leases them to workers.
+
+    A browser is recycled (quit and replaced on demand) after `max_pages`
+    pages or once the resident memory of its process tree has grown by more
+    than `max_memory_mb` since its first page. Lease wait times are
+    recorded for `stats()`.
+    """
+
+    def __init__(self, factory: Callable[[], object], size: int = 1,
+                 max_pages: int = 100, max_memory_mb: float = 512.0):
+        self.factory = factory
+        self.size = max(1, size)
+        self.max_pages = max_pages
+        self.max_memory_mb = max_memory_mb
+        self._idle: List[_PooledBrowser] = []
+        self._cond = threading.Condition()
+        self._live = 0
+        self._closed = False
+        self.created = 0
+        self.recycled = 0
+        self.leases = 0
+        self._waits = deque(maxlen=10000)
+
+    def warm_up(self, count: Optional[int] = None):
+        """Start browsers ahead of time so the first leases don't pay for startup"""
+        count = self.size if count is None else min(count, self.size)
+        while True:
+            with self._cond:
+                if self._live >= count:
+                    return
+                self._live += 1
+            self._release(self._create())
+
+    def _create(self) -> _PooledBrowser:
+        try:
+            driver = self.factory()
+        except Exception:
+            with self._cond:
+                self._live -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self.created += 1
+        return _PooledBrowser(driver)
+
+    def _acquire(self, timeout: Optional[float]) -> _PooledBrowser:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Browser pool is closed")
+                if self._idle:
+                    return self._idle.pop()
+                if self._live < self.size:
+                    self._live += 1
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError(f"No browser available within {timeout} s")
+                self._cond.wait(remaining)
+        return self._create()
+
+    def _release(self, browser: _PooledBrowser):
+        with self._cond:
+            self._idle.append(browser)
+            self._cond.notify()
+
+    def _discard(self, browser: _PooledBrowser):
+        browser.quit()
+        with self._cond:
+            self._live -= 1
+            self.recycled += 1
+            self._cond.notify()
+
+    def _should_recycle(self, browser: _PooledBrowser) -> bool:
+        if self.max_pages and browser.pages >= self.max_pages:
+            return True
+        memory = browser.memory()
+        if memory is None:
+            return False
+        if browser.baseline_memory is None:
+            browser.baseline_memory = memory
+            return False
+        return (memory - browser.baseline_memory) / (1024 * 1024) > self.max_memory_mb
+
+    @contextmanager
+    def lease(self, timeout: Optional[float] = None):
+        """Borrow a driver for the duration of the `with` block"""
+        started = time.monotonic()
+        browser = self._acquire(timeout)
+        with self._cond:
+            self.leases += 1
+            self._waits.append(time.monotonic() - started)
+
+        failed = False
+        try:
+            yield browser.driver
+        except Exception:
+            failed = True
+            raise
+        finally:
+            browser.pages += 1
+            if self._closed or (failed and not browser.is_alive()) or self._should_recycle(browser):
+                logger.info(f"Recycling browser after {browser.pages} pages")
+                self._discard(browser)
+            else:
+                self._release(browser)
+
+    def stats(self) -> dict:
+        with self._cond:
+            waits = sorted(self._waits)
+            leases, created, recycled = self.leases, self.created, self.recycled
+        return {
+            'size': self.size,
+            'leases': leases,
+            'created': created,
+            'recycled': recycled,
+            'wait_avg': sum(waits) / len(waits) if waits else 0.0,
+            'wait_p95': waits[int(len(waits) * 0.95)] if waits else 0.0,
+            'wait_max': waits[-1] if waits else 0.0,
+        }
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._live -= len(idle)
+            self._cond.notify_all()
+        for browser in idle:
+            browser.quit()
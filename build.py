@@ -15,6 +15,9 @@ def build_installer():
         '--hidden-import=selenium',
         '--hidden-import=beautifulsoup4',
         '--hidden-import=pandas',
+        '--hidden-import=openpyxl',
+        '--hidden-import=pyarrow',
+        '--hidden-import=psutil',
         '--hidden-import=requests',
         '--hidden-import=undetected_chromedriver',
         '--hidden-import=2captcha-python',
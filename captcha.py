@@ -0,0 +1,185 @@
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Deque, Dict, Optional, Tuple
+from engine import Deferred
+from throttle import host_of
+
+
+class SolverBackend:
+    """
+    A CAPTCHA solving service. `solve()` blocks until a token is ready and
+    is called from the solver's own threads, never from fetch workers.
+    """
+
+    def solve(self, site_key: str, page_url: str) -> str:
+        raise NotImplementedError
+
+
+class TwoCaptchaBackend(SolverBackend):
+    def __init__(self, api_key: str):
+        from twocaptcha import TwoCaptcha
+
+        self.client = TwoCaptcha(api_key)
+
+    def solve(self, site_key: str, page_url: str) -> str:
+        return self.client.recaptcha(sitekey=site_key, url=page_url)['code']
+
+
+class FakeSolver(SolverBackend):
+    """Local stand-in for tests and benchmarks: returns a unique token after `delay` seconds"""
+
+    def __init__(self, api_key: Optional[str] = None, delay: float = 0.5):
+        self.delay = delay
+        self.solves = 0
+        self._lock = threading.Lock()
+
+    def solve(self, site_key: str, page_url: str) -> str:
+        time.sleep(self.delay)
+        with self._lock:
+            self.solves += 1
+        return f'fake-{site_key}-{uuid.uuid4().hex}'
+
+
+SOLVER_BACKENDS = {
+    '2captcha': TwoCaptchaBackend,
+    'fake': FakeSolver,
+}
+
+
+class CaptchaPending(Deferred):
+    """No token for this page yet; FetchEngine retries the URL once `future` is done"""
+
+
+class CaptchaSolver:
+    """
+    Concurrent CAPTCHA solving with a cache of unused tokens.
+
+    Tokens are single-use and scoped to a site key and host, and live for
+    `token_ttl` seconds after they were issued. Solves run on up to
+    `max_concurrent` threads. A page without a token gets a solve started
+    for it and is told to come back later (CaptchaPending), so the fetch
+    worker moves on to other URLs. Pages announced with `expect()` are
+    solved ahead, up to `prefetch` tokens per host at a time, so their
+    tokens are usually ready by the time they are fetched.
+    """
+
+    def __init__(self, backend: SolverBackend, max_concurrent: int = 4, token_ttl: float = 110.0,
+                 prefetch: int = 2):
+        self.backend = backend
+        self.token_ttl = token_ttl
+        self.prefetch = prefetch
+        self._pool = ThreadPoolExecutor(max_workers=max(1, max_concurrent), thread_name_prefix='captcha')
+        self._lock = threading.Lock()
+        # (site key, host) -> tokens (token, expires at) and solves in flight
+        self._tokens: Dict[Tuple[str, str], Deque[Tuple[str, float]]] = {}
+        self._inflight: Dict[Tuple[str, str], int] = {}
+        # Solves started ahead that no waiting page has claimed yet
+        self._unclaimed: Dict[Tuple[str, str], Deque[Future]] = {}
+        self._expected: Dict[Tuple[str, str], int] = {}
+        self.solved = 0
+        self.failed = 0
+        self.expired = 0
+        self.used = 0
+        self.solve_time = 0.0
+
+    @classmethod
+    def from_config(cls, config) -> 'CaptchaSolver':
+        backend = SOLVER_BACKENDS[config.captcha_backend](config.captcha_api_key)
+        return cls(backend, config.captcha_workers, config.captcha_token_ttl, config.captcha_prefetch)
+
+    def _solve(self, key: Tuple[str, str], page_url: str) -> str:
+        started = time.monotonic()
+        try:
+            token = self.backend.solve(key[0], page_url)
+        except Exception:
+            with self._lock:
+                self._inflight[key] -= 1
+                self.failed += 1
+            raise
+        with self._lock:
+            self._inflight[key] -= 1
+            self.solved += 1
+            self.solve_time += time.monotonic() - started
+            self._tokens.setdefault(key, deque()).append((token, time.time() + self.token_ttl))
+        return token
+
+    def _submit(self, key: Tuple[str, str], page_url: str, claimed: bool = True) -> Future:
+        # Caller holds the lock
+        self._inflight[key] = self._inflight.get(key, 0) + 1
+        future = self._pool.submit(self._solve, key, page_url)
+        if not claimed:
+            self._unclaimed.setdefault(key, deque()).append(future)
+        return future
+
+    def _take(self, key: Tuple[str, str]) -> Optional[str]:
+        tokens = self._tokens.get(key)
+        now = time.time()
+        while tokens:
+            token, expires_at = tokens.popleft()
+            if expires_at > now:
+                self.used += 1
+                return token
+            self.expired += 1
+        return None
+
+    def _top_up(self, key: Tuple[str, str], page_url: str):
+        # Caller holds the lock
+        now = time.time()
+        ready = sum(1 for _, expires_at in self._tokens.get(key, ()) if expires_at > now)
+        unclaimed = self._unclaimed.get(key)
+        while unclaimed and unclaimed[0].done():
+            unclaimed.popleft()
+        wanted = min(self.prefetch, self._expected.get(key, 0))
+        for _ in range(wanted - ready - len(unclaimed or ())):
+            self._submit(key, page_url, claimed=False)
+
+    def expect(self, site_key: str, page_url: str, count: int):
+        """Announce `count` upcoming pages on the host of `page_url` and start solving ahead"""
+        key = (site_key, host_of(page_url))
+        with self._lock:
+            self._expected[key] = count
+            self._top_up(key, page_url)
+
+    def token_for(self, site_key: str, page_url: str) -> str:
+        """
+        A cached token for the page, or CaptchaPending with the future of a
+        solve that will produce one
+        """
+        key = (site_key, host_of(page_url))
+        with self._lock:
+            if self._expected.get(key):
+                self._expected[key] -= 1
+            token = self._take(key)
+            if token is None:
+                unclaimed = self._unclaimed.get(key)
+                future = unclaimed.popleft() if unclaimed else self._submit(key, page_url)
+            self._top_up(key, page_url)
+        if token is None:
+            raise CaptchaPending(future)
+        return token
+
+    def solve(self, site_key: str, page_url: str, timeout: Optional[float] = None) -> str:
+        """Blocking variant of token_for()"""
+        while True:
+            try:
+                return self.token_for(site_key, page_url)
+            except CaptchaPending as pending:
+                pending.future.result(timeout)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'solved': self.solved,
+                'failed': self.failed,
+                'expired': self.expired,
+                'used': self.used,
+                'in_flight': sum(self._inflight.values()),
+                'cached': sum(len(tokens) for tokens in self._tokens.values()),
+                'solve_avg': self.solve_time / self.solved if self.solved else 0.0,
+            }
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,222 @@
+"""
+Headless scraping without the GUI.
+
+    python cli.py scrape --config scraper_config.json --urls urls.txt [--output products.csv]
+    python cli.py scrape --config scraper_config.json --discover
+    python cli.py discover --config scraper_config.json > urls.txt
+
+--config is either a ConfigManager file (pick an entry with --marketplace
+if it holds several) or a single ScrapingConfig as JSON. Products go into
+the database and, with --output, into a csv / xlsx / parquet / jsonl file.
+--discover (or the discover command) finds product URLs in the config's
+sitemaps and listing pages. --metrics-file / --metrics-port export the
+stage timings, per-host histograms and bytes transferred (see metrics.py).
+
+Only what a run needs is imported: selenium, undetected_chromedriver and
+the CAPTCHA client are loaded the first time a page needs a browser, so an
+HTTP-only run starts in a fraction of a second.
+"""
+import argparse
+import dataclasses
+import json
+import os
+import sys
+from typing import Callable, Iterable, Optional
+from metrics import MetricsServer, ScrapeMetrics
+from models import ProductBatch, ScrapingConfig
+
+EXPORT_FORMATS = {
+    '.csv': 'csv',
+    '.xlsx': 'excel',
+    '.parquet': 'parquet',
+    '.jsonl': 'jsonl',
+}
+
+
+def load_config(path: str, marketplace: Optional[str] = None) -> ScrapingConfig:
+    """A ScrapingConfig from a single-config JSON file or a ConfigManager file"""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if 'url_pattern' in data:
+        return ScrapingConfig(**data)
+    if marketplace is None:
+        if len(data) != 1:
+            raise ValueError(f"{path} holds {len(data)} marketplaces, choose one of: {', '.join(data)}")
+        marketplace = next(iter(data))
+    if marketplace not in data:
+        raise ValueError(f"No marketplace {marketplace!r} in {path}")
+    return ScrapingConfig(**data[marketplace])
+
+
+def read_urls(path: str) -> Iterable[str]:
+    """One URL per line; blank lines and # comments are skipped. '-' reads stdin"""
+    f = sys.stdin if path == '-' else open(path, 'r', encoding='utf-8')
+    try:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith('#')]
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def scrape(config: ScrapingConfig, urls: Iterable[str] = (), db_path: Optional[str] = 'scraper.db',
+           resume: bool = False, progress_callback: Optional[Callable[[float], None]] = None,
+           error_callback: Optional[Callable[[str, Exception], None]] = None,
+           discover: bool = False, metrics: Optional[ScrapeMetrics] = None) -> ProductBatch:
+    """
+    Scrape `urls` through the config's frontier and return the products
+    as a ProductBatch; they are also written to `db_path` unless it is
+    None. With `resume` the URLs left unfinished by an interrupted run are
+    scraped as well, otherwise the frontier starts empty. With `discover`
+    the URLs found by UrlDiscovery are added to `urls`. Stage timings go
+    to `metrics` if given. In incremental mode the fingerprints are kept
+    in `db_path` as well, next to the products they describe.
+    """
+    from database import Database
+    from frontier import Frontier
+    from scraper import Scraper
+
+    if db_path is not None:
+        config = dataclasses.replace(config, incremental_db_path=db_path)
+    products = ProductBatch()
+    frontier = Frontier.from_config(config)
+    scraper = Scraper(config, metrics=metrics)
+    try:
+        if not resume:
+            frontier.clear()
+        frontier.add(urls)
+        if discover:
+            from discovery import UrlDiscovery
+
+            discovery = UrlDiscovery(config, scraper.http)
+            discovery.feed(frontier)
+        if db_path is None:
+            scraper.crawl(frontier, progress_callback, products.append, error_callback)
+            return products
+        with Database(db_path) as db, db.writer(metrics=scraper.metrics) as writer:
+            def on_product(product):
+                products.append(product)
+                writer.add(product)
+
+            scraper.crawl(frontier, progress_callback, on_product, error_callback)
+        return products
+    finally:
+        scraper.close()
+        frontier.close()
+
+
+def export(products: ProductBatch, path: str, fmt: Optional[str] = None):
+    from utils import EXPORTERS
+
+    fmt = fmt or EXPORT_FORMATS.get(os.path.splitext(path)[1].lower())
+    if fmt not in EXPORTERS:
+        raise ValueError(f"Unknown export format for {path}, use --format")
+    EXPORTERS[fmt](products, path)
+
+
+def print_stages(stages: dict):
+    for stage, figures in stages.items():
+        print(f"{stage:10} {figures['count']:8} x  среднее {figures['avg'] * 1000:8.1f} мс  "
+              f"p50 {figures['p50'] * 1000:8.1f} мс  p95 {figures['p95'] * 1000:8.1f} мс", file=sys.stderr)
+
+
+def run_scrape(args) -> int:
+    if not args.urls and not args.discover:
+        print("Ошибка: нужен --urls или --discover", file=sys.stderr)
+        return 2
+    try:
+        config = load_config(args.config, args.marketplace)
+        urls = read_urls(args.urls) if args.urls else []
+    except (OSError, ValueError) as e:
+        print(f"Ошибка: {e}", file=sys.stderr)
+        return 2
+    if args.workers:
+        config.max_workers = args.workers
+    if args.metrics_file:
+        config.metrics_path = args.metrics_file
+    errors = []
+    last_reported = -10.0
+
+    def on_progress(percent):
+        nonlocal last_reported
+        if not args.quiet and percent - last_reported >= 10:
+            last_reported = percent
+            print(f"{percent:5.1f}%", file=sys.stderr)
+
+    def on_error(url, e):
+        errors.append(url)
+        if not args.quiet:
+            print(f"Ошибка {url}: {e}", file=sys.stderr)
+
+    metrics = ScrapeMetrics()
+    port = args.metrics_port or config.metrics_port
+    server = MetricsServer(metrics, port) if port else None
+    try:
+        products = scrape(config, urls, args.db, args.resume, on_progress, on_error, args.discover, metrics)
+    finally:
+        if server:
+            server.close()
+    if args.output:
+        export(products, args.output, args.format)
+    if not args.quiet:
+        print_stages(metrics.summary())
+    print(f"Собрано {len(products)} товаров, ошибок: {len(errors)}", file=sys.stderr)
+    return 1 if errors and not len(products) else 0
+
+
+def run_discover(args) -> int:
+    from discovery import UrlDiscovery
+
+    try:
+        config = load_config(args.config, args.marketplace)
+    except (OSError, ValueError) as e:
+        print(f"Ошибка: {e}", file=sys.stderr)
+        return 2
+    discovery = UrlDiscovery(config)
+    output = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    try:
+        for url in discovery.discover():
+            output.write(url + '\n')
+    finally:
+        discovery.close()
+        if output is not sys.stdout:
+            output.close()
+    print(json.dumps(discovery.stats()), file=sys.stderr)
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    scrape_parser = commands.add_parser('scrape', help='scrape a list of URLs')
+    scrape_parser.add_argument('--config', required=True, help='config JSON file')
+    scrape_parser.add_argument('--marketplace', help='entry of a ConfigManager file')
+    scrape_parser.add_argument('--urls', help="file with one URL per line, '-' for stdin")
+    scrape_parser.add_argument('--discover', action='store_true', help="also scrape the URLs UrlDiscovery finds")
+    scrape_parser.add_argument('--db', default='scraper.db', help='database to store products in')
+    scrape_parser.add_argument('--output', help='also export the products to this file')
+    scrape_parser.add_argument('--format', choices=sorted(set(EXPORT_FORMATS.values())),
+                               help='export format (default: from the file extension)')
+    scrape_parser.add_argument('--workers', type=int, help='override max_workers of the config')
+    scrape_parser.add_argument('--resume', action='store_true', help='also finish an interrupted run')
+    scrape_parser.add_argument('--metrics-file', help='write stage timings here (.json = JSON, else Prometheus text)')
+    scrape_parser.add_argument('--metrics-port', type=int, help='serve /metrics and /metrics.json on this local port')
+    scrape_parser.add_argument('--quiet', action='store_true')
+    scrape_parser.set_defaults(handler=run_scrape)
+
+    discover_parser = commands.add_parser('discover', help='list product URLs from sitemaps and listing pages')
+    discover_parser.add_argument('--config', required=True, help='config JSON file')
+    discover_parser.add_argument('--marketplace', help='entry of a ConfigManager file')
+    discover_parser.add_argument('--output', help='write the URLs here instead of stdout')
+    discover_parser.set_defaults(handler=run_discover)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == '__main__':
+    # Needed by the parse process pool in frozen (PyInstaller) builds
+    import multiprocessing
+
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -26,7 +26,57 @@ class ConfigManager:
                 'selectors': config.selectors,
                 'use_selenium': config.use_selenium,
                 'headers': config.headers,
-                'proxy': config.proxy
+                'proxy': config.proxy,
+                'captcha_backend': config.captcha_backend,
+                'captcha_workers': config.captcha_workers,
+                'captcha_token_ttl': config.captcha_token_ttl,
+                'captcha_prefetch': config.captcha_prefetch,
+                'fetch_escalation': config.fetch_escalation,
+                'session_store_path': config.session_store_path,
+                'session_ttl': config.session_ttl,
+                'max_workers': config.max_workers,
+                'max_per_host': config.max_per_host,
+                'requests_per_second': config.requests_per_second,
+                'burst': config.burst,
+                'min_delay': config.min_delay,
+                'max_delay': config.max_delay,
+                'connect_timeout': config.connect_timeout,
+                'read_timeout': config.read_timeout,
+                'browser_pool_size': config.browser_pool_size,
+                'browser_max_pages': config.browser_max_pages,
+                'browser_max_memory_mb': config.browser_max_memory_mb,
+                'wait_strategy': config.wait_strategy,
+                'wait_timeout': config.wait_timeout,
+                'network_idle_time': config.network_idle_time,
+                'parser': config.parser,
+                'parse_workers': config.parse_workers,
+                'parse_queue_size': config.parse_queue_size,
+                'http_cache_path': config.http_cache_path,
+                'http_cache_ttl': config.http_cache_ttl,
+                'http_cache_max_mb': config.http_cache_max_mb,
+                'incremental': config.incremental,
+                'incremental_db_path': config.incremental_db_path,
+                'frontier_path': config.frontier_path,
+                'max_attempts': config.max_attempts,
+                'retry_delay': config.retry_delay,
+                'max_retries': config.max_retries,
+                'retry_base_delay': config.retry_base_delay,
+                'retry_max_delay': config.retry_max_delay,
+                'breaker_threshold': config.breaker_threshold,
+                'breaker_reset': config.breaker_reset,
+                'adaptive_concurrency': config.adaptive_concurrency,
+                'price_locale': config.price_locale,
+                'schedule': config.schedule,
+                'urls_file': config.urls_file,
+                'discover_urls': config.discover_urls,
+                'sitemap_urls': config.sitemap_urls,
+                'listing_urls': config.listing_urls,
+                'product_link_selector': config.product_link_selector,
+                'next_page_selector': config.next_page_selector,
+                'max_listing_pages': config.max_listing_pages,
+                'discovery_capacity': config.discovery_capacity,
+                'metrics_path': config.metrics_path,
+                'metrics_port': config.metrics_port
             }
             for name, config in self.marketplace_configs.items()
         }
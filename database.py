@@ -1,14 +1,39 @@
 import sqlite3
-from typing import Optional
-from models import Product
+import time
+from itertools import islice
+from datetime import datetime
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+from models import Product, ProductBatch
+
+PRODUCT_COLUMNS = 'id, name, price, description, url, marketplace, created_at'
+SORT_COLUMNS = ('id', 'name', 'price', 'marketplace', 'created_at')
+JOURNAL_MODES = ('DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF')
+SYNCHRONOUS_LEVELS = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+
 
 class Database:
-    def __init__(self, db_path: str = 'scraper.db'):
+    def __init__(self, db_path: str = 'scraper.db', journal_mode: Optional[str] = 'WAL',
+                 synchronous: Optional[str] = 'NORMAL'):
+        """
+        journal_mode / synchronous are applied as PRAGMAs on connect; None keeps
+        SQLite's defaults. WAL + NORMAL syncs on checkpoints instead of on every
+        commit, which is safe against application crashes
+        """
+        if journal_mode and journal_mode.upper() not in JOURNAL_MODES:
+            raise ValueError(f"Unknown journal mode: {journal_mode}")
+        if synchronous and synchronous.upper() not in SYNCHRONOUS_LEVELS:
+            raise ValueError(f"Unknown synchronous level: {synchronous}")
         self.db_path = db_path
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
         self.conn: Optional[sqlite3.Connection] = None
 
     def connect(self):
         self.conn = sqlite3.connect(self.db_path)
+        if self.journal_mode:
+            self.conn.execute(f'PRAGMA journal_mode={self.journal_mode.upper()}')
+        if self.synchronous:
+            self.conn.execute(f'PRAGMA synchronous={self.synchronous.upper()}')
         Product.create_table(self.conn)
 
     def close(self):
@@ -16,9 +41,197 @@ class Database:
             self.conn.close()
             self.conn = None
 
+    def save_many(self, products: Union[Iterable[Product], ProductBatch], batch_size: int = 500) -> int:
+        """
+        Insert products with executemany, one transaction per batch.
+        Unlike Product.save, ids of the inserted products are not set.
+        A ProductBatch is inserted straight from its columns.
+        """
+        if isinstance(products, ProductBatch):
+            for chunk in products.chunks(batch_size):
+                with self.conn:
+                    Product.insert_rows(self.conn, chunk.rows(epoch=True))
+            return len(products)
+        products = iter(products)
+        saved = 0
+        while True:
+            batch = list(islice(products, batch_size))
+            if not batch:
+                return saved
+            with self.conn:
+                Product.insert_many(self.conn, batch)
+            saved += len(batch)
+
+    @staticmethod
+    def _where(marketplace: Optional[str], url: Optional[str],
+               since: Optional[datetime], until: Optional[datetime],
+               search: Optional[str] = None):
+        clauses, params = [], []
+        if search:
+            clauses.append("name LIKE ? ESCAPE '\\'")
+            escaped = search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            params.append(f'%{escaped}%')
+        if marketplace:
+            clauses.append('marketplace = ?')
+            params.append(marketplace)
+        if url:
+            clauses.append('url = ?')
+            params.append(url)
+        if since:
+            clauses.append('created_at >= ?')
+            params.append(since)
+        if until:
+            clauses.append('created_at < ?')
+            params.append(until)
+        return clauses, params
+
+    def _query_rows(self, marketplace: Optional[str] = None, url: Optional[str] = None,
+                    since: Optional[datetime] = None, until: Optional[datetime] = None,
+                    after_id: Optional[int] = None, limit: int = 100,
+                    descending: bool = False, order_by: str = 'id',
+                    after_key: Optional[Tuple] = None,
+                    search: Optional[str] = None) -> sqlite3.Cursor:
+        """Cursor over the raw rows of one page, see query_products()"""
+        if order_by not in SORT_COLUMNS:
+            raise ValueError(f"Cannot sort by {order_by}")
+        clauses, params = self._where(marketplace, url, since, until, search)
+        comparison = '<' if descending else '>'
+        if order_by == 'id':
+            if after_id is not None:
+                clauses.append(f'id {comparison} ?')
+                params.append(after_id)
+            order = 'id'
+        else:
+            if after_key is not None:
+                clauses.append(f'({order_by}, id) {comparison} (?, ?)')
+                params.extend(after_key)
+            order = f'{order_by} {"DESC" if descending else "ASC"}, id'
+        sql = f'SELECT {PRODUCT_COLUMNS} FROM products'
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        sql += f' ORDER BY {order} {"DESC" if descending else "ASC"} LIMIT ?'
+        params.append(limit)
+        return self.conn.execute(sql, params)
+
+    def query_products(self, marketplace: Optional[str] = None, url: Optional[str] = None,
+                       since: Optional[datetime] = None, until: Optional[datetime] = None,
+                       after_id: Optional[int] = None, limit: int = 100,
+                       descending: bool = False, order_by: str = 'id',
+                       after_key: Optional[Tuple] = None,
+                       search: Optional[str] = None) -> List[Product]:
+        """
+        One page of products ordered by id. Pass the id of the last product
+        of the previous page as `after_id` to get the next page; unlike
+        OFFSET this costs the same however deep the page is.
+
+        With another `order_by` column rows are ordered by (column, id) and
+        the page continues after `after_key`, see sort_key(). `search`
+        matches a substring of the name.
+        """
+        rows = self._query_rows(marketplace, url, since, until, after_id, limit,
+                                descending, order_by, after_key, search)
+        return [Product.from_row(row) for row in rows]
+
+    @staticmethod
+    def sort_key(product: Product, order_by: str) -> Tuple:
+        """Keyset position of `product` for query_products(order_by=..., after_key=...)"""
+        return (getattr(product, order_by), product.id)
+
+    def iter_products(self, marketplace: Optional[str] = None, url: Optional[str] = None,
+                      since: Optional[datetime] = None, until: Optional[datetime] = None,
+                      chunk_size: int = 1000) -> Iterator[Product]:
+        """Stream all matching products, holding at most `chunk_size` rows in memory"""
+        after_id = None
+        while True:
+            page = self.query_products(marketplace, url, since, until, after_id, chunk_size)
+            yield from page
+            if len(page) < chunk_size:
+                return
+            after_id = page[-1].id
+
+    def iter_batches(self, marketplace: Optional[str] = None, url: Optional[str] = None,
+                     since: Optional[datetime] = None, until: Optional[datetime] = None,
+                     chunk_size: int = 10000) -> Iterator[ProductBatch]:
+        """Like iter_products, but yields one ProductBatch per chunk instead of Product objects"""
+        after_id = None
+        while True:
+            batch = ProductBatch.from_rows(self._query_rows(marketplace, url, since, until, after_id, chunk_size))
+            if batch:
+                yield batch
+            if len(batch) < chunk_size:
+                return
+            after_id = batch.ids[-1]
+
+    def count_products(self, marketplace: Optional[str] = None, url: Optional[str] = None,
+                       since: Optional[datetime] = None, until: Optional[datetime] = None,
+                       search: Optional[str] = None) -> int:
+        clauses, params = self._where(marketplace, url, since, until, search)
+        sql = 'SELECT COUNT(*) FROM products'
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        return self.conn.execute(sql, params).fetchone()[0]
+
+    def writer(self, batch_size: int = 500, flush_interval: float = 2.0, metrics=None) -> 'ProductWriter':
+        return ProductWriter(self, batch_size, flush_interval, metrics)
+
     def __enter__(self):
         self.connect()
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.close()
+
+
+class ProductWriter:
+    """
+    Streams products into the database while a scrape is running: products
+    are buffered and written in batches of `batch_size`, or sooner once
+    `flush_interval` seconds have passed since the last write. Must be used
+    from the thread that owns the Database connection, e.g. as the
+    result_callback of Scraper.scrape_products. Each batch write is timed
+    as the db_write stage of `metrics` (a ScrapeMetrics) if given.
+    """
+
+    def __init__(self, db: Database, batch_size: int = 500, flush_interval: float = 2.0, metrics=None):
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.metrics = metrics
+        self.written = 0
+        self._buffer = ProductBatch()
+        self._last_flush = time.monotonic()
+
+    def add(self, product: Product):
+        self._buffer.append(product)
+        if (len(self._buffer) >= self.batch_size
+                or time.monotonic() - self._last_flush >= self.flush_interval):
+            self.flush()
+
+    def add_batch(self, batch: ProductBatch):
+        """Write a whole batch now, after anything still buffered"""
+        self.flush()
+        self._save(batch)
+
+    def flush(self):
+        if self._buffer:
+            self._save(self._buffer)
+            self._buffer = ProductBatch()
+        self._last_flush = time.monotonic()
+
+    def _save(self, batch: ProductBatch):
+        if not self.metrics:
+            self.written += self.db.save_many(batch, self.batch_size)
+            return
+        with self.metrics.stage('db_write'):
+            saved = self.db.save_many(batch, self.batch_size)
+        self.metrics.add('db_rows', saved)
+        self.written += saved
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
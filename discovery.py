@@ -0,0 +1,266 @@
+import fnmatch
+import gzip
+import hashlib
+import io
+import logging
+import math
+import random
+import re
+import time
+import xml.etree.ElementTree as ET
+from collections import deque
+from itertools import count, islice
+from typing import Iterable, Iterator, List, Optional
+from urllib.parse import urldefrag, urljoin, urlsplit
+from http_session import HttpSessionPool
+from parsing import get_backend
+from retry import check_response
+
+logger = logging.getLogger(__name__)
+
+_GZIP_MAGIC = b'\x1f\x8b'
+_SITEMAP_LINE = re.compile(r'^\s*sitemap\s*:\s*(\S+)', re.IGNORECASE | re.MULTILINE)
+
+
+class BloomFilter:
+    """
+    Set membership in a fixed bit array: about 1.2 bytes per URL at a 0.1%
+    error rate, so ten million URLs take 18 MB instead of gigabytes as a
+    set of strings. Never reports an added item as missing; reports an
+    item that was never added as present with probability `error_rate`
+    (while no more than `capacity` items were added).
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        capacity = max(1, capacity)
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str) -> List[int]:
+        # Double hashing: k positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, item: str) -> bool:
+        """Add `item`; True if it was not in the filter yet"""
+        added = False
+        bits = self.bits
+        for position in self._positions(item):
+            byte, mask = position >> 3, 1 << (position & 7)
+            if not bits[byte] & mask:
+                bits[byte] |= mask
+                added = True
+        self.count += added
+        return added
+
+    def __contains__(self, item: str) -> bool:
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    def __len__(self) -> int:
+        return self.count
+
+    @property
+    def memory_bytes(self) -> int:
+        return len(self.bits)
+
+
+def absolute_url(base: str, href: str) -> str:
+    """`href` resolved against `base`, without a #fragment"""
+    # Sitemap locations are nearly always absolute already; urljoin is the slow part of a sitemap
+    if not href.startswith(('http://', 'https://')):
+        href = urljoin(base, href)
+    return urldefrag(href)[0] if '#' in href else href
+
+
+def url_filter(url_pattern: str):
+    """
+    Predicate for URLs matching a config's url_pattern: a glob if it holds
+    * or ?, otherwise a prefix
+    """
+    if '*' in url_pattern or '?' in url_pattern:
+        return re.compile(fnmatch.translate(url_pattern)).match
+    return lambda url: url.startswith(url_pattern)
+
+
+class UrlDiscovery:
+    """
+    Streams product URLs of a marketplace from its sitemaps and listing
+    pages.
+
+    Sitemaps are read incrementally with iterparse, so a 50 MB urlset never
+    sits in memory whole; sitemap indexes are followed and gzipped files
+    are unpacked on the fly. Listing pages are followed through their
+    next-page links, or by counting up a '{page}' placeholder until a page
+    brings no new product links. Only URLs matching `url_pattern` are
+    yielded, each once per run: the dedupe is a BloomFilter sized for
+    `discovery_capacity` URLs, so a false positive may drop a new URL now
+    and then (about 0.1%), which the next run makes up for.
+    """
+
+    def __init__(self, config, http: Optional[HttpSessionPool] = None):
+        self.config = config
+        self.http = http or HttpSessionPool.from_config(config)
+        self._owns_http = http is None
+        self.matches = url_filter(config.url_pattern)
+        self.seen = BloomFilter(config.discovery_capacity)
+        self._backend = get_backend(config.parser)
+        self._product_links = self._backend.compile(config.product_link_selector)
+        self._next_links = self._backend.compile(config.next_page_selector)
+        self._last_request = 0.0
+        self.sitemaps = 0
+        self.pages = 0
+        self.found = 0
+        self.duplicates = 0
+        self.skipped = 0
+        self.errors = 0
+
+    def _get(self, url: str, stream: bool = False):
+        # One request at a time, spaced like page fetches of the same host
+        wait = self._last_request + random.uniform(self.config.min_delay, self.config.max_delay) - time.monotonic()
+        if self._last_request and wait > 0:
+            time.sleep(wait)
+        self._last_request = time.monotonic()
+        response = self.http.get(url, headers=self.config.headers, stream=stream)
+        check_response(response)
+        return response
+
+    def _new(self, url: str) -> bool:
+        if not self.matches(url):
+            self.skipped += 1
+            return False
+        if not self.seen.add(url):
+            self.duplicates += 1
+            return False
+        self.found += 1
+        return True
+
+    def robots_sitemaps(self) -> List[str]:
+        """Sitemaps listed in the host's robots.txt, or /sitemap.xml if it lists none"""
+        parts = urlsplit(self.config.url_pattern)
+        root = f'{parts.scheme}://{parts.netloc}'
+        try:
+            sitemaps = _SITEMAP_LINE.findall(self._get(f'{root}/robots.txt').text)
+        except Exception as e:
+            logger.info(f"robots.txt недоступен для {root}: {e}")
+            sitemaps = []
+        return sitemaps or [f'{root}/sitemap.xml']
+
+    def _read_sitemap(self, url: str) -> Iterator[tuple]:
+        """('sitemap' | 'url', loc) entries of one sitemap file, read as it downloads"""
+        response = self._get(url, stream=True)
+        try:
+            response.raw.decode_content = True
+            # Keep the raw stream readable at EOF for the buffered reader on top of it
+            response.raw.auto_close = False
+            stream = io.BufferedReader(response.raw)
+            if stream.peek(2)[:2] == _GZIP_MAGIC:
+                stream = gzip.GzipFile(fileobj=stream)
+            kind = None
+            root = None
+            for event, element in ET.iterparse(stream, events=('start', 'end')):
+                tag = element.tag.rsplit('}', 1)[-1]
+                if event == 'start':
+                    if root is None:
+                        root = element
+                        kind = 'sitemap' if tag == 'sitemapindex' else 'url'
+                    continue
+                if tag == 'loc' and element.text:
+                    yield kind, element.text.strip()
+                elif tag in ('url', 'sitemap'):
+                    # Drop finished entries so memory stays flat
+                    root.clear()
+        finally:
+            response.close()
+
+    def from_sitemaps(self, sitemaps: Iterable[str]) -> Iterator[str]:
+        queue = deque(sitemaps)
+        visited = set()
+        while queue:
+            sitemap = queue.popleft()
+            if sitemap in visited:
+                continue
+            visited.add(sitemap)
+            self.sitemaps += 1
+            try:
+                for kind, loc in self._read_sitemap(sitemap):
+                    loc = absolute_url(sitemap, loc)
+                    if kind == 'sitemap':
+                        queue.append(loc)
+                    elif self._new(loc):
+                        yield loc
+            except Exception as e:
+                self.errors += 1
+                logger.warning(f"Не удалось прочитать sitemap {sitemap}: {e}")
+
+    def from_listing(self, listing: str) -> Iterator[str]:
+        """Product links of a paginated listing, starting from its first page"""
+        numbered = '{page}' in listing
+        pages = (listing.replace('{page}', str(n)) for n in count(1)) if numbered else None
+        url = next(pages) if numbered else listing
+        visited = set()
+        for _ in range(self.config.max_listing_pages):
+            if url in visited:
+                break
+            visited.add(url)
+            self.pages += 1
+            try:
+                html = self._get(url).text
+            except Exception as e:
+                self.errors += 1
+                logger.warning(f"Не удалось загрузить страницу каталога {url}: {e}")
+                break
+            new = 0
+            for href in self._backend.links(html, self._product_links):
+                link = absolute_url(url, href)
+                if self._new(link):
+                    new += 1
+                    yield link
+            if numbered:
+                if not new:
+                    break
+                url = next(pages)
+            else:
+                next_links = self._backend.links(html, self._next_links)
+                if not next_links:
+                    break
+                url = urljoin(url, next_links[0])
+
+    def discover(self) -> Iterator[str]:
+        """New product URLs from every configured source"""
+        sitemaps = self.config.sitemap_urls
+        if not sitemaps and not self.config.listing_urls:
+            sitemaps = self.robots_sitemaps()
+        if sitemaps:
+            yield from self.from_sitemaps(sitemaps)
+        for listing in self.config.listing_urls or ():
+            yield from self.from_listing(listing)
+
+    def feed(self, frontier, batch_size: int = 1000) -> int:
+        """Add discovered URLs to `frontier` in batches; returns how many were new to it"""
+        added = 0
+        urls = self.discover()
+        while True:
+            batch = list(islice(urls, batch_size))
+            if not batch:
+                return added
+            added += frontier.add(batch)
+
+    def stats(self) -> dict:
+        return {
+            'sitemaps': self.sitemaps,
+            'listing_pages': self.pages,
+            'found': self.found,
+            'duplicates': self.duplicates,
+            'skipped': self.skipped,
+            'errors': self.errors,
+            'filter_mb': self.seen.memory_bytes / (1024 * 1024),
+        }
+
+    def close(self):
+        if self._owns_http:
+            self.http.close()
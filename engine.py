@@ -0,0 +1,149 @@
+import heapq
+import itertools
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Iterable, Optional
+from retry import CircuitOpenError, RetryPolicy
+from throttle import BudgetShare, HostLimiter, host_of
+
+
+class Deferred(Exception):
+    """
+    Raised by a task that cannot finish until `future` is done (e.g. a
+    CAPTCHA token being solved). The URL is retried once it is, without
+    holding a worker or counting as a failure.
+    """
+
+    def __init__(self, future: Future):
+        super().__init__('Waiting for a dependency')
+        self.future = future
+
+
+class FetchEngine:
+    """
+    Runs `task(url)` for many URLs on a bounded thread pool.
+
+    URLs are queued per host; a URL is only handed to a worker once the
+    HostLimiter grants its host a slot, so a slow or rate-limited host never
+    ties up workers that could be serving other hosts.
+
+    Every outcome is reported to the limiter. Failures that `retry_policy`
+    considers retryable go to a delay heap and rejoin their host's queue
+    when the backoff expires, so waiting retries never hold a worker. URLs
+    of a host whose circuit breaker is open fail with CircuitOpenError.
+
+    With a `budget` every fetch also needs a slot of a ConcurrencyBudget
+    shared with other engines.
+    """
+
+    # Seconds between attempts to get a slot from a full budget
+    BUDGET_POLL = 0.05
+    # Longest idle sleep, so a host that waits for a release nobody will make is looked at again
+    MAX_IDLE = 1.0
+
+    def __init__(self, limiter: HostLimiter, max_workers: int = 1,
+                 retry_policy: Optional[RetryPolicy] = None, budget: Optional[BudgetShare] = None):
+        self.limiter = limiter
+        self.max_workers = max(1, max_workers)
+        self.retry_policy = retry_policy
+        self.budget = budget
+        self.retries = 0
+
+    def run(self, urls: Iterable[str], task: Callable[[str], object],
+            on_result: Optional[Callable[[int, str, object], None]] = None,
+            on_error: Optional[Callable[[int, str, Exception], None]] = None):
+        """
+        Callbacks receive the URL's position in `urls` and are invoked on the
+        calling thread, so they don't need to be thread-safe.
+        """
+        queues: 'OrderedDict[str, deque]' = OrderedDict()
+        for index, url in enumerate(urls):
+            queues.setdefault(host_of(url), deque()).append((index, url, 0))
+
+        delayed = []  # heap of (ready at, seq, host, (index, url, retries))
+        seq = itertools.count()
+        deferred = {}  # future -> [(host, (index, url, retries))] waiting for it
+        inflight = {}
+
+        def failed(host, item, e):
+            index, url, retries = item
+            if self.retry_policy and self.retry_policy.should_retry(e, retries):
+                self.retries += 1
+                ready = time.monotonic() + self.retry_policy.delay(retries, e)
+                heapq.heappush(delayed, (ready, next(seq), host, (index, url, retries + 1)))
+            elif on_error:
+                on_error(index, url, e)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while queues or inflight or delayed or deferred:
+                now = time.monotonic()
+                while delayed and delayed[0][0] <= now:
+                    _, _, host, item = heapq.heappop(delayed)
+                    queues.setdefault(host, deque()).appendleft(item)
+
+                retry_in = delayed[0][0] - now if delayed else float('inf')
+                for host in list(queues):
+                    queue = queues[host]
+                    if self.limiter.is_open(host):
+                        # Fail fast rather than keep hitting a host that is down
+                        del queues[host]
+                        for index, url, _ in queue:
+                            if on_error:
+                                on_error(index, url, CircuitOpenError(host))
+                        continue
+                    while queue and len(inflight) < self.max_workers:
+                        if self.budget and not self.budget.try_acquire():
+                            retry_in = min(retry_in, self.BUDGET_POLL)
+                            break
+                        delay = self.limiter.try_acquire(host)
+                        if delay:
+                            if self.budget:
+                                self.budget.release()
+                            retry_in = min(retry_in, delay)
+                            break
+                        index, url, retries = queue.popleft()
+                        future = pool.submit(task, url)
+                        inflight[future] = (index, url, host, retries, time.monotonic())
+                    if queue:
+                        # Rotate so hosts share workers fairly
+                        queues.move_to_end(host)
+                    else:
+                        del queues[host]
+
+                if not inflight and not deferred:
+                    time.sleep(min(retry_in, self.MAX_IDLE))
+                    continue
+
+                timeout = None if retry_in == float('inf') else retry_in
+                done, _ = wait([*inflight, *deferred], timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in deferred:
+                        error = future.exception()
+                        for host, item in deferred.pop(future):
+                            if error:
+                                failed(host, item, error)
+                            else:
+                                queues.setdefault(host, deque()).appendleft(item)
+                        continue
+                    index, url, host, retries, started = inflight.pop(future)
+                    self.limiter.release(host)
+                    if self.budget:
+                        self.budget.release()
+                    try:
+                        result = future.result()
+                    except Deferred as e:
+                        self.limiter.record_deferred(host)
+                        deferred.setdefault(e.future, []).append((host, (index, url, retries)))
+                    except Exception as e:
+                        if RetryPolicy.is_retryable(e):
+                            self.limiter.record_failure(host, getattr(e, 'retry_after', None),
+                                                        getattr(e, 'throttled', False))
+                        else:
+                            # The host answered, the page itself is the problem
+                            self.limiter.record_success(host)
+                        failed(host, (index, url, retries), e)
+                    else:
+                        self.limiter.record_success(host, time.monotonic() - started)
+                        if on_result:
+                            on_result(index, url, result)
@@ -0,0 +1,150 @@
+import threading
+from typing import Dict, List, Optional
+
+# Fetch tiers, cheapest first
+HTTP = 'http'
+BROWSER = 'browser'
+PROTECTED = 'protected'  # AdvancedProtectionHandler: Cloudflare / reCAPTCHA
+
+# Lower-cased fragments that only show up on bot-protection interstitials
+INTERSTITIAL_MARKERS = (
+    'cf-browser-verification',
+    'cf_chl_opt',
+    '<title>just a moment...</title>',
+    'attention required! | cloudflare',
+)
+# Fragments that ordinary product pages carry too (Cloudflare's injected scripts, a CAPTCHA on a
+# review or login form): they only mark a challenge when the page came with an error status
+WIDGET_MARKERS = (
+    'cloudflare',
+    'challenge-platform',
+    'class="g-recaptcha"',
+    'class="h-captcha"',
+    'ddos-guard',
+)
+
+
+class ChallengeError(Exception):
+    """The page is a bot-protection challenge rather than the product page"""
+
+
+def is_challenge(html: str, status: int = 200) -> bool:
+    """
+    Cheap check for a challenge page; only the head of the document is
+    searched. A 200 page that merely carries a widget marker is not a
+    challenge here: if it is not the product page either, its selectors
+    fail and SelectorsNotFound moves it up a tier.
+    """
+    head = html[:20000].lower()
+    if any(marker in head for marker in INTERSTITIAL_MARKERS):
+        return True
+    # Challenge pages are often served with an error status and a tiny body
+    return status in (403, 503) and any(marker in head for marker in WIDGET_MARKERS)
+
+
+def uses_captcha(config) -> bool:
+    """The config solves reCAPTCHAs (the fake backend needs no API key)"""
+    return bool(config.captcha_site_key and (config.captcha_api_key or config.captcha_backend != '2captcha'))
+
+
+def solves_recaptcha(config) -> bool:
+    """The protected tier fetches with reCAPTCHA tokens; with handle_cloudflare it waits out Cloudflare instead"""
+    return uses_captcha(config) and not config.handle_cloudflare
+
+
+def config_tiers(config) -> List[str]:
+    """
+    Tiers a config may use. With `fetch_escalation` every page starts with
+    plain HTTP and only moves up when it has to; without it the flags pick a
+    single tier as before.
+    """
+    protected = config.handle_cloudflare or uses_captcha(config)
+    if not config.fetch_escalation:
+        return [PROTECTED if protected else BROWSER if config.use_selenium else HTTP]
+    tiers = [HTTP]
+    if config.use_selenium:
+        tiers.append(BROWSER)
+    if protected:
+        tiers.append(PROTECTED)
+    return tiers
+
+
+class EscalationPolicy:
+    """
+    Learns per host which fetch tier to start with.
+
+    A tier whose recent success rate for a host is below `min_success`
+    (after at least `min_samples` attempts) is skipped for that host. Counts
+    are halved once they reach `window`, so old outcomes fade, and every
+    `probe_every`-th fetch of a host starts from the cheapest tier again in
+    case the protection was lifted.
+    """
+
+    def __init__(self, tiers: List[str], min_samples: int = 5, min_success: float = 0.2,
+                 window: int = 50, probe_every: int = 50):
+        self.tiers = tiers
+        self.min_samples = min_samples
+        self.min_success = min_success
+        self.window = window
+        self.probe_every = probe_every
+        self._hosts: Dict[str, Dict[str, List[float]]] = {}
+        self._fetches: Dict[str, int] = {}
+        self.attempts = {tier: 0 for tier in tiers}
+        self.handled = {tier: 0 for tier in tiers}
+        self._lock = threading.Lock()
+
+    def _host(self, host: str) -> Dict[str, List[float]]:
+        stats = self._hosts.get(host)
+        if stats is None:
+            stats = self._hosts[host] = {tier: [0, 0] for tier in self.tiers}
+        return stats
+
+    def _usable(self, stats: Dict[str, List[float]], tier: str) -> bool:
+        attempts, successes = stats[tier]
+        return attempts < self.min_samples or successes / attempts >= self.min_success
+
+    def start_tier(self, host: str) -> str:
+        with self._lock:
+            fetches = self._fetches[host] = self._fetches.get(host, 0) + 1
+            if self.probe_every and fetches % self.probe_every == 0:
+                return self.tiers[0]
+            stats = self._host(host)
+            for tier in self.tiers[:-1]:
+                if self._usable(stats, tier):
+                    return tier
+            return self.tiers[-1]
+
+    def next_tier(self, tier: str) -> Optional[str]:
+        index = self.tiers.index(tier) + 1
+        return self.tiers[index] if index < len(self.tiers) else None
+
+    def record(self, host: str, tier: str, success: bool):
+        with self._lock:
+            stats = self._host(host)[tier]
+            stats[0] += 1
+            stats[1] += success
+            if stats[0] >= self.window:
+                stats[0] /= 2
+                stats[1] /= 2
+            self.attempts[tier] += 1
+            self.handled[tier] += success
+
+    def reset(self, host: str):
+        """Forget what was learned about `host`, e.g. after new clearance cookies were obtained"""
+        with self._lock:
+            self._hosts.pop(host, None)
+
+    def preferred_tiers(self) -> Dict[str, str]:
+        """Tier each known host currently starts with (ignoring probes)"""
+        with self._lock:
+            return {
+                host: next((tier for tier in self.tiers[:-1] if self._usable(stats, tier)), self.tiers[-1])
+                for host, stats in self._hosts.items()
+            }
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'attempts': dict(self.attempts),
+                'handled': dict(self.handled),
+            }
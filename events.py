@@ -0,0 +1,80 @@
+import queue
+import time
+from typing import List, Optional, Tuple
+
+
+class ScrapeEvents:
+    """
+    Thread-safe bridge from scrape threads to the Tk main loop.
+
+    Worker-side methods only put events on a queue; the GUI drains it in
+    batches from root.after(), so Tk is never touched from another thread.
+    """
+
+    PROGRESS = 'progress'
+    RESULT = 'result'
+    ERROR = 'error'
+    FINISHED = 'finished'
+    FAILED = 'failed'
+
+    def __init__(self):
+        self._queue = queue.SimpleQueue()
+
+    def progress(self, percent: float):
+        self._queue.put((self.PROGRESS, percent))
+
+    def result(self, product):
+        self._queue.put((self.RESULT, product))
+
+    def error(self, url: str, exc: Exception):
+        self._queue.put((self.ERROR, (url, exc)))
+
+    def finished(self, count: int):
+        self._queue.put((self.FINISHED, count))
+
+    def failed(self, exc: Exception):
+        self._queue.put((self.FAILED, exc))
+
+    def drain(self, max_events: int = 1000) -> List[Tuple[str, object]]:
+        events = []
+        try:
+            while len(events) < max_events:
+                events.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return events
+
+
+class RunStats:
+    """Throughput and ETA of a running scrape, fed from drained events"""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.products = 0
+        self.errors = 0
+        self.started = time.monotonic()
+
+    @property
+    def done(self) -> int:
+        return self.products + self.errors
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    @property
+    def rate(self) -> float:
+        """Completed URLs per second"""
+        return self.done / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def eta(self) -> Optional[float]:
+        if not self.done:
+            return None
+        return (self.total - self.done) / self.rate
+
+    def summary(self) -> str:
+        eta = self.eta
+        eta_text = f"{eta:.0f} с" if eta is not None else "—"
+        return (f"{self.done}/{self.total} URL, товаров: {self.products}, ошибок: {self.errors}, "
+                f"{self.rate:.1f} URL/с, осталось ~{eta_text}")
@@ -0,0 +1,173 @@
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+PENDING = 'pending'
+IN_FLIGHT = 'in_flight'
+DONE = 'done'
+FAILED = 'failed'
+STATES = (PENDING, IN_FLIGHT, DONE, FAILED)
+
+
+class Frontier:
+    """
+    Durable crawl queue in a SQLite file.
+
+    Every URL is stored once with its state (pending / in_flight / done /
+    failed), priority, attempt count and the earliest time of its next
+    attempt. State changes are committed as they happen, so after a crash
+    the URLs left in flight go back to pending and the crawl picks up where
+    it stopped instead of starting over.
+    """
+
+    def __init__(self, path: str = 'frontier.db', max_attempts: int = 3, retry_delay: float = 60.0):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('''
+        CREATE TABLE IF NOT EXISTS frontier (
+            url TEXT PRIMARY KEY,
+            state TEXT NOT NULL,
+            priority INTEGER NOT NULL DEFAULT 0,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt REAL NOT NULL,
+            last_error TEXT,
+            seq INTEGER NOT NULL,
+            updated_at REAL NOT NULL
+        )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_frontier_next '
+                          'ON frontier (state, priority DESC, next_attempt, seq)')
+        self.conn.commit()
+        self._seq = self.conn.execute('SELECT COALESCE(MAX(seq), 0) FROM frontier').fetchone()[0]
+        self.recovered = self.recover()
+
+    @classmethod
+    def from_config(cls, config) -> 'Frontier':
+        return cls(config.frontier_path, config.max_attempts, config.retry_delay)
+
+    def recover(self) -> int:
+        """Return URLs left in flight by an interrupted run to the pending state"""
+        with self._lock, self.conn:
+            return self.conn.execute(
+                'UPDATE frontier SET state = ?, updated_at = ? WHERE state = ?',
+                (PENDING, time.time(), IN_FLIGHT)).rowcount
+
+    def add(self, urls: Iterable[str], priority: int = 0) -> int:
+        """
+        Queue URLs that are not in the frontier yet and return how many were
+        added. A pending URL added again keeps its place but takes the higher
+        of the two priorities.
+        """
+        now = time.time()
+        with self._lock, self.conn:
+            rows = []
+            for url in urls:
+                self._seq += 1
+                rows.append((url, PENDING, priority, now, self._seq, now))
+            before = self.conn.total_changes
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO frontier (url, state, priority, next_attempt, seq, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)', rows)
+            added = self.conn.total_changes - before
+            if added < len(rows):
+                self.conn.executemany(
+                    'UPDATE frontier SET priority = ? WHERE url = ? AND state = ? AND priority < ?',
+                    [(priority, row[0], PENDING, priority) for row in rows])
+        return added
+
+    def claim(self, limit: int = 100) -> List[str]:
+        """Mark up to `limit` due URLs, highest priority first, as in flight and return them"""
+        now = time.time()
+        with self._lock, self.conn:
+            urls = [row[0] for row in self.conn.execute(
+                'SELECT url FROM frontier WHERE state = ? AND next_attempt <= ? '
+                'ORDER BY priority DESC, next_attempt, seq LIMIT ?', (PENDING, now, limit))]
+            self.conn.executemany('UPDATE frontier SET state = ?, updated_at = ? WHERE url = ?',
+                                  [(IN_FLIGHT, now, url) for url in urls])
+        return urls
+
+    def mark_done(self, url: str):
+        with self._lock, self.conn:
+            self.conn.execute('UPDATE frontier SET state = ?, last_error = NULL, updated_at = ? WHERE url = ?',
+                              (DONE, time.time(), url))
+
+    def mark_failed(self, url: str, error: Optional[str] = None, retry_after: Optional[float] = None,
+                    retry: bool = True) -> str:
+        """
+        Count a failed attempt. The URL is retried after an exponentially
+        growing delay (or `retry_after` seconds) until `max_attempts` is
+        reached, then it stays failed; without `retry` (a 404, say) it
+        fails right away. Returns the new state.
+        """
+        now = time.time()
+        with self._lock, self.conn:
+            row = self.conn.execute('SELECT attempts FROM frontier WHERE url = ?', (url,)).fetchone()
+            attempts = (row[0] if row else 0) + 1
+            if retry and attempts < self.max_attempts:
+                state = PENDING
+                delay = retry_after if retry_after is not None else self.retry_delay * 2 ** (attempts - 1)
+            else:
+                state, delay = FAILED, 0.0
+            self.conn.execute(
+                'UPDATE frontier SET state = ?, attempts = ?, next_attempt = ?, last_error = ?, '
+                'updated_at = ? WHERE url = ?', (state, attempts, now + delay, error, now, url))
+        return state
+
+    def next_due(self) -> Optional[float]:
+        """Seconds until the next pending URL is due (0 if one is due now), None if none is pending"""
+        with self._lock:
+            row = self.conn.execute('SELECT MIN(next_attempt) FROM frontier WHERE state = ?',
+                                    (PENDING,)).fetchone()
+        return None if row[0] is None else max(0.0, row[0] - time.time())
+
+    def retry_failed(self) -> int:
+        """Give URLs that ran out of attempts another full set of attempts"""
+        now = time.time()
+        with self._lock, self.conn:
+            return self.conn.execute(
+                'UPDATE frontier SET state = ?, attempts = 0, next_attempt = ?, updated_at = ? WHERE state = ?',
+                (PENDING, now, now, FAILED)).rowcount
+
+    def requeue(self) -> int:
+        """Start a new pass over the frontier: every done or failed URL becomes pending again"""
+        now = time.time()
+        with self._lock, self.conn:
+            return self.conn.execute(
+                'UPDATE frontier SET state = ?, attempts = 0, next_attempt = ?, last_error = NULL, updated_at = ? '
+                'WHERE state IN (?, ?)', (PENDING, now, now, DONE, FAILED)).rowcount
+
+    def failures(self, limit: int = 100) -> List[tuple]:
+        """(url, attempts, last_error) of failed URLs"""
+        with self._lock:
+            return self.conn.execute(
+                'SELECT url, attempts, last_error FROM frontier WHERE state = ? ORDER BY updated_at LIMIT ?',
+                (FAILED, limit)).fetchall()
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = dict(self.conn.execute('SELECT state, COUNT(*) FROM frontier GROUP BY state').fetchall())
+        return {state: rows.get(state, 0) for state in STATES}
+
+    def unfinished(self) -> int:
+        counts = self.counts()
+        return counts[PENDING] + counts[IN_FLIGHT]
+
+    def clear(self):
+        with self._lock, self.conn:
+            self.conn.execute('DELETE FROM frontier')
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
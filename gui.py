@@ -1,16 +1,26 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import threading
-from typing import List
-from models import ScrapingConfig, Product
+import time
+from models import ScrapingConfig
 from scraper import Scraper
 from database import Database
+from frontier import Frontier
 from config import ConfigManager
-from utils import export_to_csv, export_to_excel
-from site_analyzer import ElementSelector
-from bot_protection import AdvancedProtectionHandler
+from utils import EXPORTERS
+from results_view import VirtualResultsView
+from events import RunStats, ScrapeEvents
+from metrics import STAGES, ScrapeMetrics
 
 class ScraperGUI:
+    POLL_INTERVAL = 100  # ms between drains of the scrape event queue
+    EXPORT_FILETYPES = {
+        'csv': ('CSV files', '.csv'),
+        'excel': ('Excel files', '.xlsx'),
+        'parquet': ('Parquet files', '.parquet'),
+        'jsonl': ('JSON Lines files', '.jsonl'),
+    }
+
     def __init__(self, root):
         self.root = root
         self.root.title("Marketplace Scraper")
@@ -153,17 +163,37 @@ class ScraperGUI:
         # Progress bar
         self.progress = ttk.Progressbar(main_container, mode='determinate')
         self.progress.pack(fill=tk.X, pady=10)
+        self.stats_label = ttk.Label(main_container)
+        self.stats_label.pack(anchor=tk.W)
+
+        # Live timings per scrape stage, refreshed while a scrape runs
+        stages_frame = ttk.LabelFrame(main_container, text="Этапы (мс)", padding="10")
+        stages_frame.pack(fill=tk.X, pady=(0, 10))
+        columns = ('count', 'avg', 'p50', 'p95', 'max')
+        self.stages_tree = ttk.Treeview(stages_frame, columns=columns, height=len(STAGES))
+        self.stages_tree.heading('#0', text='Этап')
+        self.stages_tree.column('#0', width=120)
+        for column, title in zip(columns, ('Кол-во', 'Среднее', 'p50', 'p95', 'Макс.')):
+            self.stages_tree.heading(column, text=title)
+            self.stages_tree.column(column, width=90, anchor=tk.E)
+        self.stages_tree.pack(fill=tk.X)
+        self.traffic_label = ttk.Label(stages_frame)
+        self.traffic_label.pack(anchor=tk.W)
 
         # Data Treeview
         data_frame = ttk.LabelFrame(main_container, text="Собранные данные", padding="10")
         data_frame.pack(fill=tk.BOTH, expand=True)
 
-        self.tree = ttk.Treeview(data_frame, columns=('Name', 'Price', 'Marketplace', 'Created At'), show='headings', style="Treeview")
-        self.tree.heading('Name', text='Название')
-        self.tree.heading('Price', text='Цена')
-        self.tree.heading('Marketplace', text='Площадка')
-        self.tree.heading('Created At', text='Дата')
-        self.tree.pack(fill=tk.BOTH, expand=True, pady=10)
+        ttk.Label(data_frame, text="Фильтр по названию:").pack(anchor=tk.W)
+        self.filter_entry = self.create_styled_entry(data_frame)
+        self.filter_entry.pack(fill=tk.X)
+        self.filter_entry.bind('<KeyRelease>', self.schedule_filter)
+        self._filter_job = None
+
+        # Only a window of rows is kept in the Treeview, see VirtualResultsView
+        self.results = VirtualResultsView(data_frame)
+        self.results.frame.pack(fill=tk.BOTH, expand=True, pady=10)
+        self.tree = self.results.tree
 
         # Export Frame
         export_frame = ttk.Frame(data_frame)
@@ -171,6 +201,8 @@ class ScraperGUI:
 
         self.create_button(export_frame, "Экспорт CSV", lambda: self.export_data('csv'))
         self.create_button(export_frame, "Экспорт Excel", lambda: self.export_data('excel'))
+        self.create_button(export_frame, "Экспорт Parquet", lambda: self.export_data('parquet'))
+        self.create_button(export_frame, "Экспорт JSONL", lambda: self.export_data('jsonl'))
         self.create_button(export_frame, "Обновить", self.load_data)
 
     def create_button(self, parent, text, command):
@@ -192,7 +224,7 @@ class ScraperGUI:
         messagebox.showinfo("Успех", "Конфигурация сохранена!")
 
     def start_scraping(self):
-        urls = self.urls_text.get("1.0", tk.END).strip().split('\n')
+        urls = [url.strip() for url in self.urls_text.get("1.0", tk.END).split('\n') if url.strip()]
         if not urls:
             messagebox.showerror("Ошибка", "Введите URLs для парсинга")
             return
@@ -206,24 +238,87 @@ class ScraperGUI:
             captcha_site_key=self.site_key_entry.get() or None
         )
 
+        frontier = Frontier.from_config(config)
+        unfinished = frontier.unfinished()
+        if not unfinished or not messagebox.askyesno(
+                "Продолжить", f"Предыдущий запуск прерван, осталось {unfinished} URL. Продолжить его?"):
+            frontier.clear()
+        frontier.add(urls)
+
+        events = self.events = ScrapeEvents()
+        self.run_stats = RunStats(frontier.unfinished())
+        metrics = self.metrics = ScrapeMetrics()
+        self._last_live_refresh = 0.0
+
+        # Runs off the Tk thread: it only talks to the GUI through `events` (and the thread-safe `metrics`)
         def scrape_thread():
-            scraper = Scraper(config)
+            scraper = Scraper(config, metrics=metrics)
             try:
-                products = scraper.scrape_products(urls, self.update_progress)
-                with Database() as db:
-                    for product in products:
-                        product.save(db.conn)
-                self.root.after(0, lambda: self.scraping_complete(len(products)))
+                with Database() as db, db.writer(flush_interval=1.0, metrics=metrics) as writer:
+                    def on_product(product):
+                        writer.add(product)
+                        events.result(product)
+
+                    scraper.crawl(frontier, events.progress, on_product, events.error)
+                events.finished(writer.written)
             except Exception as e:
-                self.root.after(0, lambda: messagebox.showerror("Ошибка", f"Ошибка парсинга: {str(e)}"))
+                events.failed(e)
             finally:
-                self.root.after(0, self.reset_progress)
+                scraper.close()
+                frontier.close()
 
         threading.Thread(target=scrape_thread, daemon=True).start()
-
-    def update_progress(self, value):
-        self.progress['value'] = value
-        self.root.update_idletasks()
+        self.root.after(self.POLL_INTERVAL, self.poll_events)
+
+    def poll_events(self):
+        """Apply queued scrape events in one batch on the Tk thread"""
+        finished, failure = None, None
+        for kind, payload in self.events.drain():
+            if kind == ScrapeEvents.PROGRESS:
+                self.progress['value'] = payload
+            elif kind == ScrapeEvents.RESULT:
+                self.run_stats.products += 1
+            elif kind == ScrapeEvents.ERROR:
+                self.run_stats.errors += 1
+            elif kind == ScrapeEvents.FINISHED:
+                finished = payload
+            elif kind == ScrapeEvents.FAILED:
+                failure = payload
+
+        self.stats_label.configure(text=self.run_stats.summary())
+        now = time.monotonic()
+        done = finished is not None or failure is not None
+        if done or now - self._last_live_refresh >= 1.0:
+            self._last_live_refresh = now
+            self.refresh_stages()
+            if self.run_stats.products:
+                self.results.refresh_live()
+
+        if finished is not None:
+            self.reset_progress()
+            self.scraping_complete(finished)
+        elif failure is not None:
+            self.reset_progress()
+            messagebox.showerror("Ошибка", f"Ошибка парсинга: {str(failure)}")
+        else:
+            self.root.after(self.POLL_INTERVAL, self.poll_events)
+
+    def refresh_stages(self):
+        """Show the current stage timings and traffic of the running scrape"""
+        stages = self.metrics.summary()
+        self.stages_tree.delete(*self.stages_tree.get_children())
+        for stage, figures in stages.items():
+            self.stages_tree.insert('', tk.END, text=stage, values=(
+                figures['count'],
+                *(f"{figures[key] * 1000:.1f}" for key in ('avg', 'p50', 'p95', 'max')),
+            ))
+        totals = self.metrics.totals()
+        elapsed = self.run_stats.elapsed
+        megabytes = totals.get('bytes', 0) / (1024 * 1024)
+        self.traffic_label.configure(
+            text=f"Загружено {megabytes:.1f} МБ ({megabytes / elapsed if elapsed > 0 else 0.0:.2f} МБ/с), "
+                 f"страниц: {totals.get('pages', 0):g}, неудачных попыток: {totals.get('errors', 0):g}, "
+                 f"страниц с защитой: {totals.get('challenges', 0):g}")
 
     def reset_progress(self):
         self.progress['value'] = 0
@@ -240,6 +335,9 @@ class ScraperGUI:
             return
 
         try:
+            from bot_protection import AdvancedProtectionHandler
+            from site_analyzer import ElementSelector
+
             if not self.protection_handler:
                 self.protection_handler = AdvancedProtectionHandler()
 
@@ -268,33 +366,26 @@ class ScraperGUI:
                 self.protection_handler = None
 
     def load_data(self):
-        self.tree.delete(*self.tree.get_children())
-        with Database() as db:
-            products = Product.get_all(db.conn)
-            for product in products:
-                self.tree.insert('', 'end', values=(
-                    product.name,
-                    f"${product.price:.2f}",
-                    product.marketplace,
-                    product.created_at.strftime('%Y-%m-%d %H:%M:%S')
-                ))
+        self.results.reload()
+
+    def schedule_filter(self, event=None):
+        # Debounce typing so the query runs once the user pauses
+        if self._filter_job:
+            self.root.after_cancel(self._filter_job)
+        self._filter_job = self.root.after(300, lambda: self.results.set_filter(self.filter_entry.get()))
 
     def export_data(self, format_type):
         with Database() as db:
-            products = Product.get_all(db.conn)
-            if not products:
+            if not db.count_products():
                 messagebox.showwarning("Внимание", "Нет данных для экспорта")
                 return
 
-            filetypes = [('CSV files', '*.csv')] if format_type == 'csv' else [('Excel files', '*.xlsx')]
+            description, extension = self.EXPORT_FILETYPES[format_type]
             filename = filedialog.asksaveasfilename(
-                defaultextension=f".{format_type}",
-                filetypes=filetypes
+                defaultextension=extension,
+                filetypes=[(description, f'*{extension}')]
             )
 
             if filename:
-                if format_type == 'csv':
-                    export_to_csv(products, filename)
-                else:
-                    export_to_excel(products, filename)
+                EXPORTERS[format_type](db.iter_batches(), filename)
                 messagebox.showinfo("Успех", f"Данные экспортированы в {filename}")
\ No newline at end of file
@@ -0,0 +1,183 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+
+@dataclass
+class CachedResponse:
+    key: str
+    url: str
+    html: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    stored_at: float
+    # Product fields extracted from `html`, if stored for the requested fields key
+    fields: Optional[dict] = None
+
+
+def _variant_key(url: str, vary: List[str], headers: Dict[str, str]) -> str:
+    lowered = {name.lower(): value for name, value in headers.items()}
+    parts = [url] + [f'{name}:{lowered.get(name, "")}' for name in vary]
+    return hashlib.sha1('\n'.join(parts).encode('utf-8')).hexdigest()
+
+
+class HttpCache:
+    """
+    On-disk cache of GET responses in a SQLite file.
+
+    Entries are keyed by URL plus the request headers named in the
+    response's Vary header. Entries younger than `ttl` seconds are served
+    without touching the network; older ones are revalidated with
+    If-None-Match / If-Modified-Since. When the cache grows past `max_bytes`,
+    the least recently used entries are evicted. Product fields extracted
+    from a body can be stored next to it, so a 304 skips parsing as well.
+    """
+
+    def __init__(self, path: str = 'http_cache.db', ttl: float = 3600.0,
+                 max_bytes: int = 512 * 1024 * 1024):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        # The cache can always be rebuilt, durability is not worth an fsync
+        self.conn.execute('PRAGMA synchronous=OFF')
+        self.conn.execute('''
+        CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY,
+            url TEXT NOT NULL,
+            vary TEXT NOT NULL,
+            etag TEXT,
+            last_modified TEXT,
+            body BLOB NOT NULL,
+            size INTEGER NOT NULL,
+            stored_at REAL NOT NULL,
+            accessed_at REAL NOT NULL,
+            fields_key TEXT,
+            fields TEXT
+        )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_responses_url ON responses (url)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_responses_accessed_at ON responses (accessed_at)')
+        self.conn.commit()
+        self.total_bytes = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    @classmethod
+    def from_config(cls, config) -> Optional['HttpCache']:
+        if not config.http_cache_path:
+            return None
+        return cls(config.http_cache_path, config.http_cache_ttl,
+                   int(config.http_cache_max_mb * 1024 * 1024))
+
+    def lookup(self, url: str, headers: Dict[str, str],
+               fields_key: Optional[str] = None) -> Optional[CachedResponse]:
+        with self._lock:
+            rows = self.conn.execute(
+                'SELECT key, vary, etag, last_modified, body, stored_at, fields_key, fields '
+                'FROM responses WHERE url = ?', (url,)).fetchall()
+        for key, vary, etag, last_modified, body, stored_at, entry_fields_key, fields in rows:
+            if _variant_key(url, json.loads(vary), headers) != key:
+                continue
+            return CachedResponse(
+                key=key, url=url, html=zlib.decompress(body).decode('utf-8'),
+                etag=etag, last_modified=last_modified, stored_at=stored_at,
+                fields=json.loads(fields) if fields and entry_fields_key == fields_key else None,
+            )
+        return None
+
+    def is_fresh(self, entry: CachedResponse) -> bool:
+        return time.time() - entry.stored_at < self.ttl
+
+    @staticmethod
+    def conditional_headers(entry: CachedResponse) -> Dict[str, str]:
+        headers = {}
+        if entry.etag:
+            headers['If-None-Match'] = entry.etag
+        if entry.last_modified:
+            headers['If-Modified-Since'] = entry.last_modified
+        return headers
+
+    def hit(self, entry: CachedResponse):
+        """Record that a fresh entry was served without a request"""
+        with self._lock:
+            self.hits += 1
+            self.conn.execute('UPDATE responses SET accessed_at = ? WHERE key = ?', (time.time(), entry.key))
+            self.conn.commit()
+
+    def revalidated(self, entry: CachedResponse):
+        """The server answered 304: the entry is fresh again"""
+        now = time.time()
+        with self._lock:
+            self.revalidations += 1
+            self.conn.execute('UPDATE responses SET stored_at = ?, accessed_at = ? WHERE key = ?',
+                              (now, now, entry.key))
+            self.conn.commit()
+
+    def store(self, url: str, headers: Dict[str, str], response) -> Optional[str]:
+        """Cache a 200 response; returns its key, or None if it may not be stored"""
+        with self._lock:
+            self.misses += 1
+        cache_control = response.headers.get('Cache-Control', '').lower()
+        if response.status_code != 200 or 'no-store' in cache_control:
+            return None
+        vary_header = response.headers.get('Vary', '')
+        if vary_header.strip() == '*':
+            return None
+        vary = sorted({name.strip().lower() for name in vary_header.split(',') if name.strip()})
+        key = _variant_key(url, vary, headers)
+        body = zlib.compress(response.text.encode('utf-8'))
+        now = time.time()
+        with self._lock:
+            old = self.conn.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+            self.conn.execute(
+                'INSERT OR REPLACE INTO responses '
+                '(key, url, vary, etag, last_modified, body, size, stored_at, accessed_at, fields_key, fields) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, NULL, NULL)',
+                (key, url, json.dumps(vary), response.headers.get('ETag'),
+                 response.headers.get('Last-Modified'), body, len(body), now, now))
+            self.total_bytes += len(body) - (old[0] if old else 0)
+            self._evict()
+            self.conn.commit()
+        return key
+
+    def store_fields(self, key: str, fields_key: str, fields: dict):
+        with self._lock:
+            self.conn.execute('UPDATE responses SET fields_key = ?, fields = ? WHERE key = ?',
+                              (fields_key, json.dumps(fields), key))
+            self.conn.commit()
+
+    def _evict(self):
+        if self.total_bytes <= self.max_bytes:
+            return
+        target = self.max_bytes * 0.9
+        for key, size in self.conn.execute(
+                'SELECT key, size FROM responses ORDER BY accessed_at').fetchall():
+            if self.total_bytes <= target:
+                break
+            self.conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+            self.total_bytes -= size
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'revalidations': self.revalidations,
+                'evictions': self.evictions,
+                'bytes': self.total_bytes,
+            }
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
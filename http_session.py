@@ -0,0 +1,187 @@
+import threading
+import time
+from typing import Optional
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from throttle import host_of
+
+# urllib3 only decodes brotli when one of the brotli packages is importable
+try:
+    import brotli  # noqa: F401
+    ACCEPT_ENCODING = 'gzip, deflate, br'
+except ImportError:
+    try:
+        import brotlicffi  # noqa: F401
+        ACCEPT_ENCODING = 'gzip, deflate, br'
+    except ImportError:
+        ACCEPT_ENCODING = 'gzip, deflate'
+
+
+class ConnectionStats:
+    """Counts requests sent and TCP/TLS connections opened by a session pool"""
+
+    def __init__(self):
+        self.requests = 0
+        self.new_connections = 0
+        self._lock = threading.Lock()
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def record_new_connection(self):
+        with self._lock:
+            self.new_connections += 1
+
+    @property
+    def reused_connections(self) -> int:
+        return max(0, self.requests - self.new_connections)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            requests_sent, new = self.requests, self.new_connections
+        return {
+            'requests': requests_sent,
+            'new_connections': new,
+            'reused_connections': max(0, requests_sent - new),
+            'reuse_ratio': (requests_sent - new) / requests_sent if requests_sent else 0.0,
+        }
+
+
+class _SetupTimes(threading.local):
+    """Seconds spent opening connections during the current request of this thread"""
+
+    def __init__(self):
+        self.connect = 0.0
+        self.tls = 0.0
+
+
+def _timed_connection(base, setup: _SetupTimes):
+    https = issubclass(base, HTTPSConnection)
+
+    class TimedConnection(base):
+        def _new_conn(self):
+            # DNS lookup and TCP connect
+            started = time.perf_counter()
+            try:
+                return super()._new_conn()
+            finally:
+                setup.connect += time.perf_counter() - started
+
+        def connect(self):
+            started = time.perf_counter()
+            connect_before = setup.connect
+            try:
+                super().connect()
+            finally:
+                # Whatever connect() did besides _new_conn() is the TLS handshake
+                if https:
+                    setup.tls += time.perf_counter() - started - (setup.connect - connect_before)
+    return TimedConnection
+
+
+def _counting_pool(base, stats: ConnectionStats, setup: _SetupTimes):
+    class CountingPool(base):
+        ConnectionCls = _timed_connection(base.ConnectionCls, setup)
+
+        def _new_conn(self):
+            stats.record_new_connection()
+            return super()._new_conn()
+    return CountingPool
+
+
+class _CountingAdapter(HTTPAdapter):
+    def __init__(self, stats: ConnectionStats, setup: _SetupTimes, **kwargs):
+        self.stats = stats
+        self._pool_classes = {
+            'http': _counting_pool(HTTPConnectionPool, stats, setup),
+            'https': _counting_pool(HTTPSConnectionPool, stats, setup),
+        }
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = self._pool_classes
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        manager = super().proxy_manager_for(proxy, **proxy_kwargs)
+        manager.pool_classes_by_scheme = self._pool_classes
+        return manager
+
+    def send(self, request, **kwargs):
+        self.stats.record_request()
+        return super().send(request, **kwargs)
+
+
+class HttpSessionPool:
+    """
+    A keep-alive requests.Session with one connection pool per host.
+    `pool_maxsize` bounds the connections kept open to a single host,
+    `pool_connections` the number of hosts whose pools are cached.
+
+    With `metrics` (a ScrapeMetrics) every request records the connect and
+    TLS time of a new connection, the download time and the bytes read off
+    the wire, per host.
+    """
+
+    def __init__(self, pool_connections: int = 10, pool_maxsize: int = 2,
+                 connect_timeout: float = 10.0, read_timeout: float = 30.0,
+                 proxy: Optional[str] = None, metrics=None):
+        self.timeout = (connect_timeout, read_timeout)
+        self.stats = ConnectionStats()
+        self.metrics = metrics
+        self._setup = _SetupTimes()
+        self.session = requests.Session()
+        self.session.headers.update({
+            'Accept-Encoding': ACCEPT_ENCODING,
+            'Connection': 'keep-alive',
+        })
+        if proxy:
+            self.session.proxies = {'http': proxy, 'https': proxy}
+        adapter = _CountingAdapter(self.stats, self._setup, pool_connections=pool_connections,
+                                   pool_maxsize=pool_maxsize)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    @classmethod
+    def from_config(cls, config, metrics=None) -> 'HttpSessionPool':
+        return cls(
+            pool_connections=max(10, config.max_workers),
+            pool_maxsize=config.max_per_host,
+            connect_timeout=config.connect_timeout,
+            read_timeout=config.read_timeout,
+            proxy=config.proxy,
+            metrics=metrics,
+        )
+
+    def get(self, url: str, headers: Optional[dict] = None, stream: bool = False) -> requests.Response:
+        if not self.metrics:
+            return self.session.get(url, headers=headers, timeout=self.timeout, stream=stream)
+        setup = self._setup
+        setup.connect = setup.tls = 0.0
+        started = time.perf_counter()
+        response = self.session.get(url, headers=headers, timeout=self.timeout, stream=stream)
+        elapsed = time.perf_counter() - started
+        host = host_of(url)
+        if setup.connect:
+            self.metrics.observe('connect', setup.connect, host)
+        if setup.tls:
+            self.metrics.observe('tls', setup.tls, host)
+        # A streamed body is still to be read by the caller
+        if not stream:
+            self.metrics.observe('download', max(0.0, elapsed - setup.connect - setup.tls), host)
+            self.metrics.add('bytes', _wire_bytes(response), host)
+        return response
+
+    def close(self):
+        self.session.close()
+
+
+def _wire_bytes(response: requests.Response) -> int:
+    """Body bytes as transferred, i.e. before decompression"""
+    try:
+        return response.raw.tell()
+    except (AttributeError, OSError):
+        return len(response.content)
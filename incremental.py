@@ -0,0 +1,141 @@
+import hashlib
+import re
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Optional
+from models import Product
+from normalize import to_datetime
+
+_WHITESPACE = re.compile(r'\s+')
+
+NEW = 'new'
+CHANGED = 'changed'
+UNCHANGED = 'unchanged'
+
+
+def content_hash(html: str) -> str:
+    """Fingerprint of a page; whitespace-only differences don't count as changes"""
+    return hashlib.blake2b(_WHITESPACE.sub(' ', html).encode('utf-8'), digest_size=16).hexdigest()
+
+
+class FingerprintStore:
+    """
+    Last-seen content hash and extracted fields per URL, plus a compact
+    price_history table, for incremental re-scrapes.
+
+    Lives in the products database. For a URL seen before, the products
+    row is updated in place and only price / description changes are
+    appended to price_history, so a daily run over an unchanged catalog
+    writes almost nothing.
+    """
+
+    def __init__(self, db_path: str = 'scraper.db', batch_size: int = 500):
+        self.batch_size = batch_size
+        self.counts = {NEW: 0, CHANGED: 0, UNCHANGED: 0}
+        self._seen = []  # (last_seen, url) updates waiting for a flush
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        Product.create_table(self.conn)
+        self.conn.execute('''
+        CREATE TABLE IF NOT EXISTS product_fingerprints (
+            url TEXT PRIMARY KEY,
+            content_hash TEXT NOT NULL,
+            name TEXT,
+            price REAL,
+            description TEXT,
+            last_seen TIMESTAMP,
+            last_changed TIMESTAMP
+        )
+        ''')
+        self.conn.execute('''
+        CREATE TABLE IF NOT EXISTS price_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            url TEXT NOT NULL,
+            price REAL,
+            description TEXT,
+            changed_at TIMESTAMP NOT NULL
+        )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_price_history_url ON price_history (url, changed_at)')
+        self.conn.commit()
+
+    def is_unchanged(self, url: str, page_hash: str) -> bool:
+        """True if the page is byte-for-byte (modulo whitespace) what we saw last time"""
+        with self._lock:
+            row = self.conn.execute('SELECT content_hash FROM product_fingerprints WHERE url = ?',
+                                    (url,)).fetchone()
+            if not row or row[0] != page_hash:
+                return False
+            self.counts[UNCHANGED] += 1
+            self._seen.append((datetime.now(), url))
+            if len(self._seen) >= self.batch_size:
+                self._flush_seen()
+        return True
+
+    def record(self, product: Product, page_hash: str) -> str:
+        """
+        Store the fingerprint of a parsed page and return NEW, CHANGED or
+        UNCHANGED (page differed but the extracted fields did not)
+        """
+        now = datetime.now()
+        with self._lock:
+            row = self.conn.execute(
+                'SELECT name, price, description FROM product_fingerprints WHERE url = ?',
+                (product.url,)).fetchone()
+            with self.conn:
+                if row is None:
+                    status = NEW
+                    self.conn.execute(
+                        'INSERT INTO product_fingerprints '
+                        '(url, content_hash, name, price, description, last_seen, last_changed) '
+                        'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                        (product.url, page_hash, product.name, product.price, product.description, now, now))
+                    self.conn.execute('INSERT INTO price_history (url, price, description, changed_at) '
+                                      'VALUES (?, ?, NULL, ?)', (product.url, product.price, now))
+                elif tuple(row) == (product.name, product.price, product.description):
+                    status = UNCHANGED
+                    self.conn.execute('UPDATE product_fingerprints SET content_hash = ?, last_seen = ? '
+                                      'WHERE url = ?', (page_hash, now, product.url))
+                else:
+                    status = CHANGED
+                    name, price, description = row
+                    self.conn.execute(
+                        'UPDATE product_fingerprints SET content_hash = ?, name = ?, price = ?, '
+                        'description = ?, last_seen = ?, last_changed = ? WHERE url = ?',
+                        (page_hash, product.name, product.price, product.description, now, now, product.url))
+                    if price != product.price or description != product.description:
+                        self.conn.execute(
+                            'INSERT INTO price_history (url, price, description, changed_at) VALUES (?, ?, ?, ?)',
+                            (product.url,
+                             product.price if price != product.price else None,
+                             product.description if description != product.description else None,
+                             now))
+                    self.conn.execute(
+                        'UPDATE products SET name = ?, price = ?, description = ?, created_at = ? '
+                        'WHERE id = (SELECT MAX(id) FROM products WHERE url = ?)',
+                        (product.name, product.price, product.description, now, product.url))
+            self.counts[status] += 1
+        return status
+
+    def price_history(self, url: str, limit: Optional[int] = None):
+        sql = 'SELECT price, description, changed_at FROM price_history WHERE url = ? ORDER BY changed_at'
+        params = [url]
+        if limit:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        with self._lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        return [(price, description, to_datetime(changed_at)) for price, description, changed_at in rows]
+
+    def _flush_seen(self):
+        if self._seen:
+            with self.conn:
+                self.conn.executemany('UPDATE product_fingerprints SET last_seen = ? WHERE url = ?', self._seen)
+            self._seen = []
+
+    def close(self):
+        with self._lock:
+            self._flush_seen()
+            self.conn.close()
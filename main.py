@@ -1,32 +1,79 @@
-import tkinter as tk
-from gui import ScraperGUI
-import sys
+import json
+import multiprocessing
 import os
-import subprocess
-import pkg_resources
 import platform
+import subprocess
+import sys
+import time
+from importlib import metadata
+
+REQUIRED = {
+    'selenium',
+    'beautifulsoup4',
+    'pandas',
+    'requests',
+    'undetected-chromedriver',
+    '2captcha-python'
+}
+
+# Startup check results, so the checks run once a day rather than on every start
+CHECKS_PATH = os.path.join(os.path.expanduser('~'), '.webscrapestudio', 'checks.json')
+CHECKS_TTL = 24 * 3600
+
+
+def _load_checks() -> dict:
+    try:
+        with open(CHECKS_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def cached_check(name: str):
+    """Value recorded by record_check() for this interpreter, or None if there is none or it is stale"""
+    entry = _load_checks().get(name)
+    if not entry or entry.get('python') != sys.executable or time.time() - entry['checked_at'] > CHECKS_TTL:
+        return None
+    return entry['value']
+
+
+def record_check(name: str, value):
+    checks = _load_checks()
+    checks[name] = {'python': sys.executable, 'checked_at': time.time(), 'value': value}
+    try:
+        os.makedirs(os.path.dirname(CHECKS_PATH), exist_ok=True)
+        with open(CHECKS_PATH, 'w', encoding='utf-8') as f:
+            json.dump(checks, f, indent=2)
+    except OSError:
+        pass
+
+
+def _installed(name: str) -> bool:
+    try:
+        metadata.distribution(name)
+        return True
+    except metadata.PackageNotFoundError:
+        return False
+
 
 def check_dependencies():
     """Проверка и установка необходимых зависимостей"""
-    required = {
-        'selenium',
-        'beautifulsoup4',
-        'pandas',
-        'requests',
-        'undetected-chromedriver',
-        '2captcha-python'
-    }
-
-    installed = {pkg.key for pkg in pkg_resources.working_set}
-    missing = required - installed
+    if cached_check('dependencies') == sorted(REQUIRED):
+        return
+
+    missing = {name for name in REQUIRED if not _installed(name)}
 
     if missing:
         print("Установка необходимых зависимостей...")
         python = sys.executable
         subprocess.check_call([python, '-m', 'pip', 'install', *missing], stdout=subprocess.DEVNULL)
+    record_check('dependencies', sorted(REQUIRED))
 
 def check_chrome():
     """Проверка наличия Chromium/Chrome"""
+    if cached_check('chrome'):
+        return
+
     if platform.system() == 'Windows':
         chrome_paths = [
             os.path.expandvars(r"%ProgramFiles%\Google\Chrome\Application\chrome.exe"),
@@ -56,6 +103,7 @@ def check_chrome():
             except subprocess.CalledProcessError:
                 print("Не удалось найти Chromium. Пожалуйста, установите его вручную.")
                 sys.exit(1)
+    record_check('chrome', True)
 
 def main():
     try:
@@ -65,6 +113,10 @@ def main():
         check_chrome()
 
         print("Запуск приложения...")
+        # Tk and the GUI modules are imported only after the checks passed
+        import tkinter as tk
+        from gui import ScraperGUI
+
         # Запуск основного приложения
         root = tk.Tk()
         app = ScraperGUI(root)
@@ -76,4 +128,6 @@ def main():
         sys.exit(1)
 
 if __name__ == "__main__":
+    # Needed by the parse process pool in frozen (PyInstaller) builds
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
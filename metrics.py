@@ -0,0 +1,302 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+from throttle import host_of
+
+# Upper bounds (seconds) of the histogram buckets, as Prometheus' default plus the slow end of browser fetches
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# connect   - DNS lookup and TCP connect of a new connection
+# tls       - TLS handshake of a new connection
+# download  - request sent to last byte read (HTTP), page load (browser)
+# challenge - waiting for a page to get ready / past its bot challenge in a browser
+# parse     - extracting the product from the HTML
+# db_write  - one batch insert into the database
+# total     - one fetch attempt of a URL, end to end (with parsing unless a parse pool does it)
+STAGES = ('connect', 'tls', 'download', 'challenge', 'parse', 'db_write', 'total')
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Histogram:
+    """Counts of observed values per bucket, plus their sum and maximum"""
+
+    __slots__ = ('bounds', 'counts', 'count', 'sum', 'max')
+
+    def __init__(self, bounds: Sequence[float] = BUCKETS):
+        self.bounds = bounds
+        # The last slot counts values above every bound
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: 'Histogram'):
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> float:
+        """Estimated by linear interpolation inside the bucket, like Prometheus' histogram_quantile()"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.bounds[i - 1] if i else 0.0
+                upper = self.bounds[i] if i < len(self.bounds) else self.max
+                return min(self.max, lower + (upper - lower) * (rank - seen) / count)
+            seen += count
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'avg': self.sum / self.count if self.count else 0.0,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'max': self.max,
+        }
+
+    def to_dict(self) -> dict:
+        return {**self.summary(), 'buckets': dict(zip([*map(str, self.bounds), '+Inf'], self.counts))}
+
+
+class ScrapeMetrics:
+    """
+    Thread-safe timings of the stages of a scrape (see STAGES) as a
+    histogram per stage and host, counters per host (bytes transferred,
+    pages, failed attempts, challenge pages, rows written) and the stage
+    timings of the last `recent` URLs.
+
+    Stages observed inside page() on the same thread are added to that
+    URL's record without naming it, so code deep in the fetch path (the
+    HTTP session's connection setup, say) only needs the host. Exported as
+    Prometheus text or JSON, to a file with write() or over HTTP with
+    MetricsServer.
+    """
+
+    def __init__(self, recent: int = 1000, buckets: Sequence[float] = BUCKETS):
+        self.buckets = buckets
+        self.started = time.time()
+        self._histograms: Dict[Tuple[str, str], Histogram] = {}
+        self._counters: Dict[Tuple[str, str], float] = {}
+        self._recent: 'OrderedDict[str, dict]' = OrderedDict()
+        self._max_recent = recent
+        self._current = threading.local()
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float, host: str = '', url: Optional[str] = None):
+        """Record `seconds` spent in `stage`, for the given URL or else the page() running on this thread"""
+        record = getattr(self._current, 'record', None) if url is None else None
+        with self._lock:
+            histogram = self._histograms.get((stage, host))
+            if histogram is None:
+                histogram = self._histograms[(stage, host)] = Histogram(self.buckets)
+            histogram.observe(seconds)
+            if url is not None:
+                record = self._recent.get(url)
+            if record is not None and record['host'] == host:
+                stages = record['stages']
+                stages[stage] = stages.get(stage, 0.0) + seconds
+
+    def add(self, counter: str, value: float = 1, host: str = ''):
+        record = getattr(self._current, 'record', None)
+        with self._lock:
+            self._counters[(counter, host)] = self._counters.get((counter, host), 0) + value
+            if counter == 'bytes' and record is not None and record['host'] == host:
+                record['bytes'] += value
+
+    @contextmanager
+    def stage(self, stage: str, host: str = '', url: Optional[str] = None):
+        """Time the enclosed block as `stage`"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started, host, url)
+
+    @contextmanager
+    def page(self, url: str, pending: Tuple[type, ...] = ()):
+        """
+        One fetch attempt of `url`: its total time, stage timings and bytes
+        are kept as the URL's record, and it counts as a page or, if it
+        raises, as an error. Exceptions in `pending` only put the URL back
+        to be fetched later, so such an attempt is dropped instead.
+        """
+        host = host_of(url)
+        record = {'url': url, 'host': host, 'at': time.time(), 'stages': {}, 'bytes': 0, 'error': None}
+        self._current.record = record
+        started = time.perf_counter()
+        keep = True
+        try:
+            yield record
+        except pending:
+            keep = False
+            raise
+        except Exception as e:
+            record['error'] = type(e).__name__
+            raise
+        finally:
+            self._current.record = None
+            if keep:
+                self._keep(record)
+                self.observe('total', time.perf_counter() - started, host, url)
+                self.add('errors' if record['error'] else 'pages', 1, host)
+
+    def _keep(self, record: dict):
+        with self._lock:
+            self._recent.pop(record['url'], None)
+            self._recent[record['url']] = record
+            while len(self._recent) > self._max_recent:
+                self._recent.popitem(last=False)
+
+    def _merged(self, hosts: Optional[Iterable[str]]) -> Dict[str, Histogram]:
+        hosts = None if hosts is None else set(hosts)
+        merged = {}
+        with self._lock:
+            for (stage, host), histogram in self._histograms.items():
+                # Stages without a host (database writes) belong to every selection
+                if hosts is None or not host or host in hosts:
+                    merged.setdefault(stage, Histogram(self.buckets)).merge(histogram)
+        return merged
+
+    def summary(self, hosts: Optional[Iterable[str]] = None) -> Dict[str, dict]:
+        """count / avg / p50 / p95 / max per stage over `hosts` (default: all)"""
+        merged = self._merged(hosts)
+        return {stage: merged[stage].summary() for stage in sorted(merged, key=_stage_order)}
+
+    def totals(self, hosts: Optional[Iterable[str]] = None) -> Dict[str, float]:
+        """Counters summed over `hosts` (default: all)"""
+        hosts = None if hosts is None else set(hosts)
+        totals = {}
+        with self._lock:
+            for (counter, host), value in self._counters.items():
+                if hosts is None or not host or host in hosts:
+                    totals[counter] = totals.get(counter, 0) + value
+        return totals
+
+    def recent(self) -> list:
+        with self._lock:
+            return [dict(record, stages=dict(record['stages'])) for record in self._recent.values()]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            stages = {}
+            for (stage, host), histogram in sorted(self._histograms.items(), key=lambda item: _stage_order(item[0][0])):
+                stages.setdefault(stage, {})[host] = histogram.to_dict()
+            counters = {}
+            for (counter, host), value in sorted(self._counters.items()):
+                counters.setdefault(counter, {})[host] = value
+        return {
+            'started': self.started,
+            'uptime': time.time() - self.started,
+            'stages': stages,
+            'counters': counters,
+            'recent': self.recent(),
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), ensure_ascii=False)
+
+    def to_prometheus(self) -> str:
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+        lines = [
+            '# HELP scraper_stage_seconds Time spent per scrape stage',
+            '# TYPE scraper_stage_seconds histogram',
+        ]
+        for (stage, host), histogram in histograms:
+            labels = _labels(stage=stage, host=host)
+            cumulative = 0
+            for bound, count in zip([*map(repr, histogram.bounds), '+Inf'], histogram.counts):
+                cumulative += count
+                lines.append(f'scraper_stage_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'scraper_stage_seconds_sum{{{labels}}} {histogram.sum!r}')
+            lines.append(f'scraper_stage_seconds_count{{{labels}}} {histogram.count}')
+        previous = None
+        for (counter, host), value in counters:
+            name = f'scraper_{counter}_total'
+            if counter != previous:
+                lines.append(f'# TYPE {name} counter')
+                previous = counter
+            labels = _labels(host=host)
+            lines.append(f'{name}{{{labels}}} {value:g}' if labels else f'{name} {value:g}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path: str):
+        """Replace `path` with the current metrics: JSON for a .json file, Prometheus text otherwise"""
+        text = self.to_json() if path.lower().endswith('.json') else self.to_prometheus()
+        temp = f'{path}.tmp'
+        with open(temp, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(temp, path)
+
+
+def _stage_order(stage: str) -> int:
+    return STAGES.index(stage) if stage in STAGES else len(STAGES)
+
+
+def _labels(**labels) -> str:
+    def escape(value: str) -> str:
+        return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return ','.join(f'{name}="{escape(value)}"' for name, value in labels.items() if value)
+
+
+class MetricsServer:
+    """
+    Serves a ScrapeMetrics on a local port from a daemon thread:
+    /metrics in the Prometheus text format, /metrics.json as JSON.
+    Port 0 picks a free port, see `port`.
+    """
+
+    def __init__(self, metrics: ScrapeMetrics, port: int = 0, host: str = '127.0.0.1'):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split('?', 1)[0]
+                if path == '/metrics':
+                    body, content_type = metrics.to_prometheus(), PROMETHEUS_CONTENT_TYPE
+                elif path == '/metrics.json':
+                    body, content_type = metrics.to_json(), 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, name='metrics-server', daemon=True)
+        self._thread.start()
+
+    @property
+    def port(self) -> int:
+        return self.server.server_address[1]
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
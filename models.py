@@ -1,7 +1,13 @@
+from array import array
 from dataclasses import dataclass
 from datetime import datetime
+import os
 import sqlite3
-from typing import List, Optional
+from typing import Iterable, Iterator, List, Optional, Sequence
+from normalize import from_micros, migrate_timestamps, to_datetime, to_micros
+
+# Per-user files that should not land in whatever directory the scraper runs from
+USER_DIR = os.path.join(os.path.expanduser('~'), '.webscrapestudio')
 
 @dataclass
 class ScrapingConfig:
@@ -13,8 +19,79 @@ class ScrapingConfig:
     handle_cloudflare: bool = False
     captcha_api_key: Optional[str] = None
     captcha_site_key: Optional[str] = None
+    # CAPTCHA solving: backend (2captcha / fake), concurrent solves, token lifetime, tokens solved ahead per host
+    captcha_backend: str = '2captcha'
+    captcha_workers: int = 4
+    captcha_token_ttl: float = 110.0
+    captcha_prefetch: int = 2
+    # Try plain HTTP first and use the browser tiers only for pages that need them
+    fetch_escalation: bool = True
+    # Clearance cookies + user agent captured after solved challenges (None = keep in memory only)
+    session_store_path: Optional[str] = os.path.join(USER_DIR, 'sessions.json')
+    session_ttl: float = 1800.0
+    # Concurrency and per-host politeness
+    max_workers: int = 1
+    max_per_host: int = 2
+    requests_per_second: float = 0.0  # per host, 0 = unlimited
+    burst: int = 1
+    min_delay: float = 1.0
+    max_delay: float = 3.0
+    # HTTP session pool
+    connect_timeout: float = 10.0
+    read_timeout: float = 30.0
+    # Browser pool for the Selenium / Cloudflare / CAPTCHA paths
+    browser_pool_size: int = 1
+    browser_max_pages: int = 100
+    browser_max_memory_mb: float = 512.0
+    # Page readiness in the browser paths: selectors / challenge / network_idle / fixed
+    wait_strategy: str = 'selectors'
+    wait_timeout: float = 30.0
+    network_idle_time: float = 0.5
+    # HTML parser backend: html.parser / lxml / selectolax
+    parser: str = 'html.parser'
+    # Parse in a process pool (0 = parse inline in the fetch threads)
+    parse_workers: int = 0
+    parse_queue_size: int = 64
+    # On-disk HTTP cache for the plain-HTTP path (None = disabled)
+    http_cache_path: Optional[str] = None
+    http_cache_ttl: float = 3600.0
+    http_cache_max_mb: float = 512.0
+    # Incremental re-scrapes: skip unchanged pages, record price changes
+    incremental: bool = False
+    incremental_db_path: str = 'scraper.db'
+    # Resumable crawl frontier
+    frontier_path: str = 'frontier.db'
+    max_attempts: int = 3
+    retry_delay: float = 60.0  # before the first retry, doubles per attempt
+    # In-run retries of 429 / 5xx / connection errors, with full-jitter backoff
+    max_retries: int = 3
+    retry_base_delay: float = 1.0
+    retry_max_delay: float = 60.0
+    # Per-host circuit breaker and AIMD concurrency between 1 and max_per_host
+    breaker_threshold: int = 5
+    breaker_reset: float = 30.0
+    adaptive_concurrency: bool = True
+    # Decimal separator of prices, e.g. 'de_DE' for 1.299,99 (None = guess from the text)
+    price_locale: Optional[str] = None
+    # Headless scheduled runs: cron expression ('0 3 * * *') and a file with one URL per line to seed each run
+    schedule: Optional[str] = None
+    urls_file: Optional[str] = None
+    # URL discovery from sitemaps (indexes and .gz too; default: those in robots.txt) and listing
+    # pages, followed through next-page links or a '{page}' placeholder; url_pattern filters the results
+    discover_urls: bool = False
+    sitemap_urls: Optional[List[str]] = None
+    listing_urls: Optional[List[str]] = None
+    product_link_selector: str = 'a[href]'
+    next_page_selector: str = 'a[rel="next"], link[rel="next"]'
+    max_listing_pages: int = 1000
+    discovery_capacity: int = 10000000  # URLs the dedupe filter is sized for
+    # Stage timings, bytes and page counts (see metrics.py): rewritten to this file after every batch
+    # of URLs (.json = JSON, otherwise Prometheus text) and served on 127.0.0.1:metrics_port (0 = off)
+    metrics_path: Optional[str] = None
+    metrics_port: int = 0
 
-@dataclass
+# slots: no per-instance __dict__, so millions of products fit in far less memory
+@dataclass(slots=True)
 class Product:
     id: Optional[int]
     name: str
@@ -35,9 +112,16 @@ class Product:
             description TEXT,
             url TEXT NOT NULL,
             marketplace TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            created_at TIMESTAMP DEFAULT (CAST(strftime('%s', 'now', 'localtime') AS INTEGER) * 1000000)
         )
         ''')
+        migrate_timestamps(conn)
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_products_url ON products (url)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_products_marketplace ON products (marketplace)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_products_created_at ON products (created_at)')
+        # Sortable columns of the results view
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_products_name ON products (name)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_products_price ON products (price)')
         conn.commit()
 
     def save(self, conn: sqlite3.Connection):
@@ -51,16 +135,142 @@ class Product:
         self.id = cursor.lastrowid
 
     @staticmethod
-    def get_all(conn: sqlite3.Connection) -> List['Product']:
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM products')
-        rows = cursor.fetchall()
-        return [Product(
+    def insert_many(conn: sqlite3.Connection, products: List['Product']):
+        """INSERT without committing; the caller owns the transaction"""
+        Product.insert_rows(conn, ((p.name, p.price, p.description, p.url, p.marketplace, p.created_at)
+                                   for p in products))
+
+    @staticmethod
+    def insert_rows(conn: sqlite3.Connection, rows: Iterable[tuple]):
+        """INSERT (name, price, description, url, marketplace, created_at) rows without committing"""
+        conn.executemany('''
+        INSERT INTO products (name, price, description, url, marketplace, created_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ''', rows)
+
+    @staticmethod
+    def from_row(row) -> 'Product':
+        return Product(
             id=row[0],
             name=row[1],
             price=row[2],
             description=row[3],
             url=row[4],
             marketplace=row[5],
-            created_at=datetime.strptime(row[6], '%Y-%m-%d %H:%M:%S')
-        ) for row in rows]
\ No newline at end of file
+            created_at=to_datetime(row[6])
+        )
+
+    @staticmethod
+    def get_all(conn: sqlite3.Connection) -> List['Product']:
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM products')
+        rows = cursor.fetchall()
+        return [Product.from_row(row) for row in rows]
+
+
+class ProductBatch:
+    """
+    Products stored by column: one list or typed array per field instead of
+    one object per product. Prices are an array('d') and created_at an
+    array('q') of microseconds since 1970-01-01 (naive, no time zone
+    conversion), so both can be handed to Arrow without copying. Ids of
+    products that were never saved are 0.
+
+    Iterating yields Product objects for code that wants them; the database
+    writer and the exporters read the columns directly.
+    """
+
+    __slots__ = ('ids', 'names', 'prices', 'descriptions', 'urls', 'marketplaces', 'created_at')
+
+    def __init__(self):
+        self.ids = array('q')
+        self.names: List[str] = []
+        self.prices = array('d')
+        self.descriptions: List[str] = []
+        self.urls: List[str] = []
+        self.marketplaces: List[str] = []
+        self.created_at = array('q')
+
+    @classmethod
+    def from_products(cls, products: Iterable[Product]) -> 'ProductBatch':
+        batch = cls()
+        batch.extend(products)
+        return batch
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[tuple]) -> 'ProductBatch':
+        """From (id, name, price, description, url, marketplace, created_at) database rows"""
+        batch = cls()
+        for row in rows:
+            batch.append_row(*row)
+        return batch
+
+    def append_row(self, id: Optional[int], name: str, price: float, description: str, url: str,
+                   marketplace: str, created_at):
+        # Rows straight from the database already hold epoch microseconds
+        if not isinstance(created_at, int):
+            created_at = to_micros(to_datetime(created_at))
+        self.ids.append(id or 0)
+        self.names.append(name)
+        self.prices.append(price)
+        self.descriptions.append(description)
+        self.urls.append(url)
+        self.marketplaces.append(marketplace)
+        self.created_at.append(created_at)
+
+    def append(self, product: Product):
+        self.append_row(product.id, product.name, product.price, product.description, product.url,
+                        product.marketplace, product.created_at)
+
+    def extend(self, products: Iterable[Product]):
+        for product in products:
+            self.append(product)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __getitem__(self, index: int) -> Product:
+        return Product(
+            id=self.ids[index] or None,
+            name=self.names[index],
+            price=self.prices[index],
+            description=self.descriptions[index],
+            url=self.urls[index],
+            marketplace=self.marketplaces[index],
+            created_at=from_micros(self.created_at[index]),
+        )
+
+    def __iter__(self) -> Iterator[Product]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def datetimes(self) -> Iterator[datetime]:
+        return map(from_micros, self.created_at)
+
+    def rows(self, epoch: bool = False) -> Iterator[tuple]:
+        """
+        (name, price, description, url, marketplace, created_at) tuples, as
+        inserted into the database; with `epoch` created_at stays in
+        microseconds, which is how the database stores it
+        """
+        created_at = self.created_at if epoch else self.datetimes()
+        return zip(self.names, self.prices, self.descriptions, self.urls, self.marketplaces, created_at)
+
+    def take(self, indices: Sequence[int]) -> 'ProductBatch':
+        """A new batch with the rows at `indices`, in that order"""
+        batch = ProductBatch()
+        for column in self.__slots__:
+            source = getattr(self, column)
+            values = [source[index] for index in indices]
+            if isinstance(source, array):
+                values = array(source.typecode, values)
+            setattr(batch, column, values)
+        return batch
+
+    def chunks(self, size: int) -> Iterator['ProductBatch']:
+        """Consecutive slices of at most `size` rows"""
+        for start in range(0, len(self), size):
+            batch = ProductBatch()
+            for column in self.__slots__:
+                setattr(batch, column, getattr(self, column)[start:start + size])
+            yield batch
@@ -0,0 +1,186 @@
+import re
+import sqlite3
+from array import array
+from datetime import datetime, timedelta
+from typing import Optional, Sequence
+
+# Timestamps are stored as integer microseconds since this (naive) epoch:
+# no time zone conversion, so datetime.now() round-trips unchanged
+EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+# Timestamp columns that older versions stored as ISO text
+_TIMESTAMP_COLUMNS = {
+    'products': ('created_at',),
+    'product_fingerprints': ('last_seen', 'last_changed'),
+    'price_history': ('changed_at',),
+}
+# PRAGMA user_version once the columns above hold integers
+TIMESTAMP_SCHEMA_VERSION = 1
+# ISO text -> microseconds, in SQL so the migration never leaves SQLite
+_TEXT_TO_MICROS = (
+    "CAST(strftime('%s', {0}) AS INTEGER) * 1000000 + "
+    "CASE WHEN substr({0}, 20, 1) = '.' "
+    "THEN CAST(substr(substr({0}, 21, 6) || '000000', 1, 6) AS INTEGER) ELSE 0 END"
+)
+
+
+def to_micros(moment: datetime) -> int:
+    if moment.tzinfo is not None:
+        moment = moment.astimezone().replace(tzinfo=None)
+    return (moment - EPOCH) // _MICROSECOND
+
+
+def from_micros(micros: int) -> datetime:
+    return EPOCH + timedelta(microseconds=micros)
+
+
+def to_datetime(value) -> Optional[datetime]:
+    """A timestamp read from the database: epoch microseconds, or ISO text written by older versions"""
+    if value is None or isinstance(value, datetime):
+        return value
+    if isinstance(value, bytes):
+        value = value.decode()
+    if isinstance(value, str):
+        if not value.lstrip('-').isdigit():
+            return datetime.fromisoformat(value)
+        value = int(value)
+    return from_micros(int(value))
+
+
+def register_sqlite_types():
+    """
+    Store datetimes as epoch microseconds. Columns declared TIMESTAMP come
+    back as datetimes on connections opened with
+    detect_types=sqlite3.PARSE_DECLTYPES; other connections get the raw
+    integers, which is what the columnar code wants.
+    """
+    sqlite3.register_adapter(datetime, to_micros)
+    sqlite3.register_converter('TIMESTAMP', to_datetime)
+
+
+def migrate_timestamps(conn: sqlite3.Connection):
+    """Convert ISO text timestamps left by older versions to epoch microseconds, once per database"""
+    if conn.execute('PRAGMA user_version').fetchone()[0] >= TIMESTAMP_SCHEMA_VERSION:
+        return
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    with conn:
+        for table, columns in _TIMESTAMP_COLUMNS.items():
+            if table not in tables:
+                continue
+            for column in columns:
+                conn.execute(f"UPDATE {table} SET {column} = {_TEXT_TO_MICROS.format(column)} "
+                             f"WHERE typeof({column}) = 'text' AND strftime('%s', {column}) IS NOT NULL")
+        conn.execute(f'PRAGMA user_version = {TIMESTAMP_SCHEMA_VERSION}')
+
+
+register_sqlite_types()
+
+
+# Locales that write 1.299,99 rather than 1,299.99
+_DECIMAL_COMMA_LANGUAGES = frozenset((
+    'be', 'bg', 'cs', 'da', 'de', 'el', 'es', 'fi', 'fr', 'hr', 'hu', 'id', 'it', 'kk', 'lt', 'lv',
+    'nb', 'nl', 'no', 'pl', 'pt', 'ro', 'ru', 'sk', 'sl', 'sr', 'sv', 'tr', 'uk', 'vi',
+))
+# A number with its grouping: separators and the spaces / apostrophes used between thousands, each
+# followed by exactly three digits, then at most one decimal part ('99.99 15% off' stops at 99.99)
+_GROUPING = ' \'\u2019\u00a0\u202f\u2009'
+_NUMBER = re.compile(f"-?(?:\\d{{1,3}}(?:[.,{_GROUPING}]\\d{{3}})+(?:[.,]\\d+)?|\\d+(?:[.,]\\d+)?)")
+_DROP_GROUPING = str.maketrans('', '', _GROUPING)
+
+
+def decimal_separator(locale: Optional[str]) -> Optional[str]:
+    """',' or '.' for a locale such as 'de_DE' or 'ru-RU'; None to guess from the text"""
+    if not locale:
+        return None
+    return ',' if re.split('[_-]', locale.lower())[0] in _DECIMAL_COMMA_LANGUAGES else '.'
+
+
+def _number(text: str) -> Optional[str]:
+    match = _NUMBER.search(text)
+    if not match:
+        return None
+    return match.group().translate(_DROP_GROUPING)
+
+
+def _decimal_hint(number: str) -> Optional[str]:
+    """The decimal separator if `number` alone gives it away, else None"""
+    comma, dot = number.rfind(','), number.rfind('.')
+    if comma >= 0 and dot >= 0:
+        return ',' if comma > dot else '.'
+    position = max(comma, dot)
+    if position < 0:
+        return None
+    separator = number[position]
+    other = '.' if separator == ',' else ','
+    if number.count(separator) > 1:
+        return other
+    if len(number) - position - 1 != 3 or number[:position].lstrip('-') in ('', '0'):
+        return separator
+    # 1,299 or 1.299: a single separator before three digits
+    return None
+
+
+def _to_float(number: str, decimal: Optional[str]) -> float:
+    if decimal is None:
+        # Nothing tells the separator apart: three digits after it are thousands
+        decimal = _decimal_hint(number) or ('.' if ',' in number else ',')
+    if decimal == ',':
+        return float(number.replace('.', '').replace(',', '.'))
+    return float(number.replace(',', ''))
+
+
+def parse_price(text: str, decimal: Optional[str] = None) -> float:
+    """
+    The number in a price string such as '$1,299.99', '1.299,99 €',
+    '12 990 ₽' or '1 299,50 руб.' Currency symbols and words are ignored
+    and spaces (including no-break and thin spaces) and apostrophes group
+    thousands. `decimal` fixes the decimal separator; without it the
+    separator is guessed from the text.
+    """
+    number = _number(text)
+    if number is None:
+        raise ValueError(f"No price in {text!r}")
+    return _to_float(number, decimal)
+
+
+def parse_prices(texts: Sequence[str], decimal: Optional[str] = None) -> array:
+    """
+    parse_price() over a whole batch, as an array('d'); strings without a
+    number become NaN.
+
+    Prices from one marketplace share a format, so without `decimal` the
+    separator is taken from the first price that gives it away and applied
+    to the rest. With pyarrow installed the batch is then converted by
+    Arrow compute kernels instead of a Python loop.
+    """
+    if decimal is None:
+        numbers = filter(None, map(_number, texts))
+        decimal = next(filter(None, map(_decimal_hint, numbers)), None)
+    if decimal is not None:
+        prices = _arrow_prices(texts, decimal)
+        if prices is not None:
+            return prices
+    nan = float('nan')
+    return array('d', (nan if number is None else _to_float(number, decimal) for number in map(_number, texts)))
+
+
+def _arrow_prices(texts: Sequence[str], decimal: str) -> Optional[array]:
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+    except ImportError:
+        return None
+    column = pc.extract_regex(pa.array(texts, pa.string()), f'(?P<number>{_NUMBER.pattern})')
+    column = pc.struct_field(column, [0])
+    column = pc.replace_substring_regex(column, f'[{_GROUPING}]', '')
+    column = pc.replace_substring(column, '.' if decimal == ',' else ',', '')
+    if decimal == ',':
+        column = pc.replace_substring(column, ',', '.')
+    try:
+        column = pc.cast(column, pa.float64()).fill_null(float('nan'))
+    except pa.ArrowInvalid:
+        return None
+    prices = array('d')
+    prices.frombytes(column.buffers()[1])
+    return prices[column.offset:column.offset + len(column)]
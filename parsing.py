@@ -0,0 +1,261 @@
+"""
+Product field extraction with pluggable HTML parser backends.
+
+Backends:
+  html.parser - BeautifulSoup with the stdlib parser (default, no extra deps)
+  lxml        - lxml.html with compiled cssselect selectors (pip install lxml cssselect)
+  selectolax  - selectolax/lexbor (pip install selectolax)
+
+CSS selectors are compiled once per (backend, selectors) pair and reused for
+every page scraped with the same ScrapingConfig.
+"""
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+from functools import lru_cache
+import hashlib
+import json
+import time
+from typing import Dict, List, Optional, Tuple
+from bs4 import BeautifulSoup
+import soupsieve
+from models import Product
+from normalize import decimal_separator, parse_price
+from throttle import host_of
+
+
+class ParserBackend:
+    name = ''
+
+    def compile(self, selector: str):
+        raise NotImplementedError
+
+    def extract(self, html: str, compiled: Dict[str, object]) -> Dict[str, Optional[str]]:
+        """Return the text of the first match for every field (None if nothing matched)"""
+        raise NotImplementedError
+
+    def links(self, html: str, compiled) -> List[str]:
+        """href attributes of every element matching one compiled selector"""
+        raise NotImplementedError
+
+
+class SoupBackend(ParserBackend):
+    name = 'html.parser'
+
+    def compile(self, selector: str):
+        return soupsieve.compile(selector)
+
+    def extract(self, html, compiled):
+        soup = BeautifulSoup(html, 'html.parser')
+        result = {}
+        for field, selector in compiled.items():
+            element = selector.select_one(soup)
+            result[field] = element.text if element is not None else None
+        return result
+
+    def links(self, html, compiled):
+        soup = BeautifulSoup(html, 'html.parser')
+        return [element['href'] for element in compiled.select(soup) if element.get('href')]
+
+
+class LxmlBackend(ParserBackend):
+    name = 'lxml'
+
+    def __init__(self):
+        import lxml.html
+        from lxml.cssselect import CSSSelector
+        self._fromstring = lxml.html.fromstring
+        self._selector = CSSSelector
+
+    def compile(self, selector: str):
+        return self._selector(selector)
+
+    def extract(self, html, compiled):
+        root = self._fromstring(html)
+        result = {}
+        for field, selector in compiled.items():
+            matches = selector(root)
+            result[field] = matches[0].text_content() if matches else None
+        return result
+
+    def links(self, html, compiled):
+        return [element.get('href') for element in compiled(self._fromstring(html)) if element.get('href')]
+
+
+class SelectolaxBackend(ParserBackend):
+    name = 'selectolax'
+
+    def __init__(self):
+        from selectolax.lexbor import LexborHTMLParser
+        self._parser = LexborHTMLParser
+
+    def compile(self, selector: str):
+        # selectolax parses selectors natively in C, there is nothing to precompile
+        return selector
+
+    def extract(self, html, compiled):
+        tree = self._parser(html)
+        result = {}
+        for field, selector in compiled.items():
+            node = tree.css_first(selector)
+            result[field] = node.text() if node is not None else None
+        return result
+
+    def links(self, html, compiled):
+        return [node.attributes['href'] for node in self._parser(html).css(compiled) if node.attributes.get('href')]
+
+
+BACKENDS = {
+    SoupBackend.name: SoupBackend,
+    LxmlBackend.name: LxmlBackend,
+    SelectolaxBackend.name: SelectolaxBackend,
+}
+
+
+@lru_cache(maxsize=None)
+def get_backend(name: str) -> ParserBackend:
+    try:
+        backend = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown parser backend: {name}")
+    return backend()
+
+
+@lru_cache(maxsize=256)
+def _compile(backend_name: str, selectors: Tuple[Tuple[str, str], ...]) -> Dict[str, object]:
+    backend = get_backend(backend_name)
+    return {field: backend.compile(selector) for field, selector in selectors}
+
+
+def compiled_selectors(config) -> Dict[str, object]:
+    """Compiled selectors for a config, cached across calls"""
+    return _compile(config.parser, tuple(sorted(config.selectors.items())))
+
+
+def extract_fields(html: str, config) -> Dict[str, Optional[str]]:
+    return get_backend(config.parser).extract(html, compiled_selectors(config))
+
+
+class SelectorsNotFound(Exception):
+    """Some product selectors matched nothing on the page"""
+
+
+def parse_product(html: str, url: str, config) -> Product:
+    fields = extract_fields(html, config)
+    missing = [field for field in ('name', 'price', 'description') if fields.get(field) is None]
+    if missing:
+        raise SelectorsNotFound(f"Selectors matched nothing: {', '.join(missing)}")
+
+    return product_from_fields({
+        'name': fields['name'].strip(),
+        'price': parse_price(fields['price'], decimal_separator(config.price_locale)),
+        'description': fields['description'].strip(),
+    }, url, config)
+
+
+def product_from_fields(fields: dict, url: str, config) -> Product:
+    """Build a Product from already extracted name / price / description"""
+    return Product(
+        id=None,
+        name=fields['name'],
+        price=fields['price'],
+        description=fields['description'],
+        url=url,
+        marketplace=config.url_pattern.split('/')[2],
+        created_at=datetime.now()
+    )
+
+
+def product_fields(product: Product) -> dict:
+    return {'name': product.name, 'price': product.price, 'description': product.description}
+
+
+def fields_key(config) -> str:
+    """Identifies the extraction settings; cached fields are only reused for the same key"""
+    data = json.dumps([config.parser, sorted(config.selectors.items())])
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+
+# Config of the current parse worker process, set once by the pool initializer
+_worker_config = None
+
+
+def _init_worker(config):
+    global _worker_config
+    _worker_config = config
+
+
+def _parse_in_worker(html: str, url: str) -> Tuple[Product, float]:
+    started = time.perf_counter()
+    product = parse_product(html, url, _worker_config)
+    return product, time.perf_counter() - started
+
+
+class ParsePipeline:
+    """
+    Parses fetched pages in a ProcessPoolExecutor of `config.parse_workers`
+    processes.
+
+    At most `config.parse_queue_size` pages wait for a parser; once the queue
+    is full submit() blocks until a page is parsed, which stalls the fetch
+    loop feeding it and keeps memory bounded however many URLs are queued.
+    Callbacks run on the thread calling submit()/close(). Parse times,
+    measured in the workers, go to `metrics` (a ScrapeMetrics) if given.
+    """
+
+    def __init__(self, config, on_result, on_error, metrics=None):
+        self.on_result = on_result
+        self.on_error = on_error
+        self.metrics = metrics
+        self.max_pending = max(1, config.parse_queue_size)
+        self._pending = {}
+        self._pool = ProcessPoolExecutor(max_workers=config.parse_workers,
+                                         initializer=_init_worker, initargs=(config,))
+
+    def submit(self, index: int, url: str, page):
+        """
+        `page` is raw HTML, or an already built Product (or None for a
+        skipped page) that goes straight to on_result
+        """
+        if page is None or isinstance(page, Product):
+            self.on_result(index, url, page)
+            return
+        while len(self._pending) >= self.max_pending:
+            self._drain(timeout=None)
+        self._pending[self._pool.submit(_parse_in_worker, page, url)] = (index, url)
+        self._drain(timeout=0)
+
+    def join(self):
+        """Wait until every submitted page has been parsed and reported"""
+        while self._pending:
+            self._drain(timeout=None)
+
+    def _drain(self, timeout: Optional[float]):
+        if not self._pending:
+            return
+        done, _ = wait(self._pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            index, url = self._pending.pop(future)
+            try:
+                product, seconds = future.result()
+            except Exception as e:
+                self.on_error(index, url, e)
+            else:
+                if self.metrics:
+                    self.metrics.observe('parse', seconds, host_of(url), url)
+                self.on_result(index, url, product)
+
+    def close(self):
+        """Wait for queued pages to be parsed and stop the workers"""
+        try:
+            self.join()
+        finally:
+            self._pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._pool.shutdown(cancel_futures=True)
@@ -0,0 +1,163 @@
+import tkinter as tk
+from collections import deque
+from tkinter import ttk
+from typing import List, Optional
+from database import Database
+from models import Product
+
+
+class VirtualResultsView:
+    """
+    Product table that never holds more than `window_pages * page_size` rows.
+
+    Rows come from keyset-paginated Database queries. Scrolling close to
+    either end of the window loads the adjacent page and drops one from the
+    other end; sorting (click a heading) and filtering run in SQL.
+    """
+
+    # Treeview column, heading text, products column
+    COLUMNS = (
+        ('Name', 'Название', 'name'),
+        ('Price', 'Цена', 'price'),
+        ('Marketplace', 'Площадка', 'marketplace'),
+        ('Created At', 'Дата', 'created_at'),
+    )
+
+    def __init__(self, parent, db_path: str = 'scraper.db', page_size: int = 100,
+                 window_pages: int = 3):
+        self.page_size = page_size
+        self.window_pages = max(2, window_pages)
+        self.order_by = 'id'
+        self.descending = True  # newest first
+        self.search: Optional[str] = None
+        self.pages = deque()
+        self.has_before = False
+        self.has_after = False
+        self._loading = False
+
+        self.db = Database(db_path)
+        self.db.connect()
+
+        self.frame = ttk.Frame(parent)
+        self.tree = ttk.Treeview(self.frame, columns=[c[0] for c in self.COLUMNS],
+                                 show='headings', style="Treeview")
+        for column, text, field in self.COLUMNS:
+            self.tree.heading(column, text=text, command=lambda f=field: self.sort(f))
+        self.scrollbar = ttk.Scrollbar(self.frame, orient=tk.VERTICAL, command=self.tree.yview)
+        self.tree.configure(yscrollcommand=self._on_scroll)
+        self.status = ttk.Label(self.frame)
+
+        self.status.pack(side=tk.BOTTOM, anchor=tk.W)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.frame.bind('<Destroy>', lambda e: self.db.close() if e.widget is self.frame else None)
+
+    def _query(self, after: Optional[Product], backwards: bool) -> List[Product]:
+        descending = self.descending != backwards
+        if self.order_by == 'id':
+            return self.db.query_products(after_id=after.id if after else None, limit=self.page_size,
+                                          descending=descending, search=self.search)
+        return self.db.query_products(
+            limit=self.page_size, descending=descending, order_by=self.order_by,
+            after_key=Database.sort_key(after, self.order_by) if after else None,
+            search=self.search)
+
+    @staticmethod
+    def _values(product: Product):
+        return (
+            product.name,
+            f"${product.price:.2f}",
+            product.marketplace,
+            product.created_at.strftime('%Y-%m-%d %H:%M:%S')
+        )
+
+    def _show_first_page(self):
+        self.tree.delete(*self.tree.get_children())
+        page = self._query(None, backwards=False)
+        for product in page:
+            self.tree.insert('', 'end', iid=str(product.id), values=self._values(product))
+        self.pages = deque([page])
+        self.has_before = False
+        self.has_after = len(page) == self.page_size
+
+    def reload(self):
+        """Drop all rows and show the first page for the current sort and filter"""
+        self._show_first_page()
+        self.status.configure(text=f"Всего: {self.db.count_products(search=self.search)}")
+
+    def refresh_live(self):
+        """
+        Re-read the first page while a scrape is writing new rows, but only
+        if the user is looking at the newest rows in the default order
+        """
+        if self.order_by != 'id' or not self.descending or self.search or self.has_before:
+            return
+        first_visible = float(self.tree.yview()[0])
+        self._show_first_page()
+        self.tree.yview_moveto(first_visible)
+
+    def sort(self, field: str):
+        if field == self.order_by:
+            self.descending = not self.descending
+        else:
+            self.order_by, self.descending = field, False
+        for column, text, column_field in self.COLUMNS:
+            arrow = (' ▼' if self.descending else ' ▲') if column_field == field else ''
+            self.tree.heading(column, text=text + arrow)
+        self.reload()
+
+    def set_filter(self, text: str):
+        self.search = text.strip() or None
+        self.reload()
+
+    def _on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        if self._loading:
+            return
+        if float(last) > 0.95 and self.has_after:
+            self._loading = True
+            self.tree.after_idle(self._load_after)
+        elif float(first) < 0.05 and self.has_before:
+            self._loading = True
+            self.tree.after_idle(self._load_before)
+
+    def _keep_position(self, anchor: str):
+        """Scroll so that `anchor` stays the top visible row after rows were added/removed"""
+        children = self.tree.get_children()
+        if anchor and children:
+            self.tree.yview_moveto(self.tree.index(anchor) / len(children))
+
+    def _load_after(self):
+        try:
+            anchor = self.tree.identify_row(1)
+            page = self._query(self.pages[-1][-1], backwards=False) if self.pages[-1] else []
+            for product in page:
+                self.tree.insert('', 'end', iid=str(product.id), values=self._values(product))
+            self.has_after = len(page) == self.page_size
+            if page:
+                self.pages.append(page)
+            if len(self.pages) > self.window_pages:
+                dropped = self.pages.popleft()
+                self.tree.delete(*[str(p.id) for p in dropped])
+                self.has_before = True
+            self._keep_position(anchor)
+        finally:
+            self._loading = False
+
+    def _load_before(self):
+        try:
+            anchor = self.tree.identify_row(1)
+            page = self._query(self.pages[0][0], backwards=True)
+            page.reverse()
+            for index, product in enumerate(page):
+                self.tree.insert('', index, iid=str(product.id), values=self._values(product))
+            self.has_before = len(page) == self.page_size
+            if page:
+                self.pages.appendleft(page)
+            if len(self.pages) > self.window_pages:
+                dropped = self.pages.pop()
+                self.tree.delete(*[str(p.id) for p in dropped])
+                self.has_after = True
+            self._keep_position(anchor)
+        finally:
+            self._loading = False
@@ -0,0 +1,91 @@
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+import requests
+
+# Statuses that mean "try again later" rather than "this page is broken"
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Statuses that mean the host is pushing back, not failing
+THROTTLE_STATUSES = (429, 503)
+
+
+class RetryableError(Exception):
+    """A fetch failed in a way that is worth retrying, e.g. 429/503 or a dropped connection"""
+
+    def __init__(self, message: str, status: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+    @property
+    def throttled(self) -> bool:
+        return self.status in THROTTLE_STATUSES
+
+    @classmethod
+    def from_response(cls, response: requests.Response) -> 'RetryableError':
+        return cls(f"{response.status_code} {response.reason} for url: {response.url}",
+                   response.status_code, parse_retry_after(response.headers.get('Retry-After')))
+
+
+class CircuitOpenError(Exception):
+    """Not attempted: the host's circuit breaker is open after repeated failures"""
+
+    def __init__(self, host: str):
+        super().__init__(f"Circuit open for {host}, skipped")
+        self.host = host
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header, given as seconds or as an HTTP date"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def check_response(response: requests.Response):
+    """raise_for_status(), but retryable statuses raise RetryableError"""
+    if response.status_code in RETRY_STATUSES:
+        raise RetryableError.from_response(response)
+    response.raise_for_status()
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter: retry n waits a random time
+    between 0 and min(max_delay, base_delay * 2**n), or what the server
+    asked for in Retry-After. A Retry-After longer than `max_delay` is not
+    waited out within the run: the fetch fails instead, so a crawl frontier
+    can schedule it for later.
+    """
+
+    def __init__(self, max_retries: int = 3, base_delay: float = 1.0, max_delay: float = 60.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    @classmethod
+    def from_config(cls, config) -> 'RetryPolicy':
+        return cls(config.max_retries, config.retry_base_delay, config.retry_max_delay)
+
+    @staticmethod
+    def is_retryable(exc: Exception) -> bool:
+        return isinstance(exc, (RetryableError, requests.ConnectionError, requests.Timeout))
+
+    def should_retry(self, exc: Exception, retries: int) -> bool:
+        retry_after = getattr(exc, 'retry_after', None)
+        if retry_after is not None and retry_after > self.max_delay:
+            return False
+        return retries < self.max_retries and self.is_retryable(exc)
+
+    def delay(self, retries: int, exc: Optional[Exception] = None) -> float:
+        retry_after = getattr(exc, 'retry_after', None)
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** retries))
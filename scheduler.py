@@ -0,0 +1,356 @@
+"""
+Headless runs of every marketplace in scraper_config.json.
+
+    python scheduler.py --once                 # run all marketplaces now, then exit
+    python scheduler.py                        # run each marketplace on its cron schedule
+    python scheduler.py --schedule '0 3 * * *' shop1 shop2
+
+All marketplaces of a run share one concurrency budget (--concurrency),
+split fairly between the marketplaces that are running. Each marketplace
+run appends one line of throughput figures and stage timings to the
+summary file; --metrics-file / --metrics-port export the live metrics of
+all of them (see metrics.py).
+"""
+import argparse
+import dataclasses
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, FrozenSet, Iterable, List, Optional
+from config import ConfigManager
+from database import Database
+from discovery import UrlDiscovery
+from frontier import DONE, FAILED, IN_FLIGHT, PENDING, Frontier
+from metrics import MetricsServer, ScrapeMetrics
+from models import ScrapingConfig
+from scraper import Scraper
+from throttle import ConcurrencyBudget
+
+logger = logging.getLogger(__name__)
+
+_ALIASES = {
+    '@yearly': '0 0 1 1 *',
+    '@annually': '0 0 1 1 *',
+    '@monthly': '0 0 1 * *',
+    '@weekly': '0 0 * * 0',
+    '@daily': '0 0 * * *',
+    '@midnight': '0 0 * * *',
+    '@hourly': '0 * * * *',
+}
+_MONTHS = {name: number for number, name in enumerate(
+    ('jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'), 1)}
+_WEEKDAYS = {name: number for number, name in enumerate(('sun', 'mon', 'tue', 'wed', 'thu', 'fri', 'sat'))}
+
+
+class CronSchedule:
+    """
+    A five-field cron expression (minute hour day-of-month month
+    day-of-week) with lists, ranges, steps, month / weekday names and the
+    @daily style aliases. As in cron, when both day fields are restricted
+    a day matching either one fires. Times are local.
+    """
+
+    def __init__(self, expression: str):
+        self.expression = expression
+        fields = _ALIASES.get(expression.strip().lower(), expression).split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expression!r}")
+        self.minutes = self._parse(fields[0], 0, 59)
+        self.hours = self._parse(fields[1], 0, 23)
+        self.days = self._parse(fields[2], 1, 31)
+        self.months = self._parse(fields[3], 1, 12, _MONTHS)
+        # 7 is Sunday too
+        self.weekdays = frozenset(day % 7 for day in self._parse(fields[4], 0, 7, _WEEKDAYS))
+        self._any_day = fields[2] == '*'
+        self._any_weekday = fields[4] == '*'
+
+    @staticmethod
+    def _parse(field: str, low: int, high: int, names: Optional[Dict[str, int]] = None) -> FrozenSet[int]:
+        def value(text: str) -> int:
+            number = names.get(text) if names else None
+            return number if number is not None else int(text)
+
+        values = set()
+        for part in field.lower().split(','):
+            span, _, step = part.partition('/')
+            if span == '*':
+                start, end = low, high
+            else:
+                first, _, last = span.partition('-')
+                start = value(first)
+                end = value(last) if last else (high if step else start)
+            step = int(step) if step else 1
+            if not low <= start <= end <= high or step < 1:
+                raise ValueError(f"Bad cron field {field!r}")
+            values.update(range(start, end + 1, step))
+        return frozenset(values)
+
+    def _day_matches(self, moment: datetime) -> bool:
+        day = moment.day in self.days
+        weekday = moment.isoweekday() % 7 in self.weekdays
+        if self._any_day or self._any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def next_after(self, moment: datetime) -> datetime:
+        """The first time after `moment` (to the minute) the schedule fires"""
+        moment = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = moment + timedelta(days=5 * 366)
+        while moment < limit:
+            if moment.month not in self.months:
+                moment = (moment.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(moment):
+                moment = moment.replace(hour=0, minute=0) + timedelta(days=1)
+            elif moment.hour not in self.hours:
+                moment = moment.replace(minute=0) + timedelta(hours=1)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return moment
+        raise ValueError(f"Cron expression never fires: {self.expression!r}")
+
+
+class MarketplaceScheduler:
+    """
+    Runs the marketplaces of a ConfigManager without the GUI.
+
+    Each marketplace crawls its own frontier (kept with its session store
+    under `state_dir/<name>/`) on its own thread and writes products to the
+    shared database. All of them take their fetch slots from one
+    ConcurrencyBudget of `max_concurrency`. A run resumes an interrupted
+    one if its frontier still has unfinished URLs; otherwise every known
+    URL is queued again, plus those in the config's `urls_file` and, with
+    `discover_urls`, those found in its sitemaps and listing pages.
+
+    Every scraper records into one ScrapeMetrics, written to
+    `metrics_path` after each marketplace run and served on
+    `metrics_port` while the scheduler is open.
+    """
+
+    def __init__(self, config_manager: ConfigManager, db_path: str = 'scraper.db', max_concurrency: int = 16,
+                 state_dir: str = 'runs', summary_path: str = 'run_summary.jsonl',
+                 default_schedule: Optional[str] = None, metrics_path: Optional[str] = None,
+                 metrics_port: int = 0):
+        self.config_manager = config_manager
+        self.db_path = db_path
+        self.state_dir = state_dir
+        self.summary_path = summary_path
+        self.default_schedule = default_schedule
+        self.budget = ConcurrencyBudget(max_concurrency)
+        self.metrics = ScrapeMetrics()
+        self.metrics_path = metrics_path
+        self.metrics_server = MetricsServer(self.metrics, metrics_port) if metrics_port else None
+        self._running: Dict[str, threading.Thread] = {}
+        self._summary_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def names(self) -> List[str]:
+        return list(self.config_manager.marketplace_configs)
+
+    def marketplace_config(self, name: str) -> ScrapingConfig:
+        """
+        The stored config, with the frontier and session files moved to the
+        marketplace's state directory and incremental fingerprints kept in
+        the shared products database
+        """
+        config = self.config_manager.get_marketplace(name)
+        if config is None:
+            raise KeyError(f"Unknown marketplace: {name}")
+        directory = os.path.join(self.state_dir, name)
+        os.makedirs(directory, exist_ok=True)
+        sessions = config.session_store_path
+        return dataclasses.replace(
+            config,
+            frontier_path=os.path.join(directory, os.path.basename(config.frontier_path)),
+            session_store_path=sessions and os.path.join(directory, os.path.basename(sessions)),
+            incremental_db_path=self.db_path,
+        )
+
+    def _seed(self, name: str, config: ScrapingConfig, frontier: Frontier):
+        if frontier.unfinished():
+            logger.info(f"{name}: продолжение прерванного запуска, осталось {frontier.unfinished()} URL")
+        else:
+            frontier.requeue()
+        if config.urls_file:
+            with open(config.urls_file, 'r', encoding='utf-8') as f:
+                frontier.add(line.strip() for line in f if line.strip() and not line.startswith('#'))
+        if config.discover_urls:
+            discovery = UrlDiscovery(config)
+            try:
+                added = discovery.feed(frontier)
+            finally:
+                discovery.close()
+            logger.info(f"{name}: найдено {added} новых URL ({discovery.stats()['found']} всего)")
+
+    def run_marketplace(self, name: str) -> dict:
+        """Crawl one marketplace to the end and return its summary"""
+        config = self.marketplace_config(name)
+        started_at = datetime.now()
+        started = time.monotonic()
+        share = self.budget.share(name)
+        frontier = Frontier.from_config(config)
+        scraper = None
+        products = errors = done_before = 0
+        failure = None
+        try:
+            self._seed(name, config, frontier)
+            done_before = frontier.counts()[DONE]
+            scraper = Scraper(config, budget=share, metrics=self.metrics)
+            with Database(self.db_path) as db, db.writer(metrics=self.metrics) as writer:
+                def on_product(product):
+                    nonlocal products
+                    products += 1
+                    writer.add(product)
+
+                def on_error(url, e):
+                    nonlocal errors
+                    errors += 1
+
+                scraper.crawl(frontier, result_callback=on_product, error_callback=on_error)
+        except Exception as e:
+            logger.exception(f"{name}: запуск завершился с ошибкой")
+            failure = str(e)
+        finally:
+            share.close()
+            counts = frontier.counts()
+            frontier.close()
+            if scraper:
+                scraper.close()
+
+        seconds = time.monotonic() - started
+        pages = counts[DONE] - done_before
+        hosts = scraper.host_stats if scraper else {}
+        if self.metrics_path:
+            self.metrics.write(self.metrics_path)
+        summary = {
+            'marketplace': name,
+            'started_at': started_at.isoformat(timespec='seconds'),
+            'finished_at': datetime.now().isoformat(timespec='seconds'),
+            'seconds': round(seconds, 3),
+            'pages': pages,
+            'products': products,
+            'errors': errors,
+            'failed': counts[FAILED],
+            'unfinished': counts[PENDING] + counts[IN_FLIGHT],
+            'pages_per_second': round(pages / seconds, 3) if seconds else 0.0,
+            'products_per_minute': round(products / seconds * 60, 1) if seconds else 0.0,
+            'tiers': scraper.tier_stats if scraper else {},
+            'hosts': hosts,
+            # Since the scheduler started, for this marketplace's hosts (database writes: all marketplaces)
+            'stages': self.metrics.summary(hosts),
+            'bytes': self.metrics.totals(hosts).get('bytes', 0),
+            'error': failure,
+        }
+        self._write_summary(summary)
+        return summary
+
+    def _write_summary(self, summary: dict):
+        logger.info(f"{summary['marketplace']}: {summary['pages']} страниц, {summary['products']} товаров, "
+                    f"{summary['errors']} ошибок за {summary['seconds']:.0f} с "
+                    f"({summary['pages_per_second']:.2f} стр/с)")
+        if not self.summary_path:
+            return
+        with self._summary_lock, open(self.summary_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(summary, ensure_ascii=False) + '\n')
+
+    def _start(self, name: str, results: Optional[Dict[str, dict]] = None) -> bool:
+        running = self._running.get(name)
+        if running and running.is_alive():
+            logger.warning(f"{name}: предыдущий запуск ещё идёт, пропускаем")
+            return False
+
+        def run():
+            summary = self.run_marketplace(name)
+            if results is not None:
+                results[name] = summary
+
+        thread = self._running[name] = threading.Thread(target=run, name=f'marketplace-{name}')
+        thread.start()
+        return True
+
+    def run_once(self, names: Optional[Iterable[str]] = None) -> Dict[str, dict]:
+        """Run the marketplaces (all by default) at the same time and wait for them; summaries by name"""
+        results = {}
+        for name in names or self.names():
+            self._start(name, results)
+        for thread in list(self._running.values()):
+            thread.join()
+        return results
+
+    def schedules(self, names: Optional[Iterable[str]] = None) -> Dict[str, CronSchedule]:
+        schedules = {}
+        for name in names or self.names():
+            expression = self.config_manager.get_marketplace(name).schedule or self.default_schedule
+            if expression:
+                schedules[name] = CronSchedule(expression)
+            else:
+                logger.warning(f"{name}: нет расписания, маркетплейс не будет запускаться")
+        return schedules
+
+    def run_forever(self, names: Optional[Iterable[str]] = None):
+        """Start each marketplace whenever its schedule fires, until stop() is called"""
+        schedules = self.schedules(names)
+        if not schedules:
+            return
+        now = datetime.now()
+        next_runs = {name: schedule.next_after(now) for name, schedule in schedules.items()}
+        while not self._stop.is_set():
+            upcoming = min(next_runs.values())
+            wait = (upcoming - datetime.now()).total_seconds()
+            # Wake up at least once a minute so clock changes and stop() are noticed
+            if wait > 0 and self._stop.wait(min(wait, 60.0)):
+                break
+            now = datetime.now()
+            for name, moment in next_runs.items():
+                if moment <= now:
+                    self._start(name)
+                    next_runs[name] = schedules[name].next_after(now)
+        for thread in list(self._running.values()):
+            thread.join()
+
+    def stop(self):
+        """Stop scheduling new runs; runs in progress finish"""
+        self._stop.set()
+
+    def close(self):
+        if self.metrics_server:
+            self.metrics_server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('marketplaces', nargs='*', help='names from the config file (default: all)')
+    parser.add_argument('--config', default='scraper_config.json')
+    parser.add_argument('--db', default='scraper.db')
+    parser.add_argument('--concurrency', type=int, default=16, help='concurrent fetches over all marketplaces')
+    parser.add_argument('--state-dir', default='runs', help='per-marketplace frontiers and sessions')
+    parser.add_argument('--summary', default='run_summary.jsonl', help='append per-marketplace summaries here')
+    parser.add_argument('--schedule', help='cron expression for marketplaces without their own schedule')
+    parser.add_argument('--once', action='store_true', help='run every marketplace now and exit')
+    parser.add_argument('--metrics-file', help='write stage timings here (.json = JSON, else Prometheus text)')
+    parser.add_argument('--metrics-port', type=int, default=0, help='serve /metrics and /metrics.json on this port')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    config_manager = ConfigManager(args.config)
+    unknown = [name for name in args.marketplaces if name not in config_manager.marketplace_configs]
+    if unknown:
+        parser.error(f"unknown marketplaces: {', '.join(unknown)}")
+    scheduler = MarketplaceScheduler(config_manager, args.db, args.concurrency, args.state_dir, args.summary,
+                                     args.schedule, args.metrics_file, args.metrics_port)
+    try:
+        if args.once:
+            scheduler.run_once(args.marketplaces)
+        else:
+            scheduler.run_forever(args.marketplaces)
+    except KeyboardInterrupt:
+        scheduler.stop()
+    finally:
+        scheduler.close()
+
+
+if __name__ == '__main__':
+    main()
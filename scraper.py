@@ -1,14 +1,25 @@
 import random
+import threading
 import time
-from typing import List, Optional
-import requests
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from bs4 import BeautifulSoup
-from datetime import datetime
-from models import Product, ScrapingConfig
-from bot_protection import AdvancedProtectionHandler
+from array import array
+from typing import List, Optional, Tuple, Union
+from models import Product, ProductBatch, ScrapingConfig
+from browser_pool import BrowserPool
+from engine import FetchEngine
+from captcha import CaptchaPending, CaptchaSolver
+from escalation import (BROWSER, HTTP, PROTECTED, ChallengeError, EscalationPolicy, config_tiers, is_challenge,
+                        solves_recaptcha)
+from frontier import DONE, FAILED, Frontier
+from http_session import HttpSessionPool
+from http_cache import HttpCache
+from incremental import NEW, FingerprintStore, content_hash
+from metrics import MetricsServer, ScrapeMetrics
+from sessions import SessionStore
+from retry import CircuitOpenError, RetryPolicy, check_response
+from parsing import (ParsePipeline, SelectorsNotFound, fields_key, parse_product, product_fields,
+                     product_from_fields)
+from throttle import BudgetShare, HostLimiter, host_of
+from waits import PageWaiter, WaitStats
 
 class Scraper:
     USER_AGENTS = [
@@ -16,11 +27,39 @@ class Scraper:
         'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
     ]
 
-    def __init__(self, config: ScrapingConfig):
+    def __init__(self, config: ScrapingConfig, browser_pool: Optional[BrowserPool] = None,
+                 budget: Optional[BudgetShare] = None, metrics: Optional[ScrapeMetrics] = None):
         self.config = config
-        self.driver = None
+        # Share of a concurrency budget held with other scrapers (None = only config.max_workers applies)
+        self.budget = budget
+        # Metrics passed in by the caller may be shared with other scrapers and are served by the caller
+        self.metrics = metrics or ScrapeMetrics()
+        self.metrics_server = MetricsServer(self.metrics, config.metrics_port) \
+            if config.metrics_port and metrics is None else None
         self.protection_handler = None
-        if self.config.handle_cloudflare or self.config.captcha_api_key:
+        self.http = HttpSessionPool.from_config(config, self.metrics)
+        # Kept across runs so breakers and learned per-host limits carry over
+        self.limiter = HostLimiter.from_config(config)
+        self.retry_policy = RetryPolicy.from_config(config)
+        # A pool passed in by the caller may be shared with other scrapers and is not closed here
+        self.browser_pool = browser_pool
+        self._owns_browser_pool = browser_pool is None
+        self._browser_pool_lock = threading.Lock()
+        self._browser_stats = {}
+        self.wait_stats = WaitStats()
+        self.waiter = PageWaiter.from_config(config, self.wait_stats)
+        self.cache = HttpCache.from_config(config)
+        self._fields_key = fields_key(config)
+        self.fingerprints = FingerprintStore(config.incremental_db_path) if config.incremental else None
+        # url -> (HTTP cache key, content hash, fetch tier) of fetched pages still waiting to be parsed
+        self._page_info = {}
+        self.escalation = EscalationPolicy(config_tiers(config))
+        self.sessions = SessionStore.from_config(config)
+        self.captcha = CaptchaSolver.from_config(config) if solves_recaptcha(config) else None
+        if PROTECTED in self.escalation.tiers:
+            # undetected_chromedriver and twocaptcha are only imported by configs that need them
+            from bot_protection import AdvancedProtectionHandler
+
             self.protection_handler = AdvancedProtectionHandler(self.config.captcha_api_key)
 
     def _get_headers(self):
@@ -30,80 +69,448 @@ class Scraper:
             'Accept-Language': 'en-US,en;q=0.5',
         }
 
-    def _init_selenium(self):
-        if not self.driver:
-            if self.protection_handler:
-                self.driver = self.protection_handler.init_browser()
-            else:
-                options = Options()
-                options.add_argument('--headless')
-                options.add_argument('--no-sandbox')
-                options.add_argument(f'user-agent={random.choice(self.USER_AGENTS)}')
-                self.driver = webdriver.Chrome(options=options)
+    def _create_driver(self):
+        if self.protection_handler:
+            return self.protection_handler.create_browser()
+        from selenium import webdriver
+        from selenium.webdriver.chrome.options import Options
+
+        options = Options()
+        options.add_argument('--headless')
+        options.add_argument('--no-sandbox')
+        options.add_argument(f'user-agent={random.choice(self.USER_AGENTS)}')
+        return webdriver.Chrome(options=options)
+
+    def _browsers(self) -> BrowserPool:
+        with self._browser_pool_lock:
+            if not self.browser_pool:
+                self.browser_pool = BrowserPool(
+                    self._create_driver,
+                    size=self.config.browser_pool_size,
+                    max_pages=self.config.browser_max_pages,
+                    max_memory_mb=self.config.browser_max_memory_mb,
+                )
+            return self.browser_pool
 
     def _cleanup_selenium(self):
+        with self._browser_pool_lock:
+            if self.browser_pool:
+                self._browser_stats = self.browser_pool.stats()
+                if self._owns_browser_pool:
+                    self.browser_pool.close()
+                    self.browser_pool = None
         if self.protection_handler:
             self.protection_handler.cleanup()
-        elif self.driver:
-            self.driver.quit()
-            self.driver = None
 
-    def scrape_product(self, url: str) -> Product:
-        html = None
-
-        if self.config.handle_cloudflare:
-            if not self.protection_handler:
-                self.protection_handler = AdvancedProtectionHandler()
-            html = self.protection_handler.handle_cloudflare(url)
-        elif self.config.captcha_site_key and self.config.captcha_api_key:
-            if not self.protection_handler:
-                self.protection_handler = AdvancedProtectionHandler(self.config.captcha_api_key)
-            html = self.protection_handler.handle_recaptcha(url, self.config.captcha_site_key)
-        elif self.config.use_selenium:
-            self._init_selenium()
-            self.driver.get(url)
-            time.sleep(random.uniform(1, 3))  # Random delay to avoid detection
-            html = self.driver.page_source
-        else:
-            response = requests.get(url, headers=self._get_headers(), 
-                                proxies={'http': self.config.proxy, 'https': self.config.proxy} if self.config.proxy else None)
-            response.raise_for_status()
-            html = response.text
+    @property
+    def browser_stats(self) -> dict:
+        """Lease counts and wait times of the browser pool"""
+        return self.browser_pool.stats() if self.browser_pool else self._browser_stats
+
+    @property
+    def connection_stats(self) -> dict:
+        """Requests sent vs. connections opened by the HTTP session pool"""
+        return self.http.stats.snapshot()
+
+    @property
+    def cache_stats(self) -> dict:
+        """Hits, misses and revalidations of the HTTP cache"""
+        return self.cache.stats() if self.cache else {}
+
+    @property
+    def tier_stats(self) -> dict:
+        """Fetch attempts and successes per tier, and the tier each host starts with"""
+        return {**self.escalation.stats(), 'hosts': self.escalation.preferred_tiers()}
+
+    @property
+    def captcha_stats(self) -> dict:
+        return self.captcha.stats() if self.captcha else {}
+
+    @property
+    def session_stats(self) -> dict:
+        return self.sessions.stats()
+
+    @property
+    def host_stats(self) -> dict:
+        """Per-host concurrency limit, outcome counts and circuit breaker state"""
+        return self.limiter.host_stats()
+
+    @property
+    def incremental_stats(self) -> dict:
+        """New / changed / unchanged page counts in incremental mode"""
+        return dict(self.fingerprints.counts) if self.fingerprints else {}
+
+    @property
+    def stage_stats(self) -> dict:
+        """count / avg / p50 / p95 / max seconds per scrape stage, see metrics.STAGES"""
+        return self.metrics.summary()
+
+    def export_metrics(self):
+        """Rewrite config.metrics_path with the current metrics"""
+        if self.config.metrics_path:
+            self.metrics.write(self.config.metrics_path)
+
+    def close(self):
+        self._cleanup_selenium()
+        self.http.close()
+        self.export_metrics()
+        if self.metrics_server:
+            self.metrics_server.close()
+        if self.cache:
+            self.cache.close()
+        if self.fingerprints:
+            self.fingerprints.close()
+        if self.captcha:
+            self.captcha.close()
+
+    def _fetch(self, url: str, tier: Optional[str] = None) -> Tuple[str, Optional[dict], Optional[str], str]:
+        """
+        Fetch with the cheapest tier that gets past bot protection, starting
+        at `tier` or at the one the escalation policy learned for the host.
+        Returns (html, cached product fields or None, HTTP cache key or None, tier)
+        """
+        host = host_of(url)
+        tier = tier or self.escalation.start_tier(host)
+        while True:
+            try:
+                html, fields, cache_key = self._fetch_tier(url, tier)
+                if fields is None and is_challenge(html):
+                    raise ChallengeError(f"Challenge page at {url}")
+            except ChallengeError as e:
+                self.metrics.add('challenges', 1, host)
+                tier = self._escalate(url, tier, e)
+                continue
+            return html, fields, cache_key, tier
+
+    def _escalate(self, url: str, tier: str, exc: Exception) -> str:
+        """Record that `tier` failed for the URL's host and return the next tier, or re-raise"""
+        self.escalation.record(host_of(url), tier, False)
+        next_tier = self.escalation.next_tier(tier)
+        if next_tier is None:
+            raise exc
+        return next_tier
+
+    def _fetch_tier(self, url: str, tier: str) -> Tuple[str, Optional[dict], Optional[str]]:
+        if tier == HTTP:
+            return self._fetch_http(url)
+
+        host = host_of(url)
+        token = None
+        if tier == PROTECTED and self.captcha:
+            # Raises CaptchaPending while the token is being solved, before a browser is leased
+            token = self.captcha.token_for(self.config.captcha_site_key, url)
+        with self._browsers().lease() as driver:
+            # The session's user agent stays on the browser until reset: other hosts lease it next
+            applied = self.sessions.apply_to_driver(host, driver)
+            try:
+                if tier == BROWSER:
+                    with self.metrics.stage('download', host):
+                        driver.get(url)
+                    with self.metrics.stage('challenge', host):
+                        self.waiter.wait(driver)
+                    html = driver.page_source
+                elif self.config.handle_cloudflare:
+                    with self.metrics.stage('challenge', host):
+                        html = self.protection_handler.handle_cloudflare(url, driver=driver, waiter=self.waiter)
+                else:
+                    with self.metrics.stage('challenge', host):
+                        html = self.protection_handler.handle_recaptcha(url, self.config.captcha_site_key,
+                                                                        driver=driver, token=token)
+                # Characters of the rendered page: the browser does not tell what went over the wire
+                self.metrics.add('bytes', len(html or ''), host)
+                # Only a solved challenge earns clearance cookies worth carrying over
+                solved = tier == PROTECTED and html and not is_challenge(html)
+                if solved and not self.sessions.get(host) and self.sessions.capture(host, driver):
+                    # Let the next pages of this host try the cheap path with the new cookies
+                    self.escalation.reset(host)
+            finally:
+                if applied:
+                    self.sessions.reset_driver(driver)
 
         if not html:
             raise Exception("Failed to fetch page content")
 
-        soup = BeautifulSoup(html, 'html.parser')
+        return html, None, None
+
+    def _fetch_http(self, url: str) -> Tuple[str, Optional[dict], Optional[str]]:
+        host = host_of(url)
+        headers = self._get_headers()
+        session_headers = self.sessions.request_headers(host)
+        request_headers = {**headers, **session_headers}
+        if self.cache:
+            entry = self.cache.lookup(url, headers, self._fields_key)
+            if entry and self.cache.is_fresh(entry):
+                self.cache.hit(entry)
+                return entry.html, entry.fields, entry.key
+            if entry:
+                request_headers.update(HttpCache.conditional_headers(entry))
+
+        response = self.http.get(url, headers=request_headers)
+        if self.cache and entry and response.status_code == 304:
+            self.cache.revalidated(entry)
+            return entry.html, entry.fields, entry.key
+        # Checked before the status: challenges often come as 403/503
+        if is_challenge(response.text, response.status_code):
+            if session_headers:
+                self.sessions.invalidate(host)
+            raise ChallengeError(f"Challenge page at {url}")
+        check_response(response)
+        if not self.cache:
+            return response.text, None, None
+        return response.text, None, self.cache.store(url, headers, response)
 
-        name = soup.select_one(self.config.selectors['name']).text.strip()
-        price = float(soup.select_one(self.config.selectors['price']).text.strip().replace('$', '').replace(',', ''))
-        description = soup.select_one(self.config.selectors['description']).text.strip()
+    def fetch_page(self, url: str) -> str:
+        while True:
+            try:
+                return self._fetch(url)[0]
+            except CaptchaPending as pending:
+                pending.future.result()
 
-        return Product(
-            id=None,
-            name=name,
-            price=price,
-            description=description,
-            url=url,
-            marketplace=self.config.url_pattern.split('/')[2],
-            created_at=datetime.now()
-        )
+    def _fetch_for_parsing(self, url: str, tier: Optional[str] = None):
+        """
+        Fetch task of scrape_products. Returns raw HTML, a ready Product when
+        the HTTP cache already holds its fields, or None when incremental
+        mode finds the page unchanged since the last run
+        """
+        html, fields, cache_key, tier = self._fetch(url, tier)
+        page_hash = content_hash(html) if self.fingerprints else None
+        self._page_info[url] = (None if fields else cache_key, page_hash, tier)
+        if page_hash and self.fingerprints.is_unchanged(url, page_hash):
+            return None
+        if fields:
+            return product_from_fields(fields, url, self.config)
+        return html
+
+    def _fetch_for_pipeline(self, url: str, tier: Optional[str] = None):
+        """_fetch_for_parsing timed as one page; the parse pool adds its parse time later"""
+        with self.metrics.page(url, pending=(CaptchaPending,)):
+            return self._fetch_for_parsing(url, tier)
+
+    def _scrape_for_run(self, url: str) -> Optional[Product]:
+        tier = None
+        with self.metrics.page(url, pending=(CaptchaPending,)):
+            while True:
+                page = self._fetch_for_parsing(url, tier)
+                if not isinstance(page, str):
+                    return page
+                try:
+                    with self.metrics.stage('parse', host_of(url)):
+                        return parse_product(page, url, self.config)
+                except SelectorsNotFound as e:
+                    # Maybe a page that only renders in a browser: try the next tier
+                    tier = self._escalate(url, self._page_info[url][2], e)
+
+    def scrape_product(self, url: str) -> Product:
+        tier = None
+        host = host_of(url)
+        with self.metrics.page(url):
+            while True:
+                try:
+                    html, fields, cache_key, tier = self._fetch(url, tier)
+                except CaptchaPending as pending:
+                    pending.future.result()
+                    continue
+                if fields:
+                    # Unchanged page (fresh or 304) parsed before with the same selectors
+                    product = product_from_fields(fields, url, self.config)
+                    break
+                try:
+                    with self.metrics.stage('parse', host):
+                        product = parse_product(html, url, self.config)
+                except SelectorsNotFound as e:
+                    tier = self._escalate(url, tier, e)
+                    continue
+                if cache_key:
+                    self.cache.store_fields(cache_key, self._fields_key, product_fields(product))
+                break
+        self.escalation.record(host, tier, True)
+        return product
 
-    def scrape_products(self, urls: List[str], progress_callback=None) -> List[Product]:
-        products = []
+    def scrape_products(self, urls: List[str], progress_callback=None,
+                        result_callback=None, error_callback=None,
+                        as_batch: bool = False) -> Union[List[Product], ProductBatch]:
+        """
+        Scrape `urls` with up to `config.max_workers` concurrent fetches.
+        Politeness delays and rate limits apply per host; products are
+        returned in the order of `urls`. With `config.parse_workers` > 0
+        pages are parsed in a process pool, see ParsePipeline.
+        `result_callback(product)` is called as soon as each product is
+        ready, e.g. to stream products into the database, and
+        `error_callback(url, exc)` for every URL that failed. Callbacks run
+        on the calling thread.
+
+        With `as_batch` the products are collected into a ProductBatch as
+        they arrive instead of being kept as objects.
+
+        In incremental mode (`config.incremental`) only products for URLs not
+        seen before are returned; unchanged pages are skipped before parsing
+        and changed ones are updated in place by the FingerprintStore.
+        """
+        results = {}
+        batch = ProductBatch()
+        order = array('q')
         total = len(urls)
+        done = 0
+
+        def on_product(index, url, product):
+            if as_batch:
+                batch.append(product)
+                order.append(index)
+            else:
+                results[index] = product
+            if result_callback:
+                result_callback(product)
+
+        def on_done(url):
+            nonlocal done
+            done += 1
+            if progress_callback:
+                progress_callback(done / total * 100)
+
+        def on_error(url, e):
+            if error_callback:
+                error_callback(url, e)
+            on_done(url)
 
         try:
-            for i, url in enumerate(urls, 1):
-                try:
-                    product = self.scrape_product(url)
-                    products.append(product)
-                    if progress_callback:
-                        progress_callback(i / total * 100)
-                    time.sleep(random.uniform(1, 3))  # Random delay between requests
-                except Exception as e:
-                    print(f"Error scraping {url}: {str(e)}")
+            self._run(urls, on_product, on_done, on_error)
+        finally:
+            self._cleanup_selenium()
+
+        if as_batch:
+            return batch.take(sorted(range(len(order)), key=order.__getitem__))
+        return [results[index] for index in sorted(results)]
+
+    def crawl(self, frontier: Frontier, progress_callback=None, result_callback=None,
+              error_callback=None, batch_size: Optional[int] = None) -> int:
+        """
+        Scrape every pending URL of `frontier`, recording each outcome in it
+        as soon as it is known, so an interrupted crawl resumes with the URLs
+        that are still pending. URLs that failed in a way worth retrying
+        (see RetryPolicy.is_retryable) are retried as the frontier schedules
+        them, others fail right away; the crawl returns once nothing is
+        pending, with the number of products scraped. Callbacks are as for
+        scrape_products, `error_callback` only runs once a URL has failed
+        for good.
+        """
+        batch_size = batch_size or max(100, self.config.max_workers * 20)
+        scraped = 0
+
+        def on_product(index, url, product):
+            nonlocal scraped
+            scraped += 1
+            if result_callback:
+                result_callback(product)
+
+        counts = frontier.counts()
+        total = sum(counts.values())
+        finished = counts[DONE] + counts[FAILED]
+
+        def on_done(url):
+            frontier.mark_done(url)
+            report_progress()
+
+        def on_error(url, e):
+            # A skip behind an open circuit breaker says nothing about the URL itself
+            retry = self.retry_policy.is_retryable(e) or isinstance(e, CircuitOpenError)
+            state = frontier.mark_failed(url, str(e), retry=retry)
+            if state == FAILED:
+                if error_callback:
+                    error_callback(url, e)
+                report_progress()
+
+        def report_progress():
+            nonlocal finished
+            finished += 1
+            if progress_callback:
+                progress_callback(finished / total * 100)
+
+        try:
+            while True:
+                urls = frontier.claim(batch_size)
+                if not urls:
+                    wait = frontier.next_due()
+                    if wait is None:
+                        break
+                    time.sleep(wait)
+                    continue
+                self._run(urls, on_product, on_done, on_error)
         finally:
             self._cleanup_selenium()
+        return scraped
+
+    def _solve_ahead(self, urls: List[str]):
+        """Start solving CAPTCHAs for hosts that are known to need them"""
+        preferred = self.escalation.preferred_tiers()
+        first_url = {}
+        counts = {}
+        for url in urls:
+            host = host_of(url)
+            first_url.setdefault(host, url)
+            counts[host] = counts.get(host, 0) + 1
+        for host, count in counts.items():
+            if preferred.get(host, self.escalation.tiers[0]) == PROTECTED:
+                self.captcha.expect(self.config.captcha_site_key, first_url[host], count)
+
+    def _run(self, urls: List[str], on_product, on_done, on_error):
+        """
+        Fetch and parse `urls`. `on_product(index, url, product)` gets every
+        product to keep, `on_done(url)` follows each URL that succeeded
+        (including ones skipped as unchanged) and `on_error(url, exc)` each
+        one that failed
+        """
+        def on_result(index, url, product):
+            cache_key, page_hash, tier = self._page_info.pop(url, (None, None, None))
+            if tier:
+                self.escalation.record(host_of(url), tier, True)
+            if product is None:
+                on_done(url)
+                return
+            if cache_key:
+                self.cache.store_fields(cache_key, self._fields_key, product_fields(product))
+            # Known URLs are updated in place (or not at all) by the fingerprint store
+            if not page_hash or self.fingerprints.record(product, page_hash) == NEW:
+                on_product(index, url, product)
+            on_done(url)
+
+        def on_fetch_error(index, url, e):
+            self._page_info.pop(url, None)
+            print(f"Error scraping {url}: {str(e)}")
+            on_error(url, e)
+
+        if self.captcha:
+            self._solve_ahead(urls)
+        try:
+            self._run_engine(urls, on_result, on_fetch_error)
+        finally:
+            self.export_metrics()
+
+    def _run_engine(self, urls: List[str], on_result, on_fetch_error):
+        engine = FetchEngine(self.limiter, self.config.max_workers, self.retry_policy, self.budget)
+        if self.config.parse_workers <= 0:
+            engine.run(urls, self._scrape_for_run, on_result, on_fetch_error)
+            return
+
+        escalated = []  # (index, url, tier) to fetch again one tier up
+
+        def on_parse_error(index, url, e):
+            tier = self._page_info.get(url, (None, None, None))[2]
+            if isinstance(e, SelectorsNotFound) and tier and self.escalation.next_tier(tier):
+                self._page_info.pop(url)
+                escalated.append((index, url, self._escalate(url, tier, e)))
+            else:
+                on_fetch_error(index, url, e)
 
-        return products
\ No newline at end of file
+        # Fetch threads only download; parsing runs in worker processes
+        with ParsePipeline(self.config, on_result, on_parse_error, self.metrics) as pipeline:
+            engine.run(urls, self._fetch_for_pipeline, pipeline.submit, on_fetch_error)
+            pipeline.join()
+            while escalated:
+                batch = escalated[:]
+                del escalated[:]
+                tiers = {url: tier for _, url, tier in batch}
+                engine.run([url for _, url, _ in batch],
+                           lambda url: self._fetch_for_pipeline(url, tiers[url]),
+                           lambda i, url, page: pipeline.submit(batch[i][0], url, page),
+                           lambda i, url, e: on_fetch_error(batch[i][0], url, e))
+                pipeline.join()
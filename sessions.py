@@ -0,0 +1,167 @@
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ClearanceSession:
+    """Cookies and user agent of a browser session that got past a host's bot protection"""
+    host: str
+    user_agent: str
+    cookies: List[dict]
+    obtained_at: float
+    expires_at: float
+
+    def cookie_header(self) -> str:
+        return '; '.join(f"{cookie['name']}={cookie['value']}" for cookie in self.cookies)
+
+
+class SessionStore:
+    """
+    Clearance sessions per host, persisted to a JSON file that only its
+    owner can read (the cookies are credentials).
+
+    A session is captured from a browser once it has got past a host's
+    challenge and is then reused: its cookies and user agent go into plain HTTP
+    requests (protection cookies such as cf_clearance are only honoured
+    with the user agent that earned them) and into other pooled browsers.
+    A session expires with its earliest-expiring cookie, after `ttl`
+    seconds at the latest, or as soon as it stops working.
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl: float = 1800.0):
+        self.path = path
+        self.ttl = ttl
+        self._sessions: Dict[str, ClearanceSession] = {}
+        self._lock = threading.Lock()
+        self.captured = 0
+        self.invalidated = 0
+        self._load()
+
+    @classmethod
+    def from_config(cls, config) -> 'SessionStore':
+        return cls(config.session_store_path, config.session_ttl)
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Не удалось прочитать сессии из {self.path}: {e}")
+            return
+        now = time.time()
+        for host, session in data.items():
+            session = ClearanceSession(**session)
+            if session.expires_at > now:
+                self._sessions[host] = session
+
+    def _save(self):
+        if not self.path:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+        tmp_path = f'{self.path}.tmp'
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        if hasattr(os, 'fchmod'):
+            # A leftover temp file keeps its old mode otherwise
+            os.fchmod(fd, 0o600)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({host: asdict(session) for host, session in self._sessions.items()}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def get(self, host: str) -> Optional[ClearanceSession]:
+        with self._lock:
+            session = self._sessions.get(host)
+            if session and session.expires_at <= time.time():
+                del self._sessions[host]
+                self._save()
+                return None
+            return session
+
+    def capture(self, host: str, driver) -> Optional[ClearanceSession]:
+        """Store the cookies and user agent of `driver`, which has just loaded a page of `host`"""
+        try:
+            cookies = driver.get_cookies()
+            user_agent = driver.execute_script('return navigator.userAgent')
+        except Exception as e:
+            logger.warning(f"Не удалось получить cookies браузера для {host}: {e}")
+            return None
+        if not cookies:
+            return None
+        now = time.time()
+        expiries = [cookie['expiry'] for cookie in cookies if cookie.get('expiry')]
+        session = ClearanceSession(host, user_agent, cookies, now, min(expiries + [now + self.ttl]))
+        with self._lock:
+            self._sessions[host] = session
+            self.captured += 1
+            self._save()
+        return session
+
+    def invalidate(self, host: str):
+        """Forget a session that no longer gets past the protection"""
+        with self._lock:
+            if self._sessions.pop(host, None):
+                self.invalidated += 1
+                self._save()
+
+    def request_headers(self, host: str) -> Dict[str, str]:
+        """User-Agent and Cookie headers for a plain HTTP request to `host`"""
+        session = self.get(host)
+        if not session:
+            return {}
+        return {'User-Agent': session.user_agent, 'Cookie': session.cookie_header()}
+
+    def apply_to_driver(self, host: str, driver) -> bool:
+        """
+        Load the host's session into a pooled browser through the DevTools
+        protocol, which works before the browser has visited the host.
+        Returns whether it did; undo with reset_driver() before the
+        browser goes back to its pool.
+        """
+        session = self.get(host)
+        if not session:
+            return False
+        try:
+            driver.execute_cdp_cmd('Network.enable', {})
+            driver.execute_cdp_cmd('Network.setUserAgentOverride', {'userAgent': session.user_agent})
+            driver.execute_cdp_cmd('Network.setCookies', {'cookies': [
+                {
+                    'name': cookie['name'],
+                    'value': cookie['value'],
+                    'domain': cookie.get('domain') or host.split(':')[0],
+                    'path': cookie.get('path', '/'),
+                    'secure': cookie.get('secure', False),
+                    'httpOnly': cookie.get('httpOnly', False),
+                    **({'expires': cookie['expiry']} if cookie.get('expiry') else {}),
+                }
+                for cookie in session.cookies
+            ]})
+            return True
+        except Exception as e:
+            logger.warning(f"Не удалось передать cookies в браузер для {host}: {e}")
+            return False
+
+    def reset_driver(self, driver):
+        """Drop the user agent override of apply_to_driver() before the browser serves another host"""
+        try:
+            # An empty user agent turns the override off
+            driver.execute_cdp_cmd('Network.setUserAgentOverride', {'userAgent': ''})
+        except Exception as e:
+            logger.warning(f"Не удалось сбросить user agent браузера: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'sessions': len(self._sessions),
+                'captured': self.captured,
+                'invalidated': self.invalidated,
+            }
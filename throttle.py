@@ -0,0 +1,373 @@
+import random
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+
+def host_of(url: str) -> str:
+    """Return the lower-cased host[:port] part of a URL"""
+    return urlsplit(url).netloc.lower()
+
+
+class TokenBucket:
+    """
+    Classic token bucket: refills `rate` tokens per second up to `capacity`.
+    A rate of 0 disables the limit.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = rate
+        self.capacity = max(1.0, float(capacity))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until a token is available (0 if one is available now)"""
+        if self.rate <= 0:
+            return 0.0
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self, now: float):
+        if self.rate > 0:
+            self._refill(now)
+            self.tokens -= 1
+
+
+class CircuitBreaker:
+    """
+    Stops requests to a host after `threshold` consecutive failures. After
+    `reset_timeout` seconds a single probe request is let through (half
+    open); if it fails too, the breaker opens again for twice as long, up
+    to `max_timeout`.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, threshold: int = 5, reset_timeout: float = 30.0, max_timeout: float = 600.0):
+        self.threshold = max(1, threshold)
+        self.reset_timeout = reset_timeout
+        self.max_timeout = max_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.timeout = reset_timeout
+        self.opened_at = 0.0
+        self.trips = 0
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until a request may be sent (inf while the half-open probe is out)"""
+        if self.state == self.OPEN:
+            return max(0.0, self.opened_at + self.timeout - now)
+        if self.state == self.HALF_OPEN:
+            return float('inf')
+        return 0.0
+
+    def on_request(self):
+        if self.state == self.OPEN:
+            self.state = self.HALF_OPEN
+
+    def cancel_probe(self):
+        """The half-open probe ended without a verdict: the next request probes instead"""
+        if self.state == self.HALF_OPEN:
+            self.state = self.OPEN
+
+    def success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self.timeout = self.reset_timeout
+
+    def failure(self, now: float):
+        self.failures += 1
+        if self.state == self.HALF_OPEN:
+            self.timeout = min(self.max_timeout, self.timeout * 2)
+            self._open(now)
+        elif self.state == self.CLOSED and self.failures >= self.threshold:
+            self._open(now)
+
+    def _open(self, now: float):
+        self.state = self.OPEN
+        self.opened_at = now
+        self.trips += 1
+
+
+class AimdController:
+    """
+    Additive-increase / multiplicative-decrease concurrency limit for one
+    host: every `limit` successes raise it by one, a failure or a response
+    slower than `slow_factor` times the host's usual latency halves it, at
+    most once per `cooldown` seconds so a burst of errors counts once.
+    """
+
+    def __init__(self, maximum: int, minimum: int = 1, decrease: float = 0.5,
+                 slow_factor: float = 3.0, cooldown: float = 1.0):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.decrease = decrease
+        self.slow_factor = slow_factor
+        self.cooldown = cooldown
+        self.value = float(self.maximum)
+        self.latency = None  # EWMA of successful response times
+        self.baseline = None  # lowest EWMA seen
+        self.last_decrease = float('-inf')
+
+    @property
+    def limit(self) -> int:
+        return int(self.value)
+
+    def success(self, now: float, latency: Optional[float] = None):
+        if latency is not None:
+            self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+            self.baseline = self.latency if self.baseline is None else min(self.baseline, self.latency)
+            if latency > self.slow_factor * self.baseline:
+                self.backoff(now)
+                return
+        self.value = min(float(self.maximum), self.value + 1 / self.value)
+
+    def backoff(self, now: float):
+        if now - self.last_decrease >= self.cooldown:
+            self.value = max(float(self.minimum), self.value * self.decrease)
+            self.last_decrease = now
+
+
+class _HostState:
+    def __init__(self, rate: float, burst: int, max_per_host: int, adaptive: bool,
+                 breaker_threshold: int, breaker_reset: float):
+        self.active = 0
+        self.max_per_host = max_per_host
+        self.bucket = TokenBucket(rate, burst)
+        self.next_allowed = 0.0
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_reset)
+        self.aimd = AimdController(max_per_host) if adaptive else None
+        self.successes = 0
+        self.failures = 0
+
+    @property
+    def limit(self) -> int:
+        return self.aimd.limit if self.aimd else self.max_per_host
+
+
+class HostLimiter:
+    """
+    Per-host politeness: a concurrency cap, a token-bucket rate limit and a
+    random delay between consecutive request starts to the same host.
+
+    Outcomes reported through record_success() / record_failure() drive a
+    circuit breaker per host and, with `adaptive`, an AIMD controller that
+    moves the host's concurrency cap between 1 and `max_per_host`. A host
+    is paused for at most `max_retry_after` seconds, whatever its
+    Retry-After asks for.
+    """
+
+    def __init__(self, max_per_host: int = 2, rate: float = 0.0, burst: int = 1,
+                 min_delay: float = 1.0, max_delay: float = 3.0, adaptive: bool = True,
+                 breaker_threshold: int = 5, breaker_reset: float = 30.0, max_retry_after: float = 60.0):
+        self.max_per_host = max(1, max_per_host)
+        self.rate = rate
+        self.burst = burst
+        self.min_delay = min_delay
+        self.max_delay = max(min_delay, max_delay)
+        self.adaptive = adaptive
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset = breaker_reset
+        self.max_retry_after = max_retry_after
+        self._hosts: Dict[str, _HostState] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config) -> 'HostLimiter':
+        return cls(
+            max_per_host=config.max_per_host,
+            rate=config.requests_per_second,
+            burst=config.burst,
+            min_delay=config.min_delay,
+            max_delay=config.max_delay,
+            adaptive=config.adaptive_concurrency,
+            breaker_threshold=config.breaker_threshold,
+            breaker_reset=config.breaker_reset,
+            max_retry_after=config.retry_max_delay,
+        )
+
+    def _state(self, host: str) -> _HostState:
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = _HostState(
+                self.rate, self.burst, self.max_per_host, self.adaptive,
+                self.breaker_threshold, self.breaker_reset)
+        return state
+
+    def try_acquire(self, host: str) -> float:
+        """
+        Try to take a slot for `host`. Returns 0 when the slot was taken,
+        otherwise the number of seconds worth waiting before trying again
+        (float('inf') when only a release can free the host).
+        """
+        with self._lock:
+            state = self._state(host)
+            now = time.monotonic()
+            wait = state.breaker.wait_time(now)
+            if wait:
+                return wait
+            if state.active >= state.limit:
+                return float('inf')
+            wait = max(state.next_allowed - now, state.bucket.wait_time(now))
+            if wait > 0:
+                return wait
+            state.bucket.consume(now)
+            state.breaker.on_request()
+            state.active += 1
+            state.next_allowed = now + random.uniform(self.min_delay, self.max_delay)
+            return 0.0
+
+    def is_open(self, host: str) -> bool:
+        """True while the host's circuit breaker rejects requests"""
+        with self._lock:
+            state = self._state(host)
+            return state.breaker.state == CircuitBreaker.OPEN and state.breaker.wait_time(time.monotonic()) > 0
+
+    def release(self, host: str):
+        with self._lock:
+            state = self._state(host)
+            state.active = max(0, state.active - 1)
+
+    def record_success(self, host: str, latency: Optional[float] = None):
+        """The host answered; `latency` in seconds feeds the AIMD controller"""
+        with self._lock:
+            state = self._state(host)
+            state.successes += 1
+            state.breaker.success()
+            if state.aimd:
+                state.aimd.success(time.monotonic(), latency)
+
+    def record_deferred(self, host: str):
+        """The request was put off before the host gave an answer (e.g. waiting for a CAPTCHA token)"""
+        with self._lock:
+            self._state(host).breaker.cancel_probe()
+
+    def record_failure(self, host: str, retry_after: Optional[float] = None, throttled: bool = False):
+        """
+        The host failed (connection error, 5xx) or, if `throttled`, pushed
+        back with 429/503. Pushback lowers the concurrency limit but does not
+        count towards the circuit breaker. With `retry_after` no request is
+        sent to the host for that many seconds, up to `max_retry_after`.
+        """
+        with self._lock:
+            state = self._state(host)
+            now = time.monotonic()
+            state.failures += 1
+            if throttled:
+                state.breaker.cancel_probe()
+            else:
+                state.breaker.failure(now)
+            if state.aimd:
+                state.aimd.backoff(now)
+            if retry_after:
+                state.next_allowed = max(state.next_allowed, now + min(retry_after, self.max_retry_after))
+
+    def host_stats(self) -> Dict[str, dict]:
+        with self._lock:
+            return {
+                host: {
+                    'limit': state.limit,
+                    'active': state.active,
+                    'successes': state.successes,
+                    'failures': state.failures,
+                    'breaker': state.breaker.state,
+                    'breaker_trips': state.breaker.trips,
+                }
+                for host, state in self._hosts.items()
+            }
+
+
+class ConcurrencyBudget:
+    """
+    A global cap on concurrent fetches shared by several scrapers, e.g. one
+    per marketplace in a scheduled run.
+
+    Every registered share is entitled to total // (number of shares) slots
+    (at least one). A share may borrow slots beyond that while they are
+    idle, but not while another share has recently been refused a slot it
+    was entitled to, so a busy marketplace can't starve a slow one.
+    """
+
+    # A share refused its fair slot counts as waiting for this long
+    STARVED_FOR = 1.0
+
+    def __init__(self, total: int):
+        self.total = max(1, total)
+        self._used: Dict[str, int] = {}
+        self._starved: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.granted = 0
+        self.refused = 0
+
+    def share(self, name: str) -> 'BudgetShare':
+        with self._lock:
+            self._used.setdefault(name, 0)
+        return BudgetShare(self, name)
+
+    def unregister(self, name: str):
+        with self._lock:
+            self._used.pop(name, None)
+            self._starved.pop(name, None)
+
+    def fair_share(self) -> int:
+        return max(1, self.total // max(1, len(self._used)))
+
+    def try_acquire(self, name: str) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            used = self._used.get(name, 0)
+            entitled = used < self.fair_share()
+            starved = any(other != name and now - since < self.STARVED_FOR
+                          for other, since in self._starved.items())
+            if sum(self._used.values()) >= self.total or (not entitled and starved):
+                if entitled:
+                    self._starved[name] = now
+                self.refused += 1
+                return False
+            self._starved.pop(name, None)
+            self._used[name] = used + 1
+            self.granted += 1
+            return True
+
+    def release(self, name: str):
+        with self._lock:
+            if self._used.get(name):
+                self._used[name] -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'total': self.total,
+                'fair_share': self.fair_share(),
+                'in_use': dict(self._used),
+                'granted': self.granted,
+                'refused': self.refused,
+            }
+
+
+class BudgetShare:
+    """One scraper's handle on a ConcurrencyBudget"""
+
+    def __init__(self, budget: ConcurrencyBudget, name: str):
+        self.budget = budget
+        self.name = name
+
+    def try_acquire(self) -> bool:
+        return self.budget.try_acquire(self.name)
+
+    def release(self):
+        self.budget.release(self.name)
+
+    def close(self):
+        self.budget.unregister(self.name)
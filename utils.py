@@ -1,30 +1,117 @@
 import csv
-import pandas as pd
-from typing import List
-from models import Product
+import json
+from typing import Iterable, Iterator, Union
+from models import Product, ProductBatch
 
-def export_to_csv(products: List[Product], filepath: str):
+# Exporters accept a ProductBatch, or any iterable of products or of batches
+# (e.g. Database.iter_products() / iter_batches()), and write it
+# incrementally, so memory use does not grow with the table.
+
+HEADERS = ['Name', 'Price', 'Description', 'URL', 'Marketplace', 'Created At']
+EXCEL_MAX_ROWS = 1048576
+
+Products = Union[ProductBatch, Iterable[Product], Iterable[ProductBatch]]
+
+
+def _batches(products: Products, size: int) -> Iterator[ProductBatch]:
+    """Columnar chunks of at most `size` rows; batches pass through as they are"""
+    if isinstance(products, ProductBatch):
+        yield from products.chunks(size)
+        return
+    chunk = ProductBatch()
+    for item in products:
+        if isinstance(item, ProductBatch):
+            if chunk:
+                yield chunk
+                chunk = ProductBatch()
+            yield from item.chunks(size)
+            continue
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = ProductBatch()
+    if chunk:
+        yield chunk
+
+
+def export_to_csv(products: Products, filepath: str):
     with open(filepath, 'w', newline='', encoding='utf-8') as f:
         writer = csv.writer(f)
-        writer.writerow(['Name', 'Price', 'Description', 'URL', 'Marketplace', 'Created At'])
-        for product in products:
-            writer.writerow([
-                product.name,
-                product.price,
-                product.description,
-                product.url,
-                product.marketplace,
-                product.created_at
-            ])
-
-def export_to_excel(products: List[Product], filepath: str):
-    data = {
-        'Name': [p.name for p in products],
-        'Price': [p.price for p in products],
-        'Description': [p.description for p in products],
-        'URL': [p.url for p in products],
-        'Marketplace': [p.marketplace for p in products],
-        'Created At': [p.created_at for p in products]
-    }
-    df = pd.DataFrame(data)
-    df.to_excel(filepath, index=False)
+        writer.writerow(HEADERS)
+        for batch in _batches(products, 10000):
+            writer.writerows(batch.rows())
+
+
+def export_to_excel(products: Products, filepath: str):
+    """
+    Write-only openpyxl workbook: rows are streamed to disk as they are
+    appended. Continues on a new sheet when Excel's row limit is reached.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = None
+    rows = EXCEL_MAX_ROWS
+    for batch in _batches(products, 10000):
+        for row in batch.rows():
+            if rows >= EXCEL_MAX_ROWS:
+                sheet = workbook.create_sheet(f'Products {len(workbook.worksheets) + 1}')
+                sheet.append(HEADERS)
+                rows = 1
+            sheet.append(row)
+            rows += 1
+    if sheet is None:
+        workbook.create_sheet('Products 1').append(HEADERS)
+    workbook.save(filepath)
+
+
+def export_to_parquet(products: Products, filepath: str, chunk_size: int = 10000):
+    """
+    One Parquet row group per chunk of `chunk_size` products. The price and
+    created_at columns of a batch are passed to Arrow without copying.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ('name', pa.string()),
+        ('price', pa.float64()),
+        ('description', pa.string()),
+        ('url', pa.string()),
+        ('marketplace', pa.string()),
+        ('created_at', pa.timestamp('us')),
+    ])
+    with pq.ParquetWriter(filepath, schema) as writer:
+        for batch in _batches(products, chunk_size):
+            writer.write_table(pa.table({
+                'name': pa.array(batch.names, pa.string()),
+                'price': pa.Array.from_buffers(pa.float64(), len(batch), [None, pa.py_buffer(batch.prices)]),
+                'description': pa.array(batch.descriptions, pa.string()),
+                'url': pa.array(batch.urls, pa.string()),
+                'marketplace': pa.array(batch.marketplaces, pa.string()),
+                'created_at': pa.Array.from_buffers(pa.timestamp('us'), len(batch),
+                                                    [None, pa.py_buffer(batch.created_at)]),
+            }, schema=schema))
+
+
+def export_to_jsonl(products: Products, filepath: str):
+    with open(filepath, 'w', encoding='utf-8') as f:
+        for batch in _batches(products, 10000):
+            for name, price, description, url, marketplace, created_at in batch.rows():
+                f.write(json.dumps({
+                    'name': name,
+                    'price': price,
+                    'description': description,
+                    'url': url,
+                    'marketplace': marketplace,
+                    'created_at': created_at.isoformat(),
+                }, ensure_ascii=False))
+                f.write('\n')
+
+
+EXPORTERS = {
+    'csv': export_to_csv,
+    'excel': export_to_excel,
+    'parquet': export_to_parquet,
+    'jsonl': export_to_jsonl,
+}
@@ -0,0 +1,145 @@
+import random
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterable, Optional
+
+WAIT_STRATEGIES = ('selectors', 'challenge', 'network_idle', 'fixed')
+
+# Markers of Cloudflare-style interstitials; the page is not ready while any is present
+_CHALLENGE_SCRIPT = """
+var title = (document.title || '').toLowerCase();
+if (title.indexOf('just a moment') !== -1 || title.indexOf('attention required') !== -1) {
+    return true;
+}
+return !!document.querySelector(
+    '#challenge-form, #challenge-stage, #cf-challenge-running, .cf-browser-verification, ' +
+    'iframe[src*="challenges.cloudflare.com"]'
+);
+"""
+
+_SELECTORS_SCRIPT = """
+var selectors = arguments[0];
+for (var i = 0; i < selectors.length; i++) {
+    if (!document.querySelector(selectors[i])) { return false; }
+}
+return true;
+"""
+
+_NETWORK_SCRIPT = """
+return [document.readyState,
+        window.performance ? performance.getEntriesByType('resource').length : 0];
+"""
+
+
+class _NetworkIdle:
+    """WebDriverWait condition: document loaded and no new resources for `idle` seconds"""
+
+    def __init__(self, idle: float):
+        self.idle = idle
+        self.last_count = -1
+        self.last_change = time.monotonic()
+
+    def __call__(self, driver) -> bool:
+        state, count = driver.execute_script(_NETWORK_SCRIPT)
+        now = time.monotonic()
+        if count != self.last_count:
+            self.last_count = count
+            self.last_change = now
+            return False
+        return state == 'complete' and now - self.last_change >= self.idle
+
+
+class WaitStats:
+    """Thread-safe record of how long page waits took, per strategy"""
+
+    def __init__(self, maxlen: int = 10000):
+        self._durations: Dict[str, deque] = {}
+        self._timeouts: Dict[str, int] = {}
+        self._maxlen = maxlen
+        self._lock = threading.Lock()
+
+    def record(self, strategy: str, seconds: float, timed_out: bool):
+        with self._lock:
+            self._durations.setdefault(strategy, deque(maxlen=self._maxlen)).append(seconds)
+            self._timeouts[strategy] = self._timeouts.get(strategy, 0) + int(timed_out)
+
+    def summary(self) -> Dict[str, dict]:
+        with self._lock:
+            data = {name: sorted(values) for name, values in self._durations.items()}
+            timeouts = dict(self._timeouts)
+        return {
+            name: {
+                'count': len(values),
+                'timeouts': timeouts.get(name, 0),
+                'avg': sum(values) / len(values),
+                'p50': values[len(values) // 2],
+                'p95': values[int(len(values) * 0.95)],
+                'max': values[-1],
+            }
+            for name, values in data.items() if values
+        }
+
+
+class PageWaiter:
+    """
+    Waits until a loaded page is ready instead of sleeping a fixed time.
+
+    Strategies:
+      selectors    - challenge gone and every configured selector resolves
+      challenge    - challenge DOM gone
+      network_idle - challenge gone and no new network resources for `idle` s
+      fixed        - legacy random 1-3 s sleep
+    Every strategy gives up after `timeout` seconds and lets the caller read
+    whatever the page contains at that point.
+    """
+
+    def __init__(self, strategy: str = 'selectors', timeout: float = 30.0,
+                 selectors: Optional[Iterable[str]] = None, idle: float = 0.5,
+                 poll: float = 0.1, stats: Optional[WaitStats] = None):
+        if strategy not in WAIT_STRATEGIES:
+            raise ValueError(f"Unknown wait strategy: {strategy}")
+        self.strategy = strategy
+        self.timeout = timeout
+        self.selectors = [s for s in (selectors or []) if s]
+        self.idle = idle
+        self.poll = poll
+        self.stats = stats or WaitStats()
+
+    @classmethod
+    def from_config(cls, config, stats: Optional[WaitStats] = None) -> 'PageWaiter':
+        return cls(
+            strategy=config.wait_strategy,
+            timeout=config.wait_timeout,
+            selectors=config.selectors.values(),
+            idle=config.network_idle_time,
+            stats=stats,
+        )
+
+    def _condition(self):
+        if self.strategy == 'selectors':
+            return lambda d: (not d.execute_script(_CHALLENGE_SCRIPT)
+                              and d.execute_script(_SELECTORS_SCRIPT, self.selectors))
+        if self.strategy == 'network_idle':
+            network_idle = _NetworkIdle(self.idle)
+            return lambda d: not d.execute_script(_CHALLENGE_SCRIPT) and network_idle(d)
+        return lambda d: not d.execute_script(_CHALLENGE_SCRIPT)
+
+    def wait(self, driver) -> bool:
+        """Block until the page is ready; returns False if the timeout was hit"""
+        started = time.monotonic()
+        timed_out = False
+        if self.strategy == 'fixed':
+            time.sleep(random.uniform(1, 3))
+        else:
+            # Only browser fetches wait; HTTP-only runs never import selenium
+            from selenium.common.exceptions import JavascriptException, TimeoutException
+            from selenium.webdriver.support.ui import WebDriverWait
+
+            try:
+                WebDriverWait(driver, self.timeout, poll_frequency=self.poll,
+                              ignored_exceptions=(JavascriptException,)).until(self._condition())
+            except TimeoutException:
+                timed_out = True
+        self.stats.record(self.strategy, time.monotonic() - started, timed_out)
+        return not timed_out